@@ -2,7 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 {
     "name": """Bosnia and Herzegovina FBiH - fiskalizacija (legacy)""",
-    "version": "1.1.0",
+    "version": "1.4.1",
     "category": "Accounting/Localizations/EDI",
     "depends": [
         "account_edi",
@@ -14,10 +14,25 @@ Bosnian - E Fiskalizacija
 
     """,
     "data": [
+        "security/ir.model.access.csv",
         "data/account_edi_data.xml",
+        "data/ir_cron_data.xml",
+        "data/l10n_bs_edi_payment_type_rule_data.xml",
         "views/res_config_settings_views.xml",
         "views/edi_pdf_report.xml",
         "views/account_move_views.xml",
+        "views/res_partner_views.xml",
+        "views/l10n_bs_edi_device_views.xml",
+        "views/l10n_bs_edi_device_report_views.xml",
+        "views/l10n_bs_edi_fiscal_queue_views.xml",
+        "views/l10n_bs_edi_payment_type_rule_views.xml",
+        "views/l10n_bs_edi_sequence_views.xml",
+        "views/l10n_bs_edi_timing_views.xml",
+        "wizard/l10n_bs_edi_device_report_wizard_views.xml",
+        "wizard/l10n_bs_edi_dry_run_wizard_views.xml",
+        "wizard/l10n_bs_edi_duplicate_wizard_views.xml",
+        "wizard/l10n_bs_edi_fiscal_journal_wizard_views.xml",
+        "wizard/l10n_bs_edi_validate_wizard_views.xml",
     ],
     #"demo": [
     #    "demo/demo_company.xml",
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound
+
+from odoo import fields, http
+from odoo.http import content_disposition, request
+from odoo.modules.registry import Registry
+
+from ..tools import fiscal_journal
+
+
+class L10nBsEdiController(http.Controller):
+
+    @http.route("/l10n_bs_edi/fiscal_journal/<int:company_id>", type="http", auth="user", methods=["GET"])
+    def fiscal_journal(self, company_id, date_from, date_to, file_format="csv", **kwargs):
+        """ Fiscalized invoices of a period as CSV or JSON lines, streamed from a server-side cursor. """
+        env = request.env
+        if not env.user.has_group("account.group_account_invoice") or company_id not in env.user.company_ids.ids:
+            raise Forbidden()
+        if file_format not in fiscal_journal.FORMATS:
+            raise BadRequest()
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+        except ValueError:
+            raise BadRequest()
+
+        company = env["res.company"].browse(company_id)
+        moves = env["account.move"]
+        columns = moves._l10n_bs_edi_fiscal_journal_columns()
+        query, params = moves._l10n_bs_edi_fiscal_journal_query(company, date_from, date_to)
+        chunk_size = int(env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.export_chunk_size", 2000))
+        dbname = request.db
+
+        def generate():
+            # tijelo odgovora se šalje nakon zatvaranja kursora zahtjeva
+            with Registry(dbname).cursor() as cr:
+                yield from fiscal_journal.export(cr, columns, query, params, file_format, chunk_size)
+
+        filename = "fiskalni_dnevnik_%s_%s_%s.%s" % (company.vat or company.id, date_from, date_to, file_format)
+        return request.make_response(generate(), headers=[
+            ("Content-Type", fiscal_journal.FORMATS[file_format]),
+            ("Content-Disposition", content_disposition(filename)),
+        ])
+
+    @http.route("/l10n_bs_edi/fiscal_number/<string:kind>/<string:fiscal_number>", type="http", auth="user", methods=["GET"])
+    def fiscal_number(self, kind, fiscal_number, **kwargs):
+        """ Open the invoice (kind F) or refund (kind R) of a printed fiscal receipt. """
+        move_type = {"F": "out_invoice", "R": "out_refund"}.get(kind)
+        if not move_type:
+            raise NotFound()
+        move = request.env["account.move"]._l10n_bs_edi_find_by_fiscal_numbers([fiscal_number], move_type=move_type).get(fiscal_number)
+        if not move:
+            raise NotFound()
+        return request.redirect("/web#model=account.move&id=%s&view_type=form" % move.id)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    count = env["account.move"]._l10n_bs_edi_backfill_fiscal_fields()
+    _logger.info("l10n_bs_edi: fiskalni podaci preneseni iz %s odgovora uređaja", count)
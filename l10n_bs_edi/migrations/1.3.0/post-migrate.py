@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    count = env["account.move"]._l10n_bs_edi_backfill_payment_type()
+    _logger.info("l10n_bs_edi: način plaćanja upisan na %s fiskaliziranih računa", count)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    count = env["l10n_bs_edi.sequence.checkpoint"]._stamp_legacy()
+    _logger.info("l10n_bs_edi: redoslijed fiskalizacije upisan na %s računa", count)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" Make room for unique(company_id, move_type, ba_edi_fiskalni_broj).
+
+The fiscal number used to be copied with the move, so duplicated drafts and credit
+notes carry the number of the invoice they were copied from. Among moves sharing a
+number, the ones without a sent BA document lose it; when none of them was sent the
+oldest keeps it. Numbers still shared afterwards were really returned twice by the
+device and are only reported: Odoo then logs that the constraint could not be added.
+"""
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        WITH numbered AS (
+            SELECT move.id, move.company_id, move.move_type, move.ba_edi_fiskalni_broj,
+                   EXISTS (
+                       SELECT 1
+                         FROM account_edi_document doc
+                         JOIN account_edi_format fmt ON fmt.id = doc.edi_format_id
+                        WHERE doc.move_id = move.id
+                          AND fmt.code = 'ba_fiskalne_1_00'
+                          AND doc.state IN ('sent', 'to_cancel')
+                   ) AS sent
+              FROM account_move move
+             WHERE move.ba_edi_fiskalni_broj IS NOT NULL
+        ),
+        ranked AS (
+            SELECT id, sent,
+                   COUNT(*) OVER number_group AS move_count,
+                   BOOL_OR(sent) OVER number_group AS any_sent,
+                   ROW_NUMBER() OVER (number_group ORDER BY id) AS rank
+              FROM numbered
+            WINDOW number_group AS (PARTITION BY company_id, move_type, ba_edi_fiskalni_broj)
+        )
+        UPDATE account_move move
+           SET ba_edi_fiskalni_broj = NULL
+          FROM ranked
+         WHERE ranked.id = move.id
+           AND ranked.move_count > 1
+           AND NOT ranked.sent
+           AND (ranked.any_sent OR ranked.rank > 1)
+     RETURNING move.id
+    """)
+    cleared = [move_id for move_id, in cr.fetchall()]
+    if cleared:
+        _logger.info("l10n_bs_edi: fiskalni broj obrisan sa %s kopiranih faktura: %s", len(cleared), cleared)
+
+    cr.execute("""
+        SELECT company_id, move_type, ba_edi_fiskalni_broj, ARRAY_AGG(id ORDER BY id)
+          FROM account_move
+         WHERE ba_edi_fiskalni_broj IS NOT NULL
+      GROUP BY company_id, move_type, ba_edi_fiskalni_broj
+        HAVING COUNT(*) > 1
+    """)
+    for company_id, move_type, fiscal_number, move_ids in cr.fetchall():
+        _logger.error(
+            "l10n_bs_edi: fiskalni broj %s (%s, kompanija %s) je na više poslanih faktura %s, "
+            "jedinstvenost fiskalnih brojeva nije moguće uključiti dok se ne ispravi",
+            fiscal_number, move_type, company_id, move_ids,
+        )
@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+from . import account_account_tag
+from . import account_edi_document
 from . import account_edi_format
 from . import account_move
+from . import l10n_bs_edi_device
+from . import l10n_bs_edi_device_report
+from . import l10n_bs_edi_device_report_line
+from . import l10n_bs_edi_fiscal_queue
+from . import l10n_bs_edi_payload
+from . import l10n_bs_edi_payment_type_rule
+from . import l10n_bs_edi_sequence_anomaly
+from . import l10n_bs_edi_sequence_checkpoint
+from . import l10n_bs_edi_timing
+from . import report_invoice
 from . import res_company
 from . import res_config_settings
+from . import res_partner
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models
+
+from .account_edi_format import PDV_CODES
+
+
+class AccountAccountTag(models.Model):
+    _inherit = "account.account.tag"
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._l10n_bs_edi_clear_tag_map()
+        return res
+
+    def unlink(self):
+        # provjera prije brisanja, poslije se xmlid više ne može naći
+        is_ba_tag = self._l10n_bs_edi_is_ba_tag()
+        res = super().unlink()
+        if is_ba_tag:
+            self.env["account.edi.format"].clear_caches()
+        return res
+
+    def _l10n_bs_edi_is_ba_tag(self):
+        """ Whether the recordset contains one of the tags the BA tag map is built from. """
+        xmlids = ["l10n_bs.tax_tag_%s" % pdv_code for pdv_code in PDV_CODES] + ["l10n_bs.tax_tag_E_base"]
+        ba_tags = [self.env.ref(xmlid, raise_if_not_found=False) for xmlid in xmlids]
+        return not {tag.id for tag in ba_tags if tag}.isdisjoint(self.ids)
+
+    def _l10n_bs_edi_clear_tag_map(self):
+        # ormcache se briše na svim workerima, samo kad se promijeni BA tag i jednom po pozivu
+        if self._l10n_bs_edi_is_ba_tag():
+            self.env["account.edi.format"].clear_caches()
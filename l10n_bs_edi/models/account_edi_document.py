@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from psycopg2 import OperationalError, errorcodes
+
+from odoo import api, fields, models, _
+from odoo.tools import split_every
+
+from ..tools.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+_logger = logging.getLogger(__name__)
+
+BA_EDI_CODE = "ba_fiskalne_1_00"
+# sekunde preko najgoreg trajanja jednog paketa prije nego se slanje smatra prekinutim
+SENDING_TIMEOUT_MARGIN = 300
+
+
+class AccountEdiDocument(models.Model):
+    _inherit = "account.edi.document"
+
+    l10n_bs_edi_sending_date = fields.Datetime(
+        string="Slanje u toku od",
+        copy=False,
+        help="Faktura je predana fiskalnom uređaju, odgovor još nije zabilježen",
+    )
+
+    def _prepare_jobs(self):
+        jobs = super()._prepare_jobs()
+        if self.env.context.get("l10n_bs_edi_skip"):
+            # BA dokumente obrađuje l10n_bs_edi.ir_cron_l10n_bs_edi_process
+            jobs = [job for job in jobs if job["documents"].edi_format_id.code != BA_EDI_CODE]
+        for job in jobs:
+            # dokumenti u slanju čekaju svoj odgovor ili oporavak
+            job["documents"] = job["documents"].filtered(lambda doc: not doc.l10n_bs_edi_sending_date)
+        return [job for job in jobs if job["documents"]]
+
+    @api.model
+    def _cron_process_documents_web_services(self, job_count=None):
+        return super(AccountEdiDocument, self.with_context(l10n_bs_edi_skip=True))._cron_process_documents_web_services(job_count=job_count)
+
+    @api.model
+    def _l10n_bs_edi_trigger_cron(self):
+        self.env.ref("l10n_bs_edi.ir_cron_l10n_bs_edi_process")._trigger()
+
+    @api.model
+    def _cron_l10n_bs_edi_process_documents(self):
+        """ Send BA documents within a time budget (``l10n_bs_edi.cron_time_budget`` seconds).
+
+        Jobs are processed in chunks of ``l10n_bs_edi.batch_size`` documents with a
+        commit after each one. A chunk is only started when the slowest chunk seen
+        so far still fits in the remaining budget, so the run ends before the worker
+        time limit kills it; the cron re-triggers itself while a backlog remains.
+        """
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        get_param = self.env["ir.config_parameter"].sudo().get_param
+        budget = float(get_param("l10n_bs_edi.cron_time_budget", 60))
+        batch_size = int(get_param("l10n_bs_edi.batch_size", 20))
+        deadline = time.monotonic() + budget
+
+        self._l10n_bs_edi_recover_sending()
+        if auto_commit:
+            self.env.cr.commit()
+
+        # kao core cron: dokumenti blokirani greškom čekaju korisnika
+        documents = self.search([
+            ("state", "in", ("to_send", "to_cancel")),
+            ("move_id.state", "!=", "draft"),
+            ("edi_format_id.code", "=", BA_EDI_CODE),
+            ("blocking_level", "!=", "error"),
+        ])
+        chunks = [
+            self.browse(chunk_ids)
+            for job in documents._prepare_jobs()
+            for chunk_ids in split_every(batch_size, job["documents"].ids)
+        ]
+
+        slowest = 0.0
+        done = 0
+        for chunk in chunks:
+            if time.monotonic() + slowest > deadline:
+                break
+            start = time.monotonic()
+            if chunk[0].state == "to_send" and not chunk.move_id.company_id.l10n_bs_edi_use_queue:
+                chunk._l10n_bs_edi_send(auto_commit=auto_commit)
+            else:
+                chunk._process_documents_web_services(with_commit=False)
+            if auto_commit:
+                self.env.cr.commit()
+            slowest = max(slowest, time.monotonic() - start)
+            done += 1
+
+        remaining = len(chunks) - done
+        if remaining:
+            _logger.info("Fiskalizacija: %s od %s paketa obrađeno, ostatak u sljedećem prolazu", done, len(chunks))
+            self._l10n_bs_edi_trigger_cron()
+        return remaining
+
+    # -------------------------------------------------------------------------
+    # Two-phase send
+    # -------------------------------------------------------------------------
+
+    def _l10n_bs_edi_send(self, auto_commit=True):
+        """ Fiscalize one job of BA documents without holding database locks during the HTTP calls.
+
+        1. lock the documents and invoices, mark them as sending, commit;
+        2. send the payloads to the device, no transaction work;
+        3. record the results in a short transaction.
+
+        Documents left in the sending state by a crash between 1 and 3 are
+        handled by _l10n_bs_edi_recover_sending.
+        """
+        edi_format = self.edi_format_id
+        edi_format.ensure_one()
+        transport, device = edi_format._ba_edi_get_device(self.move_id.company_id)
+        if not device._allow_request(transport=transport):
+            self._l10n_bs_edi_apply_results(edi_format._ba_edi_refused_result(self.move_id, device))
+            return
+
+        # 1. rezervacija
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("SELECT id FROM account_edi_document WHERE id IN %s FOR UPDATE NOWAIT", [tuple(self.ids)])
+                self.env.cr.execute("SELECT id FROM account_move WHERE id IN %s FOR UPDATE NOWAIT", [tuple(self.move_id.ids)])
+        except OperationalError as e:
+            if e.pgcode == errorcodes.LOCK_NOT_AVAILABLE:
+                _logger.info("Fiskalizacija: dokumenti %s su zaključani, preskačem", self.ids)
+                return
+            raise
+        self.invalidate_recordset(["state", "blocking_level", "l10n_bs_edi_sending_date"])
+        documents = self.filtered(lambda doc: doc.state == "to_send" and doc.blocking_level != "error" and not doc.l10n_bs_edi_sending_date)
+        if not documents:
+            return
+        invoices = documents.move_id
+        payloads = self.env["l10n_bs_edi.payload"]._get_payloads(invoices)
+        to_send = [(invoice, payloads[invoice].payload.encode()) for invoice in invoices]
+        documents.write({"l10n_bs_edi_sending_date": fields.Datetime.now()})
+        if auto_commit:
+            self.env.cr.commit()
+
+        # 2. slanje, bez zaključanih redova u bazi
+        responses = edi_format._ba_edi_send_payloads(transport, to_send, company_id=invoices.company_id.id)
+
+        # 3. rezultat
+        edi_result = edi_format._ba_edi_process_send_results(transport, device, payloads, responses)
+        documents._l10n_bs_edi_apply_results(edi_result)
+
+    def _l10n_bs_edi_apply_results(self, edi_result):
+        """ Record account_edi 'post' results through core _process_job, so the documents,
+        their attachments and the documents of reconciled payments are updated exactly as
+        account_edi does. The BA post hook hands back ``edi_result`` instead of calling
+        the device, see account.edi.format._ba_edi_post_invoice.
+        """
+        self.filtered("l10n_bs_edi_sending_date").write({"l10n_bs_edi_sending_date": False})
+        documents = self.with_context(l10n_bs_edi_post_results=edi_result)
+        for job in documents._prepare_jobs():
+            documents._process_job(job)
+
+    @api.model
+    def _l10n_bs_edi_default_sending_timeout(self):
+        """ Worst case of one chunk in flight: every document of a full batch waiting the
+        whole connect and read timeout of the slowest device, plus a margin.
+        """
+        batch_size = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.batch_size", 20))
+        companies = self.env["res.company"].sudo().search([("l10n_bs_edi_api_host", "!=", False)])
+        request_timeout = max(
+            (company.l10n_bs_edi_connect_timeout + company.l10n_bs_edi_read_timeout for company in companies),
+            default=DEFAULT_CONNECT_TIMEOUT + DEFAULT_READ_TIMEOUT,
+        )
+        return int(batch_size * request_timeout) + SENDING_TIMEOUT_MARGIN
+
+    @api.model
+    def _l10n_bs_edi_recover_sending(self):
+        """ Documents stuck in sending for more than ``l10n_bs_edi.sending_timeout`` seconds:
+        the worker died between sending and recording the answer. The device may or may
+        not have fiscalized the invoice, so resending automatically could duplicate it.
+        """
+        timeout = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.sending_timeout", 0)) or self._l10n_bs_edi_default_sending_timeout()
+        stale = self.search([
+            ("l10n_bs_edi_sending_date", "!=", False),
+            ("l10n_bs_edi_sending_date", "<", fields.Datetime.now() - timedelta(seconds=timeout)),
+        ])
+        for document in stale:
+            _logger.warning("Fiskalizacija: slanje fakture %s prekinuto", document.move_id.name)
+            document.write({
+                "l10n_bs_edi_sending_date": False,
+                "blocking_level": "error",
+                "error": _(
+                    "Slanje fiskalnom uređaju je prekinuto (%s). Provjerite na uređaju da li je račun "
+                    "fiskaliziran prije ponovnog slanja.",
+                    document.l10n_bs_edi_sending_date,
+                ),
+            })
+        return stale
@@ -5,14 +5,20 @@ import re
 import json
 import pytz
 import markupsafe
+import dateutil.parser
+import functools
 import requests
+from contextlib import contextmanager
 from datetime import datetime
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from types import MappingProxyType
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.tools import html_escape, float_is_zero, float_compare
 from odoo.exceptions import AccessError, ValidationError
+
+from ..tools import amounts, timing
 #from odoo.addons.iap import jsonrpc
 import logging
 
@@ -21,8 +27,31 @@ _logger = logging.getLogger(__name__)
 #DEFAULT_IAP_ENDPOINT = "https://l10n-in-edi.api.odoo.com"
 #DEFAULT_IAP_TEST_ENDPOINT = "https://l10n-in-edi-demo.api.odoo.com"
 
-IN_GOTOVINA = ('NAČIN PLAĆANJA: GOTOVINA', 'PLAĆANJE GOTOVINOM')
-IN_KARTICA = ('NAČIN PLAĆANJA: KARTICA', 'PLAĆANJE KARTICOM')
+RE_ID_BROJ = re.compile(r"^\d{13}$")
+RE_PDV_BROJ = re.compile(r"^\d{12}$")
+RE_ADDRESS = re.compile(r"^.{3,100}$")
+RE_CANTON = re.compile(r"^.{3,50}$")
+RE_EMAIL = re.compile(r"^[a-zA-Z0-9+_.-]+@[a-zA-Z0-9.-]+$")
+RE_EMAIL_LENGTH = re.compile(r"^.{6,100}$")
+RE_MOVE_NAME = re.compile(r"^.{1,16}$")
+
+# redoslijed je bitan: ako repartition linija nosi više PDV tagova, kasniji ima prednost
+PDV_CODES = ("A", "E", "K")
+# povećati pri svakoj izmjeni sadržaja payloada, poništava keširane payloade
+PAYLOAD_ENGINE_VERSION = 2
+
+BaTaxTagMap = namedtuple("BaTaxTagMap", ["taxable_tag_ids", "non_taxable_tag_ids", "pdv_code_by_tag_id"])
+
+def _timed_stage(stage):
+    """ Time a method(self, moves, ...) as fiscalization ``stage`` of the moves' company. """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, moves, *args, **kwargs):
+            with self._l10n_bs_edi_timed(stage, moves.company_id[:1]):
+                return method(self, moves, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class AccountEdiFormat(models.Model):
     _inherit = "account.edi.format"
@@ -54,31 +83,104 @@ class AccountEdiFormat(models.Model):
           self.env.ref('l10n_bs.tax_tag_E_base').ids
         )
 
+    @tools.ormcache("company_id")
+    def _l10n_bs_edi_get_tax_tag_map(self, company_id):
+        """ Tag lookups used by applicability, configuration checks and tax grouping.
+
+        Cached per registry and company; the cache is cleared when one of the BA tags
+        changes (see account.account.tag) and on module update.
+        """
+        pdv_code_by_tag_id = {}
+        for pdv_code in PDV_CODES:
+            for tag_id in self.env.ref("l10n_bs.tax_tag_%s" % pdv_code).ids:
+                pdv_code_by_tag_id[tag_id] = pdv_code
+        return BaTaxTagMap(
+            taxable_tag_ids=frozenset(self._get_ba_tax_tags()),
+            non_taxable_tag_ids=frozenset(self._get_ba_non_taxable_tags()),
+            pdv_code_by_tag_id=MappingProxyType(pdv_code_by_tag_id),
+        )
+
+    def _l10n_bs_edi_tax_tag_map(self, company=None):
+        return self._l10n_bs_edi_get_tax_tag_map((company or self.env.company).id)
+
+    @api.model
+    def _l10n_bs_edi_get_pdv_code(self, tag_ids, tag_map):
+        codes = {tag_map.pdv_code_by_tag_id[tag_id] for tag_id in tag_ids if tag_id in tag_map.pdv_code_by_tag_id}
+        for pdv_code in reversed(PDV_CODES):
+            if pdv_code in codes:
+                return pdv_code
+        return "other"
+
+    @api.model
+    def _l10n_bs_edi_get_fiscalizable_moves(self, moves):
+        """ Return the subset of ``moves`` that are BA-fiscalizable: BA sale documents
+        with at least one line carrying a taxable BA tag.
+
+        Stored moves are answered with a single query over the move line / tag
+        relation for the whole recordset instead of reading tags move by move.
+        """
+        candidates = moves.filtered(lambda move: move.is_sale_document(include_receipts=True) and move.country_code == 'BA')
+        stored = candidates.filtered(lambda move: isinstance(move.id, int))
+        fiscalizable = self.env["account.move"]
+
+        # nove (nesnimljene) fakture se provjeravaju kroz ORM
+        for move in candidates - stored:
+            tag_map = self._l10n_bs_edi_tax_tag_map(move.company_id)
+            if not tag_map.taxable_tag_ids.isdisjoint(move.line_ids.tax_tag_ids.ids):
+                fiscalizable |= move
+
+        if stored:
+            self.env["account.move.line"].flush_model(["move_id", "tax_tag_ids"])
+            move_ids_by_company = defaultdict(list)
+            for move in stored:
+                move_ids_by_company[move.company_id].append(move.id)
+            for company, move_ids in move_ids_by_company.items():
+                tag_map = self._l10n_bs_edi_tax_tag_map(company)
+                self.env.cr.execute("""
+                    SELECT DISTINCT aml.move_id
+                      FROM account_move_line aml
+                      JOIN account_account_tag_account_move_line_rel rel ON rel.account_move_line_id = aml.id
+                     WHERE aml.move_id = ANY(%s)
+                       AND rel.account_account_tag_id = ANY(%s)
+                """, [move_ids, list(tag_map.taxable_tag_ids)])
+                fiscalizable |= self.env["account.move"].browse(move_id for move_id, in self.env.cr.fetchall())
+        return fiscalizable
+
     def _get_move_applicability(self, move):
         # EXTENDS account_edi
         self.ensure_one()
         if self.code != 'ba_fiskalne_1_00':
             return super()._get_move_applicability(move)
-        is_taxable = any(move_line_tag.id in self._get_ba_tax_tags() for move_line_tag in move.line_ids.tax_tag_ids)
-        if move.is_sale_document(include_receipts=True) and move.country_code == 'BA' and is_taxable:
+        # izračunato zajedno za sve fakture iz prefetch-a, vidi _l10n_bs_edi_get_fiscalizable_moves
+        if move.l10n_bs_edi_is_fiscalizable:
             return {
                 'post': self._ba_edi_post_invoice,
-                #'post_batching': self._ba_edi_post_batch,
+                'post_batching': self._ba_edi_post_batching,
                 # nije moguc cancel
                 'cancel': self._l10n_ba_edi_cancel_invoice,
                 #'cancel': self._ba_edi_post_invoice, # radi testiranja, cancel proces isti kao i post
                 'edi_content': self._l10n_bs_edi_invoice_content,
             }
 
-    #def _ba_edi_post_batch(self, account_move):
-    #    print(account_move)
+    def _ba_edi_post_batching(self, move):
+        # account_edi već grupiše po kompaniji, dodajemo fiskalni uređaj i tip dokumenta
+        return (move.company_id.sudo().l10n_bs_edi_api_host, move.move_type)
 
     def _needs_web_services(self):
         self.ensure_one()
         return self.code == "ba_fiskalne_1_00" or super()._needs_web_services()
 
     def _l10n_bs_edi_invoice_content(self, invoice):
-        return json.dumps(self._ba_edi_generate_invoice_json(invoice)).encode()
+        return self._l10n_bs_edi_get_payload(invoice)
+
+    def _l10n_bs_edi_dump_payload(self, invoice):
+        return json.dumps(self._ba_edi_generate_invoice_json(invoice))
+
+    def _l10n_bs_edi_get_payload(self, invoice):
+        """ Payload bytes of the invoice for edi_content: the stored (sent) payload while
+        still valid, otherwise built in memory without writing anything.
+        """
+        return self.env["l10n_bs_edi.payload"]._get_preview_payloads(invoice)[invoice].encode()
 
     def _l10n_bs_edi_extract_digits(self, string):
         if not string:
@@ -90,19 +192,63 @@ class AccountEdiFormat(models.Model):
     def _check_move_configuration(self, move):
         if self.code != "ba_fiskalne_1_00":
             return super()._check_move_configuration(move)
-        error_message = []
-        error_message += self._ba_validate_partner(move.partner_id)
-        error_message += self._ba_validate_partner(move.company_id.partner_id, is_company=True)
-        if not re.match("^.{1,16}$", move.name):
-            error_message.append(_("Broj fakture ne smije biti veći od 16 znakova"))
-        all_base_tags = self._get_ba_tax_tags() + self._get_ba_non_taxable_tags()
-        for line in move.invoice_line_ids.filtered(lambda line: line.display_type not in ('line_note', 'line_section', 'rounding')):
-            if line.display_type == 'product' and line.discount < 0:
-                error_message.append(_("Negativni popust nije dozvoljen %s", line.name))
-            if not line.tax_tag_ids or not any(move_line_tag.id in all_base_tags for move_line_tag in line.tax_tag_ids):
-                error_message.append(_(
-                    """Postaviti odgovarajuću stopu PDV na liniju "%s" """, line.product_id.name))
-        return error_message
+        with self._l10n_bs_edi_timed("validation", move.company_id):
+            return [error["message"] for error in self._l10n_bs_edi_validate_moves(move)[move]]
+
+    @contextmanager
+    def _l10n_bs_edi_timed(self, stage, company):
+        """ Record the duration of a fiscalization stage, see tools/timing.py """
+        if self.env.context.get("l10n_bs_edi_dry_run"):
+            # probna fiskalizacija ne ulazi u statistiku
+            yield
+            return
+        company = company or self.env.company
+        with timing.timed(self.env.cr.dbname, company.id, company.sudo().l10n_bs_edi_api_host, stage):
+            yield
+        self.env["l10n_bs_edi.timing"]._flush_if_due()
+
+    def _l10n_bs_edi_validate_moves(self, moves):
+        """ Pre-flight validation of many moves at once.
+
+        Each distinct partner is validated only once and line tags are checked
+        against the cached tag sets.
+
+        :return: dict move -> list of {'code', 'message'}, messages in the order
+                 _check_move_configuration reports them
+        """
+        partner_errors = {}
+
+        def validate_partner(partner, is_company=False):
+            if partner not in partner_errors:
+                # spremni partneri su već provjereni pri zadnjoj izmjeni, vidi res.partner
+                errors = [] if partner.l10n_bs_edi_fiscal_ready else self._l10n_bs_edi_partner_errors(partner, is_company=is_company)
+                if errors:
+                    errors.insert(0, ("partner", "%s" % (partner.display_name)))
+                partner_errors[partner] = [{"code": code, "message": message} for code, message in errors]
+            return partner_errors[partner]
+
+        lines_by_move = defaultdict(list)
+        for line in moves.invoice_line_ids:
+            if line.display_type not in ('line_note', 'line_section', 'rounding'):
+                lines_by_move[line.move_id].append(line)
+
+        report = {}
+        for move in moves:
+            errors = []
+            errors += validate_partner(move.partner_id)
+            errors += validate_partner(move.company_id.partner_id, is_company=True)
+            if not RE_MOVE_NAME.match(move.name or ""):
+                errors.append({"code": "move_name", "message": _("Broj fakture ne smije biti veći od 16 znakova")})
+            tag_map = self._l10n_bs_edi_tax_tag_map(move.company_id)
+            all_base_tags = tag_map.taxable_tag_ids | tag_map.non_taxable_tag_ids
+            for line in lines_by_move[move]:
+                if line.display_type == 'product' and line.discount < 0:
+                    errors.append({"code": "negative_discount", "message": _("Negativni popust nije dozvoljen %s", line.name)})
+                if all_base_tags.isdisjoint(line.tax_tag_ids.ids):
+                    errors.append({"code": "line_tax", "message": _(
+                        """Postaviti odgovarajuću stopu PDV na liniju "%s" """, line.product_id.name)})
+            report[move] = errors
+        return report
 
     #def _l10n_bs_edi_get_iap_buy_credits_message(self, company):
     #    url = self.env["iap.account"].get_credits_url(service_name="l10n_bs_edi")
@@ -115,49 +261,184 @@ class AccountEdiFormat(models.Model):
 
 
     
-    def _ba_edi_post_invoice(self, invoice):
-        json_data = self._ba_edi_generate_invoice_json(invoice)
-  
-        api_host=invoice.company_id.sudo().l10n_bs_edi_api_host
-        api_key=invoice.company_id.sudo().l10n_bs_edi_api_key
+    @_timed_stage("post")
+    def _ba_edi_post_invoice(self, invoices):
+        """ account_edi 'post' hook. Companies working through the fiscalization
+        queue only get their invoices enqueued here, the queue drainer talks to
+        the device and this hook reports the outcome on the next run.
+        """
+        posted = self.env.context.get("l10n_bs_edi_post_results")
+        if posted is not None:
+            # odgovor uređaja iz dvofaznog slanja, vidi account.edi.document._l10n_bs_edi_apply_results
+            return {invoice: posted[invoice] for invoice in invoices if invoice in posted}
+        company = invoices.company_id
+        company.ensure_one()
+        if company.l10n_bs_edi_use_queue:
+            return self.env["l10n_bs_edi.fiscal.queue"]._edi_result(invoices)
+        return self._ba_edi_fiscalize(invoices)
+
+    def _ba_edi_fiscalize(self, invoices):
+        """Fiscalize a batch of invoices sharing company, fiscal host and move type.
+
+        Payloads come from the payload cache (see l10n_bs_edi.payload), so a retry
+        sends exactly the bytes that were shown and sent before. Requests go through
+        the company's pooled transport.
 
-        _url = f"{api_host}/api/invoices"
-        #_url_ping = f"{api_host}/api/ping"
+        :return: dict invoice -> account_edi result
+        """
+        transport, device = self._ba_edi_get_device(invoices.company_id)
+        if not device._allow_request(transport=transport):
+            return self._ba_edi_refused_result(invoices, device)
+        payloads = self.env["l10n_bs_edi.payload"]._get_payloads(invoices)
+        responses = self._ba_edi_send_payloads(transport, [
+            (invoice, payloads[invoice].payload.encode()) for invoice in invoices
+        ], company_id=invoices.company_id.id)
+        return self._ba_edi_process_send_results(transport, device, payloads, responses)
+
+    def _ba_edi_get_device(self, company):
+        """ :return: (transport, l10n_bs_edi.device) of the company's fiscal device """
+        company.ensure_one()
+        transport = company._l10n_bs_edi_get_transport()
+        return transport, self.env["l10n_bs_edi.device"]._get_device(transport.host)
 
-        headers = {
-            "Authorization": "Bearer %s" % api_key,
-            "Content-type": "application/json",
-            "accept": "application/json"
+    def _ba_edi_refused_result(self, invoices, device):
+        # uređaj je isključen, ne čeka se na timeout za svaku fakturu
+        return {
+            invoice: {"success": False, "error": device._refused_error(), "blocking_level": "warning"}
+            for invoice in invoices
         }
 
-        response = requests.post(url=_url, json=json_data, headers=headers)
-        #response = requests.post(url=_url_ping, json={"msg": "ping"}) #, headers=headers)
-        
+    @api.model
+    def _ba_edi_send_payloads(self, transport, payloads, company_id=None):
+        """ Network only, no ORM access: safe to call without a transaction.
+
+        Payloads are sent one after another so the device receives the invoices
+        in order. After the first connection failure the remaining payloads are
+        not sent.
+
+        :param payloads: list of (key, payload bytes)
+        :param company_id: for the timing of the device calls
+        :return: list of (key, response or RequestException)
+        """
+        dbname = self.env.cr.dbname
+        company_id = company_id or self.env.company.id
+        results = []
+        device_error = None
+        for key, data in payloads:
+            if device_error is not None:
+                results.append((key, requests.exceptions.ConnectionError("Fiskalni uređaj %s nije dostupan" % transport.host)))
+                continue
+            try:
+                with timing.timed(dbname, company_id, transport.host, "http"):
+                    results.append((key, transport.post("/api/invoices", data=data)))
+            except requests.exceptions.RequestException as e:
+                device_error = e
+                results.append((key, e))
+        return results
+
+    def _ba_edi_process_send_results(self, transport, device, payloads, responses):
+        """ Record the device answers of _ba_edi_send_payloads.
+
+        :param payloads: dict invoice -> l10n_bs_edi.payload
+        :param responses: list of (invoice, response or RequestException)
+        :return: dict invoice -> account_edi result
+        """
+        edi_result = {}
+        device_error = None
+        for invoice, response in responses:
+            if isinstance(response, requests.exceptions.RequestException):
+                if device_error is None:
+                    device_error = response
+                    _logger.warning("Fiskalni uređaj %s nije dostupan: %s", transport.host, response)
+                if isinstance(response, requests.exceptions.ConnectionError):
+                    edi_result[invoice] = {
+                        "success": False,
+                        "error": _("Fiskalni uređaj %s nije dostupan", transport.host),
+                        # warning: ništa nije isporučeno, account_edi cron pokušava ponovo
+                        "blocking_level": "warning",
+                    }
+                else:
+                    # npr. ReadTimeout: uređaj je možda primio fakturu i izdao račun
+                    edi_result[invoice] = {
+                        "success": False,
+                        "error": _(
+                            "Fiskalni uređaj %s nije odgovorio (%s). Provjerite na uređaju da li je račun "
+                            "fiskaliziran prije ponovnog slanja.",
+                            transport.host, type(response).__name__,
+                        ),
+                        "blocking_level": "error",
+                    }
+                continue
+            payloads[invoice].date_sent = fields.Datetime.now()
+            edi_result.update(self._ba_edi_process_response(invoice, response, payload=payloads[invoice].payload))
+        if device_error is not None:
+            device._record_failure(device_error)
+        elif edi_result:
+            device._record_success()
+        return edi_result
+
+    @api.model
+    def _l10n_bs_edi_response_values(self, response_json):
+        """ account.move values of a successful device response; the JSON attachment is only an audit copy. """
+        def first(*keys):
+            return next((response_json[key] for key in keys if response_json.get(key) not in (None, "")), False)
+
+        fiscal_datetime = first("sdcDateTime", "dateTime", "invoiceDateTime")
+        if fiscal_datetime:
+            try:
+                fiscal_datetime = dateutil.parser.isoparse(fiscal_datetime)
+            except ValueError:
+                fiscal_datetime = False
+        if fiscal_datetime and fiscal_datetime.tzinfo:
+            fiscal_datetime = fiscal_datetime.astimezone(pytz.utc).replace(tzinfo=None)
+        if fiscal_datetime:
+            fiscal_datetime = fiscal_datetime.replace(microsecond=0)
+        total = first("totalAmount", "total")
+        counter = first("invoiceCounter", "counter")
+        return {
+            "ba_edi_fiskalni_broj": response_json.get("invoiceNumber"),
+            "l10n_bs_edi_fiscal_datetime": fiscal_datetime,
+            "l10n_bs_edi_device_id": first("signedBy", "deviceId", "requestedBy"),
+            "l10n_bs_edi_fiscal_total": float(total) if total is not False else False,
+            "l10n_bs_edi_fiscal_counter": counter and str(counter),
+            "l10n_bs_edi_verification_url": first("verificationUrl", "verificationURL"),
+        }
+
+    def _ba_edi_process_response(self, invoice, response, payload=None):
+        """ :param payload: JSON string sent to the device, the payment type is recorded from it """
         success = False
         error_msg = "FPRINT: GREŠKA pri štampanju fiskalnog računa!"
 
         if response.status_code == 200:
             response_json = response.json()
-            if response_json.get("invoiceNumber"):
+            taken_by = response_json.get("invoiceNumber") and invoice._l10n_bs_edi_find_by_fiscal_numbers(
+                [response_json["invoiceNumber"]], move_type=invoice.move_type, company=invoice.company_id,
+            ).get(response_json["invoiceNumber"])
+            if taken_by and taken_by != invoice:
+                # račun je odštampan, ali broj ne smije ostati na dvije fakture
+                error_msg = _("Fiskalni uređaj je vratio broj %s koji već ima %s", response_json["invoiceNumber"], taken_by.name)
+            elif response_json.get("invoiceNumber"):
                 #json_dump = json.dumps(response.get("data"))
                 json_dump = json.dumps(response_json)
                 json_name = "%s_fiskalni.json" % (invoice.name.replace("/", "_"))
-                attachment = self.env["ir.attachment"].create({
-                    "name": json_name,
-                    "raw": json_dump.encode(),
-                    "res_model": "account.move",
-                    "res_id": invoice.id,
-                    "mimetype": "application/json",
+                with self._l10n_bs_edi_timed("attachment", invoice.company_id):
+                    attachment = self.env["ir.attachment"].create({
+                        "name": json_name,
+                        "raw": json_dump.encode(),
+                        "res_model": "account.move",
+                        "res_id": invoice.id,
+                        "mimetype": "application/json",
+                    })
+                invoice.write({
+                    **self._l10n_bs_edi_response_values(response_json),
+                    # ono što je uređaj primio, ne pravila kakva su sada
+                    "l10n_bs_edi_payment_type": invoice._l10n_bs_edi_sent_payment_type(payload)
+                        or self._ba_edi_get_payment_type(invoice),
                 })
-                invoice.ba_edi_fiskalni_broj = response_json.get('invoiceNumber')
                 success = True
             else:
                 error_msg = response_json.get("message")
                 success = False
-                
-                
-        else:
-            success = False
 
         if success:
             return {
@@ -291,24 +572,34 @@ class AccountEdiFormat(models.Model):
 
     def _ba_validate_partner(self, partner, is_company=False):
         self.ensure_one()
+        if partner.l10n_bs_edi_fiscal_ready:
+            return []
+        message = [message for _code, message in self._l10n_bs_edi_partner_errors(partner, is_company=is_company)]
+        if message:
+            message.insert(0, "%s" %(partner.display_name))
+        return message
+
+    @api.model
+    def _l10n_bs_edi_partner_errors(self, partner, is_company=False):
+        """ :return: list of (code, message) for the partner data the fiscal device needs """
         message = []
-        
+
         if partner.country_id.code == "BA":
-            if not re.match("^\d{13}$", partner.company_registry or ""):
-                message.append(f"- ID broj mora biti 13 znakova: '{partner.company_registry}'")
-            if not re.match("^\d{12}$", partner.vat or ""):
+            if not RE_ID_BROJ.match(partner.company_registry or ""):
+                message.append(("partner_company_registry", f"- ID broj mora biti 13 znakova: '{partner.company_registry}'"))
+            if not RE_PDV_BROJ.match(partner.vat or ""):
                 # nije setovana fiskalna pozicija, ili je setovana fiskalna pozicija ali nije NE-PDV Obveznik
                 if (not partner.property_account_position_id) and (partner.property_account_position_id and not (partner.property_account_position_id.name.upper() == 'NE-PDV OBVEZNIK')):
                     # NE-PDV obveznike preskoči
-                    message.append(f"- PDV broj mora biti 12 znakova: '{partner.vat}'")
-        if not re.match("^.{3,100}$", partner.street or ""):
-            message.append(_("- Ulica min 3, max 100 znakova"))
-        if partner.street2 and not re.match("^.{3,100}$", partner.street2):
-            message.append(_("- Ulica2 should be min 3, 100 znakova"))
-        if not re.match("^.{3,100}$", partner.city or ""):
-            message.append(_("- Grad mora imati min 3 max 100 znakova"))
-        if partner.country_id.code == "BA" and not re.match("^.{3,50}$", partner.state_id.name or ""):
-            message.append(_("- Kanton mora biti 3-50 znakova"))
+                    message.append(("partner_vat", f"- PDV broj mora biti 12 znakova: '{partner.vat}'"))
+        if not RE_ADDRESS.match(partner.street or ""):
+            message.append(("partner_street", _("- Ulica min 3, max 100 znakova")))
+        if partner.street2 and not RE_ADDRESS.match(partner.street2):
+            message.append(("partner_street2", _("- Ulica2 should be min 3, 100 znakova")))
+        if not RE_ADDRESS.match(partner.city or ""):
+            message.append(("partner_city", _("- Grad mora imati min 3 max 100 znakova")))
+        if partner.country_id.code == "BA" and not RE_CANTON.match(partner.state_id.name or ""):
+            message.append(("partner_state", _("- Kanton mora biti 3-50 znakova")))
         #if partner.country_id.code == "BA" and not re.match("^[0-9]{5,}$", partner.zip or ""):
         #    message.append(_("- Poštanski broj mora imati 5 cifri"))
         #if partner.phone and not re.match("^[0-9]{10,12}$",
@@ -316,12 +607,10 @@ class AccountEdiFormat(models.Model):
         #):
         #    message.append(_("- Mobile number should be minimum 10 or maximum 12 digits"))
         if partner.email and (
-            not re.match(r"^[a-zA-Z0-9+_.-]+@[a-zA-Z0-9.-]+$", partner.email)
-            or not re.match("^.{6,100}$", partner.email)
+            not RE_EMAIL.match(partner.email)
+            or not RE_EMAIL_LENGTH.match(partner.email)
         ):
-            message.append(_("- email adresa treba biti validna, ne može imati više od 100 znakova"))
-        if message:
-            message.insert(0, "%s" %(partner.display_name))
+            message.append(("partner_email", _("- email adresa treba biti validna, ne može imati više od 100 znakova")))
         return message
 
     def _get_ba_seller_buyer(self, move):
@@ -535,12 +824,14 @@ class AccountEdiFormat(models.Model):
 #  
 #        return json_payload
    
+    @_timed_stage("payload")
     def _ba_edi_generate_invoice_json(self, invoice):
-        tax_details = self._ba_prepare_edi_tax_details(invoice)
-        tax_details_by_code = self._get_ba_tax_details_by_pdv_code(tax_details.get("tax_details", {}))
-   
-        aggregated_items = {
-        }
+        if invoice.company_id.l10n_bs_edi_payload_engine == "sql":
+            aggregated_items = self._ba_edi_get_aggregated_items_sql(invoice).get(invoice)
+            if aggregated_items is None:
+                aggregated_items = self._ba_edi_get_aggregated_items(invoice)
+        else:
+            aggregated_items = self._ba_edi_get_aggregated_items(invoice)
 
         invoice_type = "Normal"  # Normal, Copy
         transaction_type = "Sale" # Sale, Refund
@@ -548,26 +839,11 @@ class AccountEdiFormat(models.Model):
         stornirati_fiskalni_datum = ""
         nacin_placanja = "WireTransfer"
 
-        for tax_detail in tax_details_by_code:
-            nacin_placanja = tax_detail["nacin_placanja"]
-            if not tax_detail['pdv_code'] in aggregated_items:
-                if tax_detail['move_type'] == "out_refund":
-                    transaction_type = "Refund"
-                    stornirati_fiskalni_number = tax_detail["refund_ref_number"]
-                    stornirati_fiskalni_datum = tax_detail["refund_ref_date"]
-
-                aggregated_items[ tax_detail['pdv_code'] ] = {
-                    'base_amount': tax_detail['base_amount'],
-                    'tax_amount': tax_detail['tax_amount'],
-                    'tax_rate': tax_detail['tax_rate'],
-                    'product_type': tax_detail['product_type'],
-                    'quantity': 1,
-                }
-            else:
-                aggregated_items[ tax_detail['pdv_code'] ]['base_amount'] += tax_detail['base_amount']
-                aggregated_items[ tax_detail['pdv_code'] ]['tax_amount'] += tax_detail['tax_amount']
-                if aggregated_items[ tax_detail['pdv_code'] ]['product_type'] != tax_detail['product_type']:
-                    aggregated_items[ tax_detail['pdv_code'] ]['product_type'] = 'mixed'
+        if aggregated_items:
+            nacin_placanja = self._ba_edi_get_payment_type(invoice)
+            if invoice.move_type == "out_refund":
+                transaction_type = "Refund"
+                stornirati_fiskalni_number, stornirati_fiskalni_datum = self._ba_edi_get_refund_reference(invoice)
 
         #seller = invoice.company_id.partner_id
         customer = {
@@ -580,26 +856,31 @@ class AccountEdiFormat(models.Model):
 
         invoice_items = []
 
-        totalInovice = 0
+        # iznosi u centima valute, ukupno i plaćanje su zbir zaokruženih stavki
+        currency = invoice.company_id.currency_id
+        total_units = 0
         for key in aggregated_items.keys():
             pdv_code = key
+            base_units = amounts.to_units(aggregated_items[key]["base_amount"], currency.rounding, currency.decimal_places)
+            tax_units = amounts.to_units(aggregated_items[key]["tax_amount"], currency.rounding, currency.decimal_places)
+            item_total = amounts.from_units(base_units + tax_units, currency.decimal_places)
             invoice_items.append ({
                 "name": f"St.{invoice.name}",
                 "labels": [ pdv_code ],  # PDV taxe 
                 
-                "baseAmount": self._round_value(aggregated_items[key]["base_amount"]), # bez PDV
-                "taxAmount": self._round_value(aggregated_items[key]["tax_amount"]), # iznos PDV
-                "unitPrice": self._round_value(aggregated_items[key]["base_amount"] + aggregated_items[key]["tax_amount"]),
-                "discount": self._round_value(0),
+                "baseAmount": amounts.from_units(base_units, currency.decimal_places), # bez PDV
+                "taxAmount": amounts.from_units(tax_units, currency.decimal_places), # iznos PDV
+                "unitPrice": item_total,
+                "discount": 0.0,
                 "quantity": aggregated_items[key]["quantity"],
 
-                "totalAmount": self._round_value(aggregated_items[key]["base_amount"] + aggregated_items[key]["tax_amount"]),
+                "totalAmount": item_total,
             })
-            totalInovice += aggregated_items[key]["base_amount"] + aggregated_items[key]["tax_amount"]
+            total_units += base_units + tax_units
 
         payments = [
             {
-                "amount": self._round_value(totalInovice),
+                "amount": amounts.from_units(total_units, currency.decimal_places),
                 "paymentType": nacin_placanja     # "Cash", "Card", "WireTransfer", "Other"
             }
         ]
@@ -620,41 +901,201 @@ class AccountEdiFormat(models.Model):
   
         return json_payload
        
+    def _ba_edi_get_aggregated_items(self, invoice):
+        """ Base and tax amounts per PDV code computed through account_edi tax details. """
+        tax_details = self._ba_prepare_edi_tax_details(invoice)
+        tax_details_by_code = self._get_ba_tax_details_by_pdv_code(tax_details.get("tax_details", {}))
+
+        aggregated_items = {
+        }
+
+        # zbir u Decimal, zaokružuje se tek u payloadu
+        for tax_detail in tax_details_by_code:
+            if not tax_detail['pdv_code'] in aggregated_items:
+                aggregated_items[ tax_detail['pdv_code'] ] = {
+                    'base_amount': amounts.to_decimal(tax_detail['base_amount']),
+                    'tax_amount': amounts.to_decimal(tax_detail['tax_amount']),
+                    'tax_rate': tax_detail['tax_rate'],
+                    'product_type': tax_detail['product_type'],
+                    'quantity': 1,
+                }
+            else:
+                aggregated_items[ tax_detail['pdv_code'] ]['base_amount'] += amounts.to_decimal(tax_detail['base_amount'])
+                aggregated_items[ tax_detail['pdv_code'] ]['tax_amount'] += amounts.to_decimal(tax_detail['tax_amount'])
+                if aggregated_items[ tax_detail['pdv_code'] ]['product_type'] != tax_detail['product_type']:
+                    aggregated_items[ tax_detail['pdv_code'] ]['product_type'] = 'mixed'
+        return aggregated_items
+
+    def _ba_edi_get_payload_engines(self, invoices):
+        """ :return: dict invoice -> engine that builds its payload; the SQL engine falls
+                     back to the ORM one for the moves it does not support
+        """
+        sql_invoices = invoices.filtered(lambda move: move.company_id.l10n_bs_edi_payload_engine == "sql")
+        if sql_invoices:
+            sql_invoices -= self._ba_edi_get_sql_unsupported_moves(sql_invoices)
+        return {invoice: "sql" if invoice in sql_invoices else "orm" for invoice in invoices}
+
+    def _ba_edi_get_sql_unsupported_moves(self, invoices):
+        """ Moves the SQL engine can't reproduce exactly: foreign currency, companies
+        rounding taxes globally, or taxes other than plain price-excluded percentages.
+        """
+        unsupported = invoices.filtered(
+            lambda move: move.currency_id != move.company_id.currency_id
+            or move.company_id.tax_calculation_rounding_method == "round_globally"
+        )
+        self.env["account.move.line"].flush_model(["move_id", "display_type", "tax_ids"])
+        self.env["account.tax"].flush_model(["amount_type", "price_include", "include_base_amount"])
+        self.env.cr.execute("""
+            SELECT DISTINCT aml.move_id
+              FROM account_move_line aml
+              JOIN account_move_line_account_tax_rel tax_rel ON tax_rel.account_move_line_id = aml.id
+              JOIN account_tax tax ON tax.id = tax_rel.account_tax_id
+             WHERE aml.move_id = ANY(%s)
+               AND aml.display_type = 'product'
+               AND (tax.amount_type != 'percent' OR tax.price_include OR tax.include_base_amount)
+        """, [invoices.ids])
+        return unsupported | self.env["account.move"].browse(move_id for move_id, in self.env.cr.fetchall())
+
+    def _ba_edi_get_aggregated_items_sql(self, invoices):
+        """ Same result as _ba_edi_get_aggregated_items, computed with one grouped query per company
+        over the product lines, their taxes and the tags of the tax repartition lines.
+
+        Per line the tax is rounded to the currency precision like account.tax does,
+        then summed per PDV code. Codes come out in the order the ORM engine first
+        meets them (line, tax sequence, repartition line).
+
+        :return: dict invoice -> aggregated items, invoices the engine does not support are left out
+        """
+        invoices = invoices - self._ba_edi_get_sql_unsupported_moves(invoices)
+        if not invoices:
+            return {}
+
+        self.env.flush_all()
+        # podržane su samo fakture u valuti kompanije, pa kompanija određuje i tagove i decimale
+        invoices_by_company = defaultdict(lambda: self.env["account.move"])
+        for invoice in invoices:
+            invoices_by_company[invoice.company_id] |= invoice
+        aggregated_by_move = {}
+        for company, company_invoices in invoices_by_company.items():
+            aggregated_by_move.update(self._ba_edi_query_aggregated_items(company, company_invoices))
+        return aggregated_by_move
+
+    def _ba_edi_query_aggregated_items(self, company, invoices):
+        """ The grouped query of _ba_edi_get_aggregated_items_sql for the invoices of one company. """
+        tag_map = self._l10n_bs_edi_tax_tag_map(company)
+        pdv_tags = list(tag_map.pdv_code_by_tag_id.items())
+        self.env.cr.execute("""
+            WITH pdv_tag AS (
+                SELECT * FROM unnest(%(tag_ids)s::int[], %(codes)s::varchar[], %(ranks)s::int[]) AS t(tag_id, code, rank)
+            ),
+            rep_pdv AS (
+                SELECT rep.id,
+                       COALESCE((ARRAY_AGG(pdv_tag.code ORDER BY pdv_tag.rank DESC NULLS LAST))[1], 'other') AS pdv_code
+                  FROM account_tax_repartition_line rep
+             LEFT JOIN account_account_tag_account_tax_repartition_line_rel tag_rel
+                       ON tag_rel.account_tax_repartition_line_id = rep.id
+             LEFT JOIN pdv_tag ON pdv_tag.tag_id = tag_rel.account_account_tag_id
+                 WHERE rep.repartition_type = 'tax'
+                   AND rep.company_id = %(company_id)s
+              GROUP BY rep.id
+            ),
+            line_tax AS (
+                SELECT aml.move_id,
+                       aml.id AS line_id,
+                       tax.id AS tax_id,
+                       tax.sequence AS tax_sequence,
+                       rep.id AS rep_id,
+                       rep.sequence AS rep_sequence,
+                       rep_pdv.pdv_code,
+                       CASE WHEN move.move_type = 'out_refund' THEN aml.balance ELSE -aml.balance END AS base_amount,
+                       ROUND(
+                           CASE WHEN move.move_type = 'out_refund' THEN aml.balance ELSE -aml.balance END
+                           * tax.amount / 100.0 * rep.factor_percent / 100.0,
+                           %(decimal_places)s
+                       ) AS tax_amount
+                  FROM account_move_line aml
+                  JOIN account_move move ON move.id = aml.move_id
+                  JOIN account_move_line_account_tax_rel tax_rel ON tax_rel.account_move_line_id = aml.id
+                  JOIN account_tax tax ON tax.id = tax_rel.account_tax_id
+                  JOIN account_tax_repartition_line rep
+                       ON rep.repartition_type = 'tax'
+                      AND (CASE WHEN move.move_type = 'out_refund' THEN rep.refund_tax_id ELSE rep.invoice_tax_id END) = tax.id
+                  JOIN rep_pdv ON rep_pdv.id = rep.id
+                 WHERE aml.move_id = ANY(%(move_ids)s)
+                   AND aml.display_type = 'product'
+            ),
+            base AS (
+                SELECT DISTINCT move_id, line_id, tax_id, pdv_code, base_amount
+                  FROM line_tax
+            ),
+            base_by_code AS (
+                SELECT move_id, pdv_code, SUM(base_amount) AS base_amount
+                  FROM base
+              GROUP BY move_id, pdv_code
+            )
+            SELECT line_tax.move_id,
+                   line_tax.pdv_code,
+                   base_by_code.base_amount,
+                   SUM(line_tax.tax_amount) AS tax_amount
+              FROM line_tax
+              JOIN base_by_code ON base_by_code.move_id = line_tax.move_id
+                               AND base_by_code.pdv_code = line_tax.pdv_code
+          GROUP BY line_tax.move_id, line_tax.pdv_code, base_by_code.base_amount
+          ORDER BY line_tax.move_id,
+                   MIN(ARRAY[line_tax.line_id, line_tax.tax_sequence, line_tax.tax_id, line_tax.rep_sequence, line_tax.rep_id])
+        """, {
+            "tag_ids": [tag_id for tag_id, _code in pdv_tags],
+            "codes": [code for _tag_id, code in pdv_tags],
+            "ranks": [PDV_CODES.index(code) for _tag_id, code in pdv_tags],
+            "company_id": company.id,
+            "decimal_places": company.currency_id.decimal_places,
+            "move_ids": invoices.ids,
+        })
+
+        aggregated_by_move = {invoice: {} for invoice in invoices}
+        for move_id, pdv_code, base_amount, tax_amount in self.env.cr.fetchall():
+            aggregated_by_move[self.env["account.move"].browse(move_id)][pdv_code] = {
+                'base_amount': base_amount,
+                'tax_amount': tax_amount,
+                'quantity': 1,
+            }
+        return aggregated_by_move
+
+    def _ba_edi_get_payment_type(self, move):
+        """ "Cash", "Card", "WireTransfer" or "Other", see l10n_bs_edi.payment.type.rule """
+        return self.env["l10n_bs_edi.payment.type.rule"]._get_payment_type(move)
+
+    def _ba_edi_get_refund_reference(self, move):
+        """ :return: (fiscal number, invoice date) of the invoice a refund reverses,
+        from reversed_entry_id or else from the fiscal number entered on the refund
+        """
+        original = move.reversed_entry_id
+        number = original.ba_edi_fiskalni_broj
+        if number or not move.l10n_bs_edi_refund_fiscal_number:
+            return number, original.invoice_date
+        number = move.l10n_bs_edi_refund_fiscal_number
+        original = move._l10n_bs_edi_find_by_fiscal_numbers([number], company=move.company_id).get(number)
+        return number, original.invoice_date if original else move.l10n_bs_edi_refund_fiscal_date
+
     @api.model
+    @_timed_stage("tax_details")
     def _ba_prepare_edi_tax_details(self, move, in_foreign=False, filter_invl_to_apply=None):
+        tag_map = self._l10n_bs_edi_tax_tag_map(move.company_id)
+        # isti za sve stavke, računa se jednom po fakturi
+        move_type = move.move_type # 'out_invoice', 'out_refund'
+        nacin_placanja = self._ba_edi_get_payment_type(move)
+        refund_ref_number = None
+        refund_ref_date = None
+        if move_type == 'out_refund':
+            refund_ref_number, refund_ref_date = self._ba_edi_get_refund_reference(move)
+
         def ba_grouping_key_generator(base_line, tax_values):
             invl = base_line['record']
             tax = tax_values['tax_repartition_line'].tax_id
             tags = tax_values['tax_repartition_line'].tag_ids
 
-            move_type = invl.move_id.move_type # 'out_invoice', 'out_refund'
-            payment_term = invl.move_id.invoice_payment_term_id.name
-            nacin_placanja = 'WireTransfer'
-            if payment_term:
-                if payment_term.upper() in IN_GOTOVINA:
-                    nacin_placanja = 'Cash'
-                elif payment_term and payment_term.upper() in IN_KARTICA:
-                    nacin_placanja = 'Card'
-
-            # ako je storno račun, način plaćanja se može navesti samo u opisu računa
-            #if move_type == "out_refund":
-            if invl.move_id.narration:
-                if any(token in invl.move_id.narration.upper() for token in IN_GOTOVINA):
-                    nacin_placanja = 'Cash'
-                elif any(token in invl.move_id.narration.upper() for token in IN_KARTICA):
-                    nacin_placanja = 'Card'
-
-            refund_ref_number = None
-            refund_ref_date = None
-            if move_type == 'out_refund':
-                refund_ref_number = invl.move_id.reversed_entry_id.ba_edi_fiskalni_broj
-                refund_ref_date = invl.move_id.reversed_entry_id.invoice_date
-
-            pdv_code = "other"
             #if not invl.currency_id.is_zero(tax_values['tax_amount_currency']):
-            for pdv_tag in [ "A", "E", "K"]:
-                if any(tag in tags for tag in self.env.ref("l10n_bs.tax_tag_%s"%(pdv_tag))):
-                    pdv_code = pdv_tag
+            pdv_code = self._l10n_bs_edi_get_pdv_code(tags.ids, tag_map)
             return {
                 "move_type": move_type,
                 "nacin_placanja": nacin_placanja,
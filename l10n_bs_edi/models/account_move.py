@@ -2,19 +2,140 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 import json
+import logging
+from datetime import datetime, time, timedelta
+
+import pytz
 
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
 import requests
 
+from .account_edi_format import PDV_CODES
+from .l10n_bs_edi_fiscal_queue import QUEUE_STATES
+from .l10n_bs_edi_payment_type_rule import PAYMENT_TYPES
+
+_logger = logging.getLogger(__name__)
+
+# PDV oznaka stavke: tag s najvećim rangom (K > E > A), za upite nad account_move_line aml
+PDV_TAG_CTE = """
+    pdv_tag AS (
+        SELECT * FROM unnest(%(tag_ids)s::int[], %(codes)s::varchar[], %(ranks)s::int[]) AS t(tag_id, code, rank)
+    )
+"""
+LINE_PDV_CODE = """
+    SELECT pdv_tag.code
+      FROM account_account_tag_account_move_line_rel tag_rel
+      JOIN pdv_tag ON pdv_tag.tag_id = tag_rel.account_account_tag_id
+     WHERE tag_rel.account_move_line_id = aml.id
+  ORDER BY pdv_tag.rank DESC
+     LIMIT 1
+"""
+
 class AccountMove(models.Model):
     _inherit = "account.move"
 
     ba_edi_fiskalni_broj = fields.Char(
         string="Fiskalni račun:",
-        help="Broj fiskalnog računa"
+        help="Broj fiskalnog računa",
+        copy=False,
+        index="btree_not_null",
+    )
+    l10n_bs_edi_fiscal_sequence = fields.Integer(
+        "Redoslijed fiskalizacije",
+        copy=False,
+        readonly=True,
+        index="btree_not_null",
+        help="Raste sa svakim upisanim fiskalnim brojem, koristi ga kontrola fiskalnih brojeva",
+    )
+    l10n_bs_edi_fiscal_stamp_date = fields.Datetime(
+        "Vrijeme upisa fiskalnog broja",
+        copy=False,
+        readonly=True,
+        help="Kada je dodijeljen redoslijed fiskalizacije, prazno za stare upise",
+    )
+    l10n_bs_edi_refund_fiscal_number = fields.Char(
+        "Fiskalni broj originalnog računa",
+        copy=False,
+        help="Za storno bez povezane originalne fakture u sistemu",
+    )
+    l10n_bs_edi_refund_fiscal_date = fields.Date(
+        "Datum originalnog računa",
+        copy=False,
+        help="Koristi se ako original nije pronađen po fiskalnom broju",
+    )
+    l10n_bs_edi_fiscal_datetime = fields.Datetime("Vrijeme fiskalizacije", copy=False, readonly=True, index="btree_not_null")
+    l10n_bs_edi_device_id = fields.Char("Oznaka fiskalnog uređaja", copy=False, readonly=True)
+    l10n_bs_edi_fiscal_total = fields.Float("Fiskalni iznos", copy=False, readonly=True, digits="Account")
+    l10n_bs_edi_fiscal_counter = fields.Char("Brojač fiskalnog računa", copy=False, readonly=True)
+    l10n_bs_edi_verification_url = fields.Char("Provjera računa", copy=False, readonly=True)
+    l10n_bs_edi_payment_type = fields.Selection(
+        PAYMENT_TYPES,
+        string="Fiskalni način plaćanja",
+        copy=False,
+        readonly=True,
+        help="Način plaćanja poslan fiskalnom uređaju",
+    )
+    l10n_bs_edi_is_fiscalizable = fields.Boolean(
+        string="Podliježe fiskalizaciji",
+        compute="_compute_l10n_bs_edi_is_fiscalizable",
+    )
+    l10n_bs_edi_queue_ids = fields.One2many("l10n_bs_edi.fiscal.queue", "move_id", string="Red fiskalizacije")
+    l10n_bs_edi_payload_ids = fields.One2many("l10n_bs_edi.payload", "move_id", string="Fiskalni payloadi")
+    l10n_bs_edi_queue_state = fields.Selection(
+        QUEUE_STATES,
+        string="Status fiskalizacije",
+        compute="_compute_l10n_bs_edi_queue_state",
     )
 
+    _sql_constraints = [
+        (
+            "l10n_bs_edi_fiskalni_broj_uniq",
+            "unique(company_id, move_type, ba_edi_fiskalni_broj)",
+            "Fiskalni broj već postoji na drugom računu ove kompanije.",
+        ),
+    ]
+
+    @api.depends("move_type", "country_code", "line_ids.tax_tag_ids")
+    def _compute_l10n_bs_edi_is_fiscalizable(self):
+        # self je cijeli prefetch, pa se svi računi provjere jednim upitom
+        fiscalizable = self.env["account.edi.format"]._l10n_bs_edi_get_fiscalizable_moves(self)
+        for move in self:
+            move.l10n_bs_edi_is_fiscalizable = move in fiscalizable
+
+    @api.depends("l10n_bs_edi_queue_ids.state", "l10n_bs_edi_queue_ids.job_type")
+    def _compute_l10n_bs_edi_queue_state(self):
+        for move in self:
+            latest = move.l10n_bs_edi_queue_ids.filtered(lambda entry: entry.job_type == "invoice").sorted("id")[-1:]
+            move.l10n_bs_edi_queue_state = latest.state
+
+    @api.onchange("l10n_bs_edi_refund_fiscal_number")
+    def _onchange_l10n_bs_edi_refund_fiscal_number(self):
+        if self.l10n_bs_edi_refund_fiscal_number:
+            original = self._l10n_bs_edi_find_by_fiscal_numbers(
+                [self.l10n_bs_edi_refund_fiscal_number], company=self.company_id,
+            ).get(self.l10n_bs_edi_refund_fiscal_number)
+            if original:
+                self.l10n_bs_edi_refund_fiscal_date = original.invoice_date
+
+    def write(self, vals):
+        res = super().write(vals)
+        if vals.get("ba_edi_fiskalni_broj"):
+            self.env["l10n_bs_edi.sequence.checkpoint"]._stamp(self)
+        return res
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        to_send = posted.filtered(lambda move: any(
+            doc.edi_format_id.code == "ba_fiskalne_1_00" and doc.state == "to_send"
+            for doc in move.edi_document_ids
+        ))
+        self.env["l10n_bs_edi.fiscal.queue"]._enqueue(to_send.filtered(lambda move: move.company_id.l10n_bs_edi_use_queue))
+        if to_send:
+            self.env["account.edi.document"]._l10n_bs_edi_trigger_cron()
+        return posted
+
     def button_draft(self):
         for move in self:
             bs_edi = move.edi_document_ids.filtered(lambda doc: doc.edi_format_id.code == "ba_fiskalne_1_00")
@@ -40,60 +161,344 @@ class AccountMove(models.Model):
                     )
         return super().button_cancel_posted_moves()
 
+    def _l10n_bs_edi_is_fiscalized(self):
+        """ The fiscal number was issued for this move: it has a sent BA document.
+        Copied moves may carry the number of another move and must not print it.
+        """
+        self.ensure_one()
+        return bool(self.ba_edi_fiskalni_broj) and any(
+            doc.edi_format_id.code == "ba_fiskalne_1_00" and doc.state in ("sent", "to_cancel")
+            for doc in self.edi_document_ids
+        )
+
     def _get_ba_edi_response_json(self):
-        # koristi štampa fakture
+        # koristi štampa fakture, podaci su na fakturi, vidi _l10n_bs_edi_response_values
         self.ensure_one()
-        ba_edi = self.edi_document_ids.filtered(lambda i: i.edi_format_id.code == "ba_fiskalne_1_00"
-            and i.state in ("sent", "to_cancel"))
-        if ba_edi:
-            return json.loads(ba_edi.sudo().attachment_id.raw.decode("utf-8"))
-        else:
+        if not self._l10n_bs_edi_is_fiscalized():
             return { "invoiceNumber": "0" }
+        return {
+            "invoiceNumber": self.ba_edi_fiskalni_broj,
+            "sdcDateTime": self.l10n_bs_edi_fiscal_datetime and fields.Datetime.to_string(self.l10n_bs_edi_fiscal_datetime),
+            "signedBy": self.l10n_bs_edi_device_id,
+            "totalAmount": self.l10n_bs_edi_fiscal_total,
+            "invoiceCounter": self.l10n_bs_edi_fiscal_counter,
+            "verificationUrl": self.l10n_bs_edi_verification_url,
+        }
+
+    def _l10n_bs_edi_prefetch_report_data(self):
+        """ Load the fiscal data used by the invoice report for the whole recordset,
+        with a fixed number of queries per 1000 moves instead of per move.
+        """
+        moves = self.filtered(lambda move: move.country_code == "BA")
+        if not moves:
+            return
+        moves.read(self._l10n_bs_edi_report_fields())
+        moves.edi_document_ids.read(["edi_format_id", "state", "attachment_id"])
+        moves.edi_document_ids.edi_format_id.read(["code"])
+
+    @api.model
+    def _l10n_bs_edi_report_fields(self):
+        return [
+            "ba_edi_fiskalni_broj",
+            "l10n_bs_edi_fiscal_datetime",
+            "l10n_bs_edi_device_id",
+            "l10n_bs_edi_fiscal_total",
+            "l10n_bs_edi_fiscal_counter",
+            "l10n_bs_edi_verification_url",
+            "edi_document_ids",
+        ]
+
+    @api.model
+    def _l10n_bs_edi_backfill_fiscal_fields(self, batch_size=1000):
+        """ Fill the fiscal response columns from the JSON attachments of sent BA documents. """
+        edi_format = self.env["account.edi.format"]
+        self.env.cr.execute("""
+            SELECT doc.move_id, doc.attachment_id
+              FROM account_edi_document doc
+              JOIN account_edi_format fmt ON fmt.id = doc.edi_format_id
+             WHERE fmt.code = 'ba_fiskalne_1_00'
+               AND doc.state IN ('sent', 'to_cancel')
+               AND doc.attachment_id IS NOT NULL
+             ORDER BY doc.move_id
+        """)
+        rows = self.env.cr.fetchall()
+        for batch in split_every(batch_size, rows):
+            attachments = self.env["ir.attachment"].sudo().browse([attachment_id for _move_id, attachment_id in batch])
+            raw_by_id = {attachment.id: attachment.raw for attachment in attachments}
+            for move_id, attachment_id in batch:
+                try:
+                    response_json = json.loads((raw_by_id.get(attachment_id) or b"{}").decode("utf-8"))
+                except ValueError:
+                    continue
+                if response_json.get("invoiceNumber"):
+                    self.browse(move_id).write(edi_format._l10n_bs_edi_response_values(response_json))
+            self.env.flush_all()
+            self.env.invalidate_all()
+        return len(rows)
+
+    @api.model
+    def _l10n_bs_edi_find_by_fiscal_numbers(self, fiscal_numbers, move_type="out_invoice", company=None):
+        """ Moves by fiscal number, with one indexed query.
+
+        The device numbers sales and refunds separately, so a fiscal number is only
+        unique per company and move type.
+
+        :param company: company to search in, defaults to the allowed companies;
+                        with several companies the lowest id wins
+        :return: dict fiscal number -> account.move, numbers not found are left out
+        """
+        fiscal_numbers = [number for number in fiscal_numbers if number]
+        if not fiscal_numbers:
+            return {}
+        moves = self.search([
+            ("ba_edi_fiskalni_broj", "in", fiscal_numbers),
+            ("move_type", "=", move_type),
+            ("company_id", "in", (company or self.env.companies).ids),
+        ], order="id desc")
+        # zadnji upisani pobjeđuje, pa redoslijed desc daje najmanji id
+        return {move.ba_edi_fiskalni_broj: move for move in moves}
+
+    @api.model
+    def _l10n_bs_edi_backfill_payment_type(self, batch_size=1000):
+        """ Store the payment type of invoices fiscalized before it was kept on the move.
+
+        The type is what the device actually received: the last sent payload, else the
+        device response stored on the BA document. Only when neither exists is it
+        recomputed from the current rules, which may differ from the rules at the time.
+        """
+        edi_format = self.env["account.edi.format"]
+        move_ids = self.search([
+            ("ba_edi_fiskalni_broj", "!=", False),
+            ("l10n_bs_edi_payment_type", "=", False),
+        ], order="id").ids
+        from_rules = []
+        for ids in split_every(batch_size, move_ids):
+            self.env.cr.execute("""
+                SELECT DISTINCT ON (move_id) move_id, payload
+                  FROM l10n_bs_edi_payload
+                 WHERE move_id = ANY(%s)
+                   AND date_sent IS NOT NULL
+              ORDER BY move_id, date_sent DESC, id DESC
+            """, [list(ids)])
+            sent_payloads = dict(self.env.cr.fetchall())
+            for move in self.browse(ids):
+                payment_type = self._l10n_bs_edi_sent_payment_type(sent_payloads.get(move.id))
+                if not payment_type:
+                    ba_edi = move.edi_document_ids.filtered(lambda doc: doc.edi_format_id.code == "ba_fiskalne_1_00")
+                    raw = ba_edi.sudo().attachment_id.raw
+                    payment_type = self._l10n_bs_edi_sent_payment_type(raw and raw.decode("utf-8"))
+                if not payment_type:
+                    payment_type = edi_format._ba_edi_get_payment_type(move)
+                    from_rules.append(move.id)
+                move.l10n_bs_edi_payment_type = payment_type
+            self.env.flush_all()
+            self.env.invalidate_all()
+        if from_rules:
+            _logger.warning(
+                "l10n_bs_edi: za %s računa nema poslanog payloada ni odgovora uređaja, način plaćanja je "
+                "određen po trenutnim pravilima: %s", len(from_rules), from_rules,
+            )
+        return len(move_ids)
+
+    @api.model
+    def _l10n_bs_edi_sent_payment_type(self, data):
+        """ Payment type of a sent payload or device response (JSON string), if it has one. """
+        try:
+            data = json.loads(data) if data else {}
+        except ValueError:
+            return False
+        if not isinstance(data, dict):
+            return False
+        request = data.get("invoiceRequest") or data
+        payments = request.get("payment") or request.get("payments") or []
+        payment_type = payments[0].get("paymentType") if payments and isinstance(payments[0], dict) else False
+        return payment_type if payment_type in dict(PAYMENT_TYPES) else False
+
+    @api.model
+    def _l10n_bs_edi_fiscal_journal_columns(self):
+        columns = ["fiscal_number", "move_name", "move_type", "invoice_date", "fiscal_datetime", "partner", "partner_vat"]
+        for pdv_code in PDV_CODES:
+            columns += ["base_%s" % pdv_code, "tax_%s" % pdv_code]
+        return columns + ["amount_untaxed", "amount_tax", "amount_total", "payment_type"]
+
+    @api.model
+    def _l10n_bs_edi_fiscal_journal_query(self, company, date_from, date_to):
+        """ Query of the fiscal journal: one row per fiscalized invoice of the period,
+        in the order of _l10n_bs_edi_fiscal_journal_columns.
+
+        Bases and taxes per PDV code come from the tax tags of the product and tax
+        lines, signed like the journal (refunds are negative). The totals are computed
+        per invoice through a lateral join so the rows can be streamed.
+
+        :return: (query, params)
+        """
+        totals = ",\n".join(
+            "SUM(-aml.balance) FILTER (WHERE line_code.code = '{0}' AND aml.display_type = 'product') AS base_{0}, "
+            "SUM(-aml.balance) FILTER (WHERE line_code.code = '{0}' AND aml.display_type = 'tax') AS tax_{0}".format(pdv_code)
+            for pdv_code in PDV_CODES
+        )
+        selected_totals = ", ".join("totals.base_{0}, totals.tax_{0}".format(pdv_code) for pdv_code in PDV_CODES)
+        query = """
+            WITH {pdv_tag_cte}
+            SELECT move.ba_edi_fiskalni_broj,
+                   move.name,
+                   move.move_type,
+                   move.invoice_date,
+                   move.l10n_bs_edi_fiscal_datetime,
+                   partner.name,
+                   partner.vat,
+                   {selected_totals},
+                   move.amount_untaxed_signed,
+                   move.amount_tax_signed,
+                   move.amount_total_signed,
+                   move.l10n_bs_edi_payment_type
+              FROM account_move move
+         LEFT JOIN res_partner partner ON partner.id = move.commercial_partner_id
+   LEFT JOIN LATERAL (
+                SELECT {totals}
+                  FROM account_move_line aml
+                  JOIN LATERAL ({line_pdv_code}) line_code ON TRUE
+                 WHERE aml.move_id = move.id
+                   AND aml.display_type IN ('product', 'tax')
+                   ) totals ON TRUE
+             WHERE move.company_id = %(company_id)s
+               AND move.state = 'posted'
+               AND move.ba_edi_fiskalni_broj IS NOT NULL
+               AND move.invoice_date >= %(date_from)s
+               AND move.invoice_date <= %(date_to)s
+          ORDER BY move.invoice_date, move.id
+        """.format(pdv_tag_cte=PDV_TAG_CTE, line_pdv_code=LINE_PDV_CODE, totals=totals, selected_totals=selected_totals)
+        return query, {
+            **self._l10n_bs_edi_pdv_tag_params(company),
+            "company_id": company.id,
+            "date_from": date_from,
+            "date_to": date_to,
+        }
+
+    @api.model
+    def _l10n_bs_edi_pdv_tag_params(self, company):
+        """ Parameters of PDV_TAG_CTE for a company. """
+        pdv_tags = list(self.env["account.edi.format"]._l10n_bs_edi_tax_tag_map(company).pdv_code_by_tag_id.items())
+        return {
+            "tag_ids": [tag_id for tag_id, _code in pdv_tags],
+            "codes": [code for _tag_id, code in pdv_tags],
+            "ranks": [PDV_CODES.index(code) for _tag_id, code in pdv_tags],
+        }
+
+    @api.model
+    def _l10n_bs_edi_fiscal_totals(self, company, date_from, date_to):
+        """ Net fiscalized totals of a period, as a device report shows them, in one query.
+
+        Moves belong to the day of their fiscalization time in the company's timezone,
+        moves fiscalized before that time was stored to their invoice date.
+
+        :return: dict with "pdv": {code: (base, tax)}, "payment": {payment type: amount}
+                 and "count": {move type: number of moves}
+        """
+        tz = pytz.timezone(company.partner_id.tz or "Europe/Sarajevo")
+        start = tz.localize(datetime.combine(date_from, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        end = tz.localize(datetime.combine(date_to + timedelta(days=1), time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        self.env.flush_all()
+        self.env.cr.execute("""
+            WITH {pdv_tag_cte},
+            fiscal_move AS (
+                SELECT id, move_type, amount_total_signed, l10n_bs_edi_payment_type
+                  FROM account_move
+                 WHERE company_id = %(company_id)s
+                   AND state = 'posted'
+                   AND ba_edi_fiskalni_broj IS NOT NULL
+                   AND move_type IN ('out_invoice', 'out_refund')
+                   AND (
+                        l10n_bs_edi_fiscal_datetime >= %(start)s AND l10n_bs_edi_fiscal_datetime < %(end)s
+                        OR l10n_bs_edi_fiscal_datetime IS NULL AND invoice_date >= %(date_from)s AND invoice_date <= %(date_to)s
+                   )
+            ),
+            line_code AS (
+                SELECT aml.display_type, aml.balance, ({line_pdv_code}) AS code
+                  FROM account_move_line aml
+                  JOIN fiscal_move ON fiscal_move.id = aml.move_id
+                 WHERE aml.display_type IN ('product', 'tax')
+            )
+            SELECT 'pdv', code,
+                   COALESCE(SUM(-balance) FILTER (WHERE display_type = 'product'), 0),
+                   COALESCE(SUM(-balance) FILTER (WHERE display_type = 'tax'), 0)
+              FROM line_code
+             WHERE code IS NOT NULL
+          GROUP BY code
+         UNION ALL
+            SELECT 'payment', COALESCE(l10n_bs_edi_payment_type, ''), SUM(amount_total_signed), 0
+              FROM fiscal_move
+          GROUP BY l10n_bs_edi_payment_type
+         UNION ALL
+            SELECT 'count', move_type, COUNT(*), 0
+              FROM fiscal_move
+          GROUP BY move_type
+        """.format(pdv_tag_cte=PDV_TAG_CTE, line_pdv_code=LINE_PDV_CODE), {
+            **self._l10n_bs_edi_pdv_tag_params(company),
+            "company_id": company.id,
+            "start": start,
+            "end": end,
+            "date_from": date_from,
+            "date_to": date_to,
+        })
+        totals = {"pdv": {}, "payment": {}, "count": {}}
+        for kind, code, amount, tax_amount in self.env.cr.fetchall():
+            if kind == "pdv":
+                totals["pdv"][code] = (float(amount), float(tax_amount))
+            elif kind == "payment":
+                totals["payment"][code] = float(amount)
+            else:
+                totals["count"][code] = int(amount)
+        return totals
 
     def fiskalni_duplikat(self):
         self.ensure_one()
-        ba_edi = self.edi_document_ids.filtered(lambda i: i.edi_format_id.code == "ba_fiskalne_1_00"
-            and i.state in ("sent"))
-        if not ba_edi:
-            ValidationError("Fiskalne funkcije nisu podešene?!")
-
-        #action = self.env["ir.actions.act_window"]._for_xml_id(
-        #    "l10n_bs_edi.action_fiskalne_funkcije"
-        #)
-        #action["res_id"] = self.id
-        #
-        ##return {'type': 'ir.actions.act_window_close'}
-    
-        #return action
-
-        for rec in self:
-            rec.name
-            if rec.move_type == 'out_invoice':
-                tip = 'F'
-            elif rec.move_type == 'out_refund':
-                tip = 'R'
-            else:
-                ValidationError('nepostojeći tip dokumenta?!')
-            api_host=rec.company_id.sudo().l10n_bs_edi_api_host
-            pin=rec.company_id.sudo().l10n_bs_edi_pin
-            _url = f"{api_host}/{pin}/duplikat/{tip}/{rec.ba_edi_fiskalni_broj}"
-            headers = {
-                "Content-type": "application/json",
-                "accept": "application/json"
-            }
+        result = self._l10n_bs_edi_request_duplicate()
+        if not result["success"]:
+            raise UserError(result["error"])
+        return True
+
+    def action_l10n_bs_edi_duplicates(self):
+        """ Duplicates of many invoices, printed through the fiscalization queue. """
+        wizard = self.env["l10n_bs_edi.duplicate.wizard"].create({
+            "move_ids": [(6, 0, self._l10n_bs_edi_duplicate_candidates().ids)],
+        })
+        return wizard._reopen()
 
-            response = requests.get(url=_url, headers=headers)
+    def _l10n_bs_edi_duplicate_candidates(self):
+        return self.filtered(lambda move: move.ba_edi_fiskalni_broj and move.move_type in ("out_invoice", "out_refund"))
 
-            error_msg = "FPRINT: GREŠKA duplikat!"
-            if response.status_code == 200:
-                response_json = response.json()
-                if response_json.get("status") == "OK":
-                    return True
-                else:
-                    ValidationError(error_msg)
+    def _l10n_bs_edi_request_duplicate(self):
+        """ Ask the fiscal device to print a duplicate.
 
+        :return: result in the account_edi format: success, error, blocking_level
+                 ('warning' when the device could not be reached)
+        """
+        self.ensure_one()
+        if not self._l10n_bs_edi_is_fiscalized():
+            return {"success": False, "error": _("Faktura %s nije fiskalizirana", self.name), "blocking_level": "error"}
+        if self.move_type == 'out_invoice':
+            tip = 'F'
+        elif self.move_type == 'out_refund':
+            tip = 'R'
+        else:
+            return {"success": False, "error": _("Duplikat nije moguć za ovaj tip dokumenta (%s)", self.name), "blocking_level": "error"}
 
+        pin = self.company_id.sudo().l10n_bs_edi_pin
+        transport = self.company_id._l10n_bs_edi_get_transport()
+        try:
+            with self.env["account.edi.format"]._l10n_bs_edi_timed("duplicate", self.company_id):
+                response = transport.get(f"/{pin}/duplikat/{tip}/{self.ba_edi_fiskalni_broj}")
+        except requests.exceptions.RequestException as e:
+            return {"success": False, "error": _("Fiskalni uređaj %s nije dostupan: %s", transport.host, e), "blocking_level": "warning"}
 
+        error_msg = _("FPRINT: GREŠKA duplikat!")
+        if response.status_code == 200:
+            response_json = response.json()
+            if response_json.get("status") == "OK":
+                return {"success": True}
+            error_msg = response_json.get("message") or error_msg
+        return {"success": False, "error": error_msg, "blocking_level": "error"}
 
     #def action_view_assets(self):
     #    assets = (
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import psycopg2
+import requests
+
+from odoo import api, fields, models, _
+
+_logger = logging.getLogger(__name__)
+
+DEVICE_STATES = [
+    ("closed", "Dostupan"),
+    ("open", "Nedostupan"),
+    ("half_open", "Provjera"),
+]
+
+
+class L10nBsEdiDevice(models.Model):
+    """ Health of one fiscal device (``l10n_bs_edi_api_host``) as a circuit breaker.
+
+    closed: requests go through. After ``l10n_bs_edi.breaker_threshold`` consecutive
+    failures the breaker opens and requests are refused without touching the network.
+    Once ``l10n_bs_edi.breaker_cooldown`` seconds have passed, the next request
+    (or the probe cron) pings the device in half_open state and closes the breaker
+    on success.
+
+    State changes are written in their own transaction so that they survive a
+    rollback of the fiscalization and never lock the invoices' transaction.
+    """
+    _name = "l10n_bs_edi.device"
+    _description = "Fiskalni uređaj"
+    _rec_name = "host"
+    _order = "host"
+
+    host = fields.Char("Host", required=True, readonly=True)
+    state = fields.Selection(DEVICE_STATES, string="Stanje", default="closed", required=True, readonly=True)
+    consecutive_failures = fields.Integer("Uzastopnih grešaka", readonly=True)
+    date_opened = fields.Datetime("Nedostupan od", readonly=True)
+    last_error = fields.Char("Posljednja greška", readonly=True)
+    last_probe_date = fields.Datetime("Posljednja provjera", readonly=True)
+    last_probe_latency = fields.Integer("Odziv (ms)", readonly=True)
+
+    _sql_constraints = [
+        ("host_uniq", "unique(host)", "Fiskalni uređaj već postoji."),
+    ]
+
+    @api.model
+    def _normalize_host(self, host):
+        return (host or "").rstrip("/")
+
+    @api.model
+    def _get_device(self, host):
+        host = self._normalize_host(host)
+        device = self.sudo().search([("host", "=", host)], limit=1)
+        if not device:
+            device = self.sudo().browse(self._create_device(host))
+            if not device.exists():
+                # upisan u drugoj transakciji, nije vidljiv u snimku ove; stanje se ionako čita svježe
+                for fname, value in (("host", host), ("state", "closed"), ("date_opened", False)):
+                    self.env.cache.update(device, self._fields[fname], [value])
+        return device
+
+    @api.model
+    def _create_device(self, host):
+        """ Insert the device in its own committed transaction (inline during tests), so
+        that concurrent first uses of a host never fail the caller's fiscalization on
+        host_uniq and health updates find the record right away.
+
+        :return: id of the device
+        """
+        query = """
+            INSERT INTO l10n_bs_edi_device (host, state, consecutive_failures, create_uid, create_date, write_uid, write_date)
+                 VALUES (%(host)s, 'closed', 0, %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC')
+            ON CONFLICT (host) DO NOTHING
+        """
+        params = {"host": host, "uid": self.env.uid}
+        if getattr(threading.current_thread(), "testing", False):
+            self.env.cr.execute(query, params)
+            self.env.cr.execute("SELECT id FROM l10n_bs_edi_device WHERE host = %s", [host])
+            return self.env.cr.fetchone()[0]
+        with self.pool.cursor() as cr:
+            # read committed: red koji je upravo upisala druga transakcija mora biti vidljiv
+            cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            cr.execute(query, params)
+            cr.execute("SELECT id FROM l10n_bs_edi_device WHERE host = %s", [host])
+            return cr.fetchone()[0]
+
+    def _with_health_env(self, callback):
+        """ Run callback(device) on a fresh read of the record in a separate, committed
+        transaction (inline during tests). Health updates are best effort: a concurrent
+        update of the same device wins.
+        """
+        if getattr(threading.current_thread(), "testing", False):
+            return callback(self.sudo())
+        try:
+            with self.pool.cursor() as cr:
+                device = self.with_env(self.env(cr=cr, su=True)).exists()
+                result = callback(device) if device else None
+        except psycopg2.OperationalError as e:
+            _logger.debug("Stanje fiskalnog uređaja %s nije ažurirano: %s", self.host, e)
+            return None
+        self.invalidate_recordset()
+        return result
+
+    def _get_breaker_params(self):
+        get_param = self.env["ir.config_parameter"].sudo().get_param
+        return (
+            int(get_param("l10n_bs_edi.breaker_threshold", 3)),
+            int(get_param("l10n_bs_edi.breaker_cooldown", 60)),
+        )
+
+    # -------------------------------------------------------------------------
+    # Breaker
+    # -------------------------------------------------------------------------
+
+    def _allow_request(self, transport=None):
+        """ :return: True when requests may be sent to the device now. """
+        self.ensure_one()
+        health = self._with_health_env(lambda device: (device.state, device.date_opened))
+        state, date_opened = health or (self.state, self.date_opened)
+        if state == "closed":
+            return True
+        _threshold, cooldown = self._get_breaker_params()
+        if state == "open" and date_opened and fields.Datetime.now() < date_opened + timedelta(seconds=cooldown):
+            return False
+        return self._probe(transport=transport)
+
+    def _record_success(self, latency=None):
+        self.ensure_one()
+
+        def apply(device):
+            vals = {}
+            if device.state != "closed" or device.consecutive_failures:
+                vals.update(state="closed", consecutive_failures=0, date_opened=False)
+            if latency is not None:
+                vals.update(last_probe_date=fields.Datetime.now(), last_probe_latency=latency)
+            if vals:
+                device.write(vals)
+
+        self._with_health_env(apply)
+
+    def _record_failure(self, error, probe=False):
+        self.ensure_one()
+        threshold, _cooldown = self._get_breaker_params()
+
+        def apply(device):
+            failures = device.consecutive_failures + 1
+            vals = {"consecutive_failures": failures, "last_error": str(error)[:256]}
+            if probe:
+                vals.update(last_probe_date=fields.Datetime.now(), last_probe_latency=0)
+            if failures >= threshold or device.state == "half_open":
+                if device.state != "open":
+                    _logger.warning("Fiskalni uređaj %s nedostupan nakon %s grešaka", device.host, failures)
+                vals.update(state="open", date_opened=fields.Datetime.now())
+            device.write(vals)
+
+        self._with_health_env(apply)
+
+    def _refused_error(self):
+        return _("Fiskalni uređaj %s je nedostupan, slanje će biti ponovljeno automatski", self.host)
+
+    # -------------------------------------------------------------------------
+    # Probe
+    # -------------------------------------------------------------------------
+
+    def _get_transport(self):
+        companies = self.env["res.company"].sudo().search([("l10n_bs_edi_api_host", "!=", False)])
+        company = companies.filtered(lambda c: self._normalize_host(c.l10n_bs_edi_api_host) == self.host)[:1]
+        return company._l10n_bs_edi_get_transport() if company else None
+
+    def _probe(self, transport=None):
+        """ Ping the device and update the breaker.
+
+        :return: True when the device answered.
+        """
+        self.ensure_one()
+        transport = transport or self._get_transport()
+        if transport is None:
+            return False
+        self._with_health_env(lambda device: device.state == "open" and device.write({"state": "half_open"}))
+        start = time.monotonic()
+        try:
+            response = transport.post("/api/ping", json={"msg": "ping"})
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self._record_failure(e, probe=True)
+            return False
+        self._record_success(latency=round(1000 * (time.monotonic() - start)))
+        return True
+
+    @api.model
+    def _cron_probe_devices(self):
+        """ Ping every configured device, so broken devices are known before invoices are sent. """
+        hosts = {
+            self._normalize_host(host)
+            for host in self.env["res.company"].sudo().search([("l10n_bs_edi_api_host", "!=", False)]).mapped("l10n_bs_edi_api_host")
+        }
+        for host in sorted(hosts):
+            self._get_device(host)._probe()
+
+    def action_probe(self):
+        for device in self:
+            device._probe()
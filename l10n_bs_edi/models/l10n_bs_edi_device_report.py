@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+import requests
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+REPORT_TYPES = [
+    ("daily", "Dnevni (Z)"),
+    ("periodic", "Periodični"),
+]
+
+
+class L10nBsEdiDeviceReport(models.Model):
+    _name = "l10n_bs_edi.device.report"
+    _description = "Izvještaj fiskalnog uređaja"
+    _order = "date_to desc, company_id, id desc"
+
+    name = fields.Char("Izvještaj", compute="_compute_name")
+    company_id = fields.Many2one("res.company", string="Kompanija", required=True, readonly=True, index=True)
+    device = fields.Char("Fiskalni uređaj", readonly=True)
+    report_type = fields.Selection(REPORT_TYPES, string="Vrsta", required=True, readonly=True)
+    date_from = fields.Date("Od", required=True, readonly=True)
+    date_to = fields.Date("Do", required=True, readonly=True)
+    report_number = fields.Char("Broj izvještaja", readonly=True)
+    date_fetched = fields.Datetime("Preuzeto", readonly=True)
+    invoice_count = fields.Integer("Računi (uređaj)", readonly=True)
+    refund_count = fields.Integer("Reklamirani (uređaj)", readonly=True)
+    odoo_invoice_count = fields.Integer("Računi (Odoo)", readonly=True)
+    odoo_refund_count = fields.Integer("Reklamirani (Odoo)", readonly=True)
+    line_ids = fields.One2many("l10n_bs_edi.device.report.line", "report_id", string="Usklađivanje", readonly=True)
+    amount_difference = fields.Float("Razlika", readonly=True, digits="Account", help="Zbir apsolutnih razlika po stavkama")
+    state = fields.Selection(
+        [
+            ("matched", "Usklađeno"),
+            ("difference", "Razlika"),
+        ],
+        string="Status",
+        readonly=True,
+        index=True,
+    )
+    raw_response = fields.Text("Odgovor uređaja", readonly=True)
+
+    _sql_constraints = [
+        ("report_uniq", "unique(company_id, report_type, date_from, date_to)", "Izvještaj za ovaj period već postoji."),
+    ]
+
+    @api.depends("report_type", "report_number", "date_from", "date_to")
+    def _compute_name(self):
+        for report in self:
+            period = report.date_from == report.date_to and str(report.date_from) or "%s - %s" % (report.date_from, report.date_to)
+            prefix = "Z" if report.report_type == "daily" else "P"
+            report.name = "%s %s (%s)" % (prefix, report.report_number or "", period)
+
+    # -------------------------------------------------------------------------
+    # Fetch
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _fetch(self, company, report_type, date_from, date_to=None):
+        """ Get a report from the company's fiscal device, store and reconcile it.
+
+        :raise requests.exceptions.RequestException: device not reachable
+        :raise UserError: the device answered with an error
+        :return: the l10n_bs_edi.device.report record
+        """
+        date_to = date_to or date_from
+        transport = company._l10n_bs_edi_get_transport()
+        if report_type == "daily":
+            response = transport.get("/api/reports/daily", params={"date": fields.Date.to_string(date_from)})
+        else:
+            response = transport.get("/api/reports/periodic", params={
+                "dateFrom": fields.Date.to_string(date_from),
+                "dateTo": fields.Date.to_string(date_to),
+            })
+        response_json = response.json() if response.content else {}
+        if response.status_code != 200 or response_json.get("message"):
+            raise UserError(_("Fiskalni uređaj nije vratio izvještaj: %s", response_json.get("message") or response.status_code))
+
+        values = {
+            "device": transport.host,
+            "report_number": response_json.get("reportNumber") and str(response_json["reportNumber"]),
+            "date_fetched": fields.Datetime.now(),
+            "invoice_count": response_json.get("invoiceCount") or 0,
+            "refund_count": response_json.get("refundCount") or 0,
+            "raw_response": json.dumps(response_json, indent=2),
+        }
+        report = self.search([
+            ("company_id", "=", company.id),
+            ("report_type", "=", report_type),
+            ("date_from", "=", date_from),
+            ("date_to", "=", date_to),
+        ])
+        if report:
+            report.write(values)
+        else:
+            report = self.create({
+                "company_id": company.id,
+                "report_type": report_type,
+                "date_from": date_from,
+                "date_to": date_to,
+                **values,
+            })
+        report._reconcile(response_json)
+        return report
+
+    @api.model
+    def _cron_fetch_daily_reports(self):
+        """ Fetch and reconcile yesterday's Z-report of every configured company. """
+        companies = self.env["res.company"].sudo().search([("l10n_bs_edi_api_host", "!=", False)])
+        for company in companies:
+            tz = pytz.timezone(company.partner_id.tz or "Europe/Sarajevo")
+            day = datetime.now(tz).date() - timedelta(days=1)
+            if self.search_count([("company_id", "=", company.id), ("report_type", "=", "daily"), ("date_from", "=", day)]):
+                continue
+            transport = company._l10n_bs_edi_get_transport()
+            device = self.env["l10n_bs_edi.device"]._get_device(transport.host)
+            if not device._allow_request(transport):
+                continue
+            try:
+                self._fetch(company, "daily", day)
+            except requests.exceptions.RequestException as e:
+                device._record_failure(e)
+                _logger.warning("Z-izvještaj %s za %s nije preuzet: %s", company.name, day, e)
+            except UserError as e:
+                # uređaj je odgovorio, dostupan je
+                device._record_success()
+                _logger.warning("Z-izvještaj %s za %s nije preuzet: %s", company.name, day, e)
+            else:
+                device._record_success()
+
+    # -------------------------------------------------------------------------
+    # Reconcile
+    # -------------------------------------------------------------------------
+
+    def _reconcile(self, response_json=None):
+        """ Compare the device totals with the fiscalized moves of the period, per PDV code and payment type. """
+        self.ensure_one()
+        if response_json is None:
+            response_json = json.loads(self.raw_response or "{}")
+        device_pdv = {}
+        for item in response_json.get("taxItems") or []:
+            device_pdv[item["label"]] = (float(item.get("baseAmount") or 0.0), float(item.get("taxAmount") or 0.0))
+        device_payment = {
+            payment["paymentType"]: float(payment.get("amount") or 0.0)
+            for payment in response_json.get("payments") or []
+        }
+        totals = self.env["account.move"]._l10n_bs_edi_fiscal_totals(self.company_id, self.date_from, self.date_to)
+
+        line_vals = []
+        for code in sorted(set(device_pdv) | set(totals["pdv"])):
+            device_base, device_tax = device_pdv.get(code, (0.0, 0.0))
+            odoo_base, odoo_tax = totals["pdv"].get(code, (0.0, 0.0))
+            line_vals.append({
+                "line_type": "pdv",
+                "code": code,
+                "device_base": device_base,
+                "device_tax": device_tax,
+                "device_amount": device_base + device_tax,
+                "odoo_base": odoo_base,
+                "odoo_tax": odoo_tax,
+                "odoo_amount": odoo_base + odoo_tax,
+            })
+        for code in sorted(set(device_payment) | set(totals["payment"])):
+            line_vals.append({
+                "line_type": "payment",
+                "code": code,
+                "device_amount": device_payment.get(code, 0.0),
+                "odoo_amount": totals["payment"].get(code, 0.0),
+            })
+
+        currency = self.company_id.currency_id
+        differences = [
+            abs(vals["device_amount"] - vals["odoo_amount"]) + abs(vals.get("device_tax", 0.0) - vals.get("odoo_tax", 0.0))
+            for vals in line_vals
+        ]
+        odoo_counts = totals["count"]
+        counts_match = (self.invoice_count, self.refund_count) == (odoo_counts.get("out_invoice", 0), odoo_counts.get("out_refund", 0))
+        self.line_ids.unlink()
+        self.write({
+            "line_ids": [(0, 0, vals) for vals in line_vals],
+            "odoo_invoice_count": odoo_counts.get("out_invoice", 0),
+            "odoo_refund_count": odoo_counts.get("out_refund", 0),
+            "amount_difference": sum(differences),
+            "state": "matched" if counts_match and all(currency.is_zero(diff) for diff in differences) else "difference",
+        })
+
+    def action_reconcile(self):
+        for report in self:
+            report._reconcile()
+
+    def action_refetch(self):
+        for report in self:
+            try:
+                self._fetch(report.company_id, report.report_type, report.date_from, report.date_to)
+            except requests.exceptions.RequestException as e:
+                raise UserError(_("Fiskalni uređaj %s nije dostupan: %s", report.device, e))
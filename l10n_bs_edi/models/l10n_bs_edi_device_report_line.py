@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+
+from .l10n_bs_edi_payment_type_rule import PAYMENT_TYPES
+
+
+class L10nBsEdiDeviceReportLine(models.Model):
+    _name = "l10n_bs_edi.device.report.line"
+    _description = "Usklađivanje izvještaja fiskalnog uređaja"
+    _order = "report_id, line_type desc, code"
+
+    report_id = fields.Many2one("l10n_bs_edi.device.report", string="Izvještaj", required=True, ondelete="cascade", index=True)
+    line_type = fields.Selection(
+        [
+            ("pdv", "PDV oznaka"),
+            ("payment", "Način plaćanja"),
+        ],
+        string="Vrsta",
+        required=True,
+    )
+    code = fields.Char("Oznaka", help="PDV oznaka (A, E, K) ili način plaćanja")
+    label = fields.Char("Stavka", compute="_compute_label")
+    device_base = fields.Float("Osnovica (uređaj)", digits="Account")
+    device_tax = fields.Float("PDV (uređaj)", digits="Account")
+    device_amount = fields.Float("Iznos (uređaj)", digits="Account")
+    odoo_base = fields.Float("Osnovica (Odoo)", digits="Account")
+    odoo_tax = fields.Float("PDV (Odoo)", digits="Account")
+    odoo_amount = fields.Float("Iznos (Odoo)", digits="Account")
+    difference = fields.Float("Razlika", compute="_compute_difference", store=True, digits="Account")
+
+    @api.depends("line_type", "code")
+    def _compute_label(self):
+        payment_labels = dict(PAYMENT_TYPES)
+        for line in self:
+            if line.line_type == "payment":
+                line.label = payment_labels.get(line.code) or line.code or "?"
+            else:
+                line.label = "PDV %s" % line.code
+
+    @api.depends("device_amount", "odoo_amount")
+    def _compute_difference(self):
+        for line in self:
+            line.difference = line.device_amount - line.odoo_amount
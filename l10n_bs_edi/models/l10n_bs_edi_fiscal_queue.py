@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+
+_logger = logging.getLogger(__name__)
+
+JOB_TYPES = [
+    ("invoice", "Fiskalizacija"),
+    ("duplicate", "Duplikat"),
+]
+QUEUE_STATES = [
+    ("pending", "Na čekanju"),
+    ("processing", "U obradi"),
+    ("done", "Fiskalizirano"),
+    ("failed", "Greška"),
+]
+
+
+class L10nBsEdiFiscalQueue(models.Model):
+    _name = "l10n_bs_edi.fiscal.queue"
+    _description = "Red fiskalizacije"
+    _order = "id"
+
+    move_id = fields.Many2one("account.move", string="Faktura", required=True, ondelete="cascade", index=True)
+    job_type = fields.Selection(JOB_TYPES, string="Vrsta", default="invoice", required=True)
+    batch_ref = fields.Char("Grupa", index=True, help="Zajednička oznaka zahtjeva poslanih zajedno, npr. duplikata")
+    company_id = fields.Many2one(related="move_id.company_id", store=True)
+    device_key = fields.Char(
+        string="Fiskalni uređaj",
+        help="Host fiskalnog uređaja, zahtjevi prema istom uređaju se obrađuju strogo redom",
+        required=True,
+        index=True,
+    )
+    state = fields.Selection(QUEUE_STATES, string="Status", default="pending", required=True, index=True)
+    attempts = fields.Integer("Pokušaja", default=0)
+    error = fields.Text("Greška")
+    error_reported = fields.Boolean(help="Greška je prenesena na EDI dokument fakture")
+    attachment_id = fields.Many2one("ir.attachment", string="Odgovor uređaja")
+    date_enqueued = fields.Datetime("U redu od", default=fields.Datetime.now, required=True)
+    date_started = fields.Datetime("Početak obrade")
+    date_done = fields.Datetime("Završeno")
+
+    # -------------------------------------------------------------------------
+    # Enqueue / account_edi
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _enqueue(self, moves):
+        """ Add moves to the queue unless they are already waiting, being sent or fiscalized. """
+        if not moves:
+            return self.browse()
+        # i zaglavljeni unos blokira novi: uređaj je možda već izdao račun
+        active = self.search([
+            ("move_id", "in", moves.ids),
+            ("job_type", "=", "invoice"),
+            ("state", "in", ("pending", "processing", "done")),
+        ])
+        to_enqueue = moves - active.move_id
+        entries = self.create([{
+            "move_id": move.id,
+            "device_key": move.company_id.sudo().l10n_bs_edi_api_host or "",
+        } for move in to_enqueue])
+        if entries:
+            self.env.ref("l10n_bs_edi.ir_cron_l10n_bs_edi_fiscal_queue")._trigger()
+        return entries
+
+    @api.model
+    def _enqueue_duplicates(self, moves, batch_ref):
+        """ Queue duplicate prints, behind the invoices already waiting for the same device. """
+        entries = self.create([{
+            "move_id": move.id,
+            "job_type": "duplicate",
+            "batch_ref": batch_ref,
+            "device_key": move.company_id.sudo().l10n_bs_edi_api_host or "",
+        } for move in moves])
+        if entries:
+            self.env.ref("l10n_bs_edi.ir_cron_l10n_bs_edi_fiscal_queue")._trigger()
+        return entries
+
+    @api.model
+    def _edi_result(self, moves):
+        """ Translate the queue state of the moves into account_edi results, enqueueing
+        the ones not waiting yet (first run, or user retry after an error).
+        """
+        latest = {}
+        for entry in self.search([("move_id", "in", moves.ids), ("job_type", "=", "invoice")], order="id"):
+            latest[entry.move_id] = entry
+
+        edi_result = {}
+        to_enqueue = self.env["account.move"]
+        for move in moves:
+            entry = latest.get(move)
+            if entry and entry.state == "done":
+                edi_result[move] = {"success": True, "attachment": entry.attachment_id}
+            elif entry and entry.state == "failed" and not entry.error_reported:
+                entry.error_reported = True
+                edi_result[move] = {"success": False, "error": entry.error, "blocking_level": "error"}
+            else:
+                if not entry or entry.state == "failed":
+                    to_enqueue |= move
+                edi_result[move] = {
+                    "success": False,
+                    "error": _("Faktura čeka u redu za fiskalizaciju"),
+                    "blocking_level": "info",
+                }
+        self._enqueue(to_enqueue)
+        return edi_result
+
+    @api.model
+    def _get_stale_cutoff(self):
+        """ Entries still processing since before this datetime are considered abandoned. """
+        timeout = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.queue_processing_timeout", 1800))
+        return fields.Datetime.now() - timedelta(seconds=timeout)
+
+    # -------------------------------------------------------------------------
+    # Drainer
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _reap_stale_entries(self):
+        """ Release entries left in processing by a drainer that died, timed out or
+        lost its connection.
+
+        The device may have fiscalized an invoice before the drainer died, so stale
+        invoice entries fail and the error is reported on the invoice: the user checks
+        the device before resending (as account.edi.document._l10n_bs_edi_recover_sending).
+        Only duplicate prints go back to pending, until their attempts are used up.
+
+        A device whose queue lock is still held is being drained right now and is
+        left alone.
+
+        :return: reaped entries
+        """
+        stale = self.search([
+            ("state", "=", "processing"),
+            "|", ("date_started", "=", False), ("date_started", "<", self._get_stale_cutoff()),
+        ])
+        if not stale:
+            return stale
+        max_attempts = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.queue_max_attempts", 3))
+        cr = self.env.cr
+        reaped = self.browse()
+        for device_key in set(stale.mapped("device_key")):
+            lock_key = "l10n_bs_edi.fiscal.queue:%s" % device_key
+            cr.execute("SELECT pg_try_advisory_lock(hashtext(%s))", [lock_key])
+            if not cr.fetchone()[0]:
+                continue
+            try:
+                entries = stale.filtered(lambda entry: entry.device_key == device_key)
+                invoices = entries.filtered(lambda entry: entry.job_type == "invoice")
+                exhausted = (entries - invoices).filtered(lambda entry: entry.attempts >= max_attempts)
+                for entry in invoices:
+                    entry.write({
+                        "state": "failed",
+                        "date_done": fields.Datetime.now(),
+                        "error": _(
+                            "Slanje fiskalnom uređaju je prekinuto (%s). Provjerite na uređaju da li je račun "
+                            "fiskaliziran prije ponovnog slanja.",
+                            entry.date_started,
+                        ),
+                        "error_reported": False,
+                    })
+                exhausted.write({
+                    "state": "failed",
+                    "date_done": fields.Datetime.now(),
+                    "error": _("Duplikat nije odštampan nakon %s pokušaja", max_attempts),
+                    "error_reported": False,
+                })
+                (entries - invoices - exhausted).write({"state": "pending"})
+                reaped |= entries
+            finally:
+                cr.execute("SELECT pg_advisory_unlock(hashtext(%s))", [lock_key])
+        if reaped:
+            _logger.warning("Fiskalni red: %s zaglavljenih unosa vraćeno iz obrade", len(reaped))
+        return reaped
+
+    @api.model
+    def _cron_process_queue(self):
+        auto_commit = not getattr(threading.current_thread(), "testing", False)
+        self._reap_stale_entries()
+        if auto_commit:
+            self.env.cr.commit()
+        device_keys = [
+            group["device_key"]
+            for group in self.read_group([("state", "=", "pending")], ["device_key"], ["device_key"])
+        ]
+        concurrency = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.queue_concurrency", 2))
+        if not auto_commit or concurrency <= 1 or len(device_keys) <= 1:
+            for device_key in device_keys:
+                self._process_device(device_key, auto_commit=auto_commit)
+            return
+
+        # svaki uređaj u svom thread-u i svojoj transakciji, redoslijed unutar uređaja ostaje strog
+        dbname, uid, context = self.env.cr.dbname, self.env.uid, self.env.context
+
+        def drain(device_key):
+            threading.current_thread().dbname = dbname
+            # greška jednog uređaja ne prekida obradu ostalih
+            try:
+                with self.pool.cursor() as cr:
+                    env = api.Environment(cr, uid, context)
+                    env[self._name]._process_device(device_key, auto_commit=True)
+            except Exception:
+                _logger.exception("Fiskalni red uređaja %s nije obrađen", device_key)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _result in executor.map(drain, device_keys):
+                pass
+
+    def _process_device(self, device_key, auto_commit=True):
+        """ Fiscalize the pending entries of one device strictly in queue order. """
+        if not self.env["l10n_bs_edi.device"]._get_device(device_key)._allow_request():
+            # uređaj nedostupan, pokušaji se ne troše dok se ne javi na provjeru
+            return
+        cr = self.env.cr
+        cr.execute("SELECT pg_try_advisory_lock(hashtext(%s))", ["l10n_bs_edi.fiscal.queue:%s" % device_key])
+        if not cr.fetchone()[0]:
+            # drugi drainer već obrađuje ovaj uređaj
+            return
+        try:
+            batch_size = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.queue_batch_size", 20))
+            while True:
+                entries = self.search([("device_key", "=", device_key), ("state", "=", "pending")], limit=batch_size)
+                if not entries or not self._process_entries(entries, auto_commit=auto_commit):
+                    break
+        finally:
+            cr.execute("SELECT pg_advisory_unlock(hashtext(%s))", ["l10n_bs_edi.fiscal.queue:%s" % device_key])
+
+    def _process_entries(self, entries, auto_commit=True):
+        """ Send one chunk of a device's queue.
+
+        :return: False when the device could not be reached, to stop draining it for this run.
+        """
+        entries.write({
+            "state": "processing",
+            "date_started": fields.Datetime.now(),
+        })
+        for entry in entries:
+            entry.attempts += 1
+        if auto_commit:
+            self.env.cr.commit()
+
+        edi_format = self.env.ref("l10n_bs_edi.edi_in_einvoice_json_1_03")
+        max_attempts = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.queue_max_attempts", 3))
+        device_reachable = True
+        for run in entries._grouped_runs():
+            if run[0].job_type == "duplicate":
+                edi_result = {entry.move_id: entry.move_id._l10n_bs_edi_request_duplicate() for entry in run}
+            else:
+                edi_result = edi_format._ba_edi_fiscalize(run.move_id)
+            for entry in run:
+                move_result = edi_result.get(entry.move_id, {})
+                if move_result.get("success"):
+                    entry.write({
+                        "state": "done",
+                        "date_done": fields.Datetime.now(),
+                        "attachment_id": move_result.get("attachment") and move_result["attachment"].id,
+                        "error": False,
+                    })
+                elif move_result.get("blocking_level") == "warning" and entry.attempts < max_attempts:
+                    # uređaj nedostupan, pokušava se ponovo u sljedećem prolazu
+                    device_reachable = False
+                    entry.write({"state": "pending", "error": move_result.get("error")})
+                else:
+                    entry.write({
+                        "state": "failed",
+                        "date_done": fields.Datetime.now(),
+                        "error": move_result.get("error"),
+                        "error_reported": False,
+                    })
+        if auto_commit:
+            self.env.cr.commit()
+        self.env["account.edi.document"]._l10n_bs_edi_trigger_cron()
+        return device_reachable
+
+    def _grouped_runs(self):
+        """ Split into consecutive runs of the same company and job type, keeping the queue order. """
+        runs = []
+        for entry in self:
+            if runs and (runs[-1][0].company_id, runs[-1][0].job_type) == (entry.company_id, entry.job_type):
+                runs[-1] |= entry
+            else:
+                runs.append(entry)
+        return runs
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import hashlib
+import logging
+
+from psycopg2 import IntegrityError, OperationalError, errorcodes
+
+from odoo import api, fields, models
+
+from .account_edi_format import PAYLOAD_ENGINE_VERSION
+
+_logger = logging.getLogger(__name__)
+
+
+class L10nBsEdiPayload(models.Model):
+    _name = "l10n_bs_edi.payload"
+    _description = "Fiskalni payload"
+    _order = "id desc"
+
+    move_id = fields.Many2one("account.move", string="Faktura", required=True, ondelete="cascade", index=True)
+    company_id = fields.Many2one(related="move_id.company_id", store=True)
+    cache_key = fields.Char(required=True, index=True)
+    engine = fields.Char("Način pripreme")
+    payload = fields.Text("Payload", required=True)
+    date_sent = fields.Datetime("Poslano", help="Posljednje slanje ovog payloada fiskalnom uređaju")
+
+    _sql_constraints = [
+        ("move_cache_key_uniq", "unique(move_id, cache_key)", "Payload je već keširan za ovu fakturu."),
+    ]
+
+    @api.model
+    def _get_cache_key(self, move):
+        """ Everything the payload is built from: the move, its lines, the partners,
+        the reversed invoice (referent document) and the payload engine.
+        """
+        line_dates = [line.write_date for line in move.line_ids if line.write_date]
+        key = (
+            move.id,
+            move.write_date,
+            max(line_dates) if line_dates else None,
+            len(move.line_ids),
+            move.partner_id.write_date,
+            move.company_id.partner_id.write_date,
+            move.reversed_entry_id.write_date,
+            move.company_id.l10n_bs_edi_payload_engine,
+            PAYLOAD_ENGINE_VERSION,
+        )
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    @api.model
+    def _get_cached(self, moves, keys):
+        cached = {}
+        for record in self.sudo().search([("move_id", "in", moves.ids), ("cache_key", "in", list(keys.values()))]):
+            if keys.get(record.move_id) == record.cache_key:
+                cached[record.move_id] = record
+        return cached
+
+    @api.model
+    def _get_preview_payloads(self, moves):
+        """ Payloads for edi_content and previews: the stored one when still valid,
+        otherwise built in memory. Nothing is written, so concurrent readers don't
+        collide; payloads are only stored when sent, see _get_payloads.
+
+        :return: dict move -> payload string
+        """
+        keys = {move: self._get_cache_key(move) for move in moves}
+        cached = self._get_cached(moves, keys)
+        edi_format = self.env["account.edi.format"]
+        return {
+            move: cached[move].payload if move in cached else edi_format._l10n_bs_edi_dump_payload(move)
+            for move in moves
+        }
+
+    @api.model
+    def _get_payloads(self, moves):
+        """ Return the stored payload record of every move about to be sent, storing
+        the missing or stale ones.
+
+        When another transaction stores the same payload at the same time, its record
+        is reused, or if not visible yet, an unsaved record with the same content.
+
+        :return: dict move -> l10n_bs_edi.payload
+        """
+        self = self.sudo()
+        keys = {move: self._get_cache_key(move) for move in moves}
+        cached = self._get_cached(moves, keys)
+
+        missing = moves.filtered(lambda move: move not in cached)
+        if missing:
+            edi_format = self.env["account.edi.format"]
+            engines = edi_format._ba_edi_get_payload_engines(missing)
+            vals_list = [{
+                "move_id": move.id,
+                "cache_key": keys[move],
+                "engine": engines[move],
+                "payload": edi_format._l10n_bs_edi_dump_payload(move),
+            } for move in missing]
+            try:
+                with self.env.cr.savepoint():
+                    # stari payloadi koji nikad nisu poslani nisu više potrebni
+                    self.search([("move_id", "in", missing.ids), ("date_sent", "=", False)]).unlink()
+                    cached.update(zip(missing, self.create(vals_list)))
+            except (IntegrityError, OperationalError) as e:
+                if isinstance(e, OperationalError) and e.pgcode != errorcodes.SERIALIZATION_FAILURE:
+                    raise
+                _logger.info("Fiskalni payload za %s je istovremeno sačuvan u drugoj transakciji", missing.ids)
+                cached.update(self._get_cached(missing, keys))
+                for move, vals in zip(missing, vals_list):
+                    if move not in cached:
+                        cached[move] = self.new(vals)
+        return {move: cached[move] for move in moves}
+
+    @api.model
+    def _invalidate_unsent(self, domain=None):
+        """ Drop payloads that were never sent, e.g. after a change not visible in the cache key. """
+        self.sudo().search([("date_sent", "=", False)] + (domain or [])).unlink()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, tools
+
+PAYMENT_TYPES = [
+    ("Cash", "Gotovina"),
+    ("Card", "Kartica"),
+    ("WireTransfer", "Virman"),
+    ("Other", "Ostalo"),
+]
+
+
+class L10nBsEdiPaymentTypeRule(models.Model):
+    _name = "l10n_bs_edi.payment.type.rule"
+    _description = "Način plaćanja na fiskalnom računu"
+    _order = "sequence, id"
+
+    sequence = fields.Integer(default=10)
+    active = fields.Boolean(default=True)
+    company_id = fields.Many2one("res.company", string="Kompanija", help="Prazno: pravilo važi za sve kompanije")
+    rule_type = fields.Selection(
+        [
+            ("payment_term", "Uslov plaćanja"),
+            ("narration", "Opis računa"),
+        ],
+        string="Primjenjuje se na",
+        required=True,
+        default="payment_term",
+        help="Uslov plaćanja: uslov fakture je odabrani ili se naziv poklapa sa ključnom riječi.\n"
+             "Opis računa: opis fakture sadrži ključnu riječ. Pravila po opisu imaju prednost.",
+    )
+    payment_term_id = fields.Many2one("account.payment.term", string="Uslov plaćanja")
+    keyword = fields.Char("Ključna riječ")
+    payment_type = fields.Selection(PAYMENT_TYPES, string="Način plaćanja", required=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        self._rules_changed()
+        return rules
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._rules_changed()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._rules_changed()
+        return res
+
+    def _rules_changed(self):
+        self.clear_caches()
+        # način plaćanja nije dio ključa keširanih payloada
+        self.env["l10n_bs_edi.payload"]._invalidate_unsent()
+
+    @tools.ormcache("company_id")
+    def _get_lookup(self, company_id):
+        """ :return: (payment type by payment term id, ((TERM NAME, type), ...), ((NARRATION KEYWORD, type), ...)),
+                     in rule sequence
+        """
+        by_term_id = {}
+        term_names = []
+        narration_keywords = []
+        # rezultat dijele svi korisnici, ne smije zavisiti od konteksta pozivaoca
+        rules = self.sudo().with_context(active_test=True).search(["|", ("company_id", "=", False), ("company_id", "=", company_id)])
+        for rule in rules:
+            if rule.rule_type == "payment_term":
+                if rule.payment_term_id:
+                    by_term_id.setdefault(rule.payment_term_id.id, rule.payment_type)
+                if rule.keyword:
+                    term_names.append((rule.keyword.upper(), rule.payment_type))
+            elif rule.keyword:
+                narration_keywords.append((rule.keyword.upper(), rule.payment_type))
+        return by_term_id, tuple(term_names), tuple(narration_keywords)
+
+    @api.model
+    def _get_payment_type(self, move):
+        by_term_id, term_names, narration_keywords = self._get_lookup(move.company_id.id)
+        payment_type = "WireTransfer"
+
+        payment_term = move.invoice_payment_term_id
+        if payment_term:
+            if payment_term.id in by_term_id:
+                payment_type = by_term_id[payment_term.id]
+            else:
+                term_name = (payment_term.name or "").upper()
+                payment_type = next((rule_type for name, rule_type in term_names if name == term_name), payment_type)
+
+        # ako je storno račun, način plaćanja se može navesti samo u opisu računa
+        if move.narration and narration_keywords:
+            narration = move.narration.upper()
+            payment_type = next((rule_type for keyword, rule_type in narration_keywords if keyword in narration), payment_type)
+        return payment_type
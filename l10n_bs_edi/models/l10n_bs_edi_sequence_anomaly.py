@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+
+ANOMALY_TYPES = [
+    ("gap", "Nedostaju brojevi"),
+    ("duplicate", "Dupli broj"),
+    ("order", "Pogrešan redoslijed"),
+    ("format", "Neispravan broj"),
+]
+
+
+class L10nBsEdiSequenceAnomaly(models.Model):
+    _name = "l10n_bs_edi.sequence.anomaly"
+    _description = "Nepravilnost fiskalnih brojeva"
+    _order = "date_detected desc, id desc"
+
+    checkpoint_id = fields.Many2one("l10n_bs_edi.sequence.checkpoint", string="Kontrola", required=True, ondelete="cascade", index=True)
+    company_id = fields.Many2one(related="checkpoint_id.company_id", store=True)
+    device = fields.Char(related="checkpoint_id.device")
+    kind = fields.Selection(related="checkpoint_id.kind")
+    anomaly_type = fields.Selection(ANOMALY_TYPES, string="Vrsta", required=True, readonly=True)
+    number_from = fields.Integer("Broj", readonly=True)
+    number_to = fields.Integer("Do broja", readonly=True)
+    move_id = fields.Many2one("account.move", string="Faktura", readonly=True, ondelete="set null")
+    other_move_id = fields.Many2one("account.move", string="Faktura s istim brojem", readonly=True, ondelete="set null")
+    description = fields.Char("Opis", compute="_compute_description")
+    state = fields.Selection(
+        [
+            ("open", "Otvoreno"),
+            ("resolved", "Riješeno"),
+        ],
+        string="Status",
+        default="open",
+        required=True,
+        index=True,
+    )
+    date_detected = fields.Datetime("Otkriveno", default=fields.Datetime.now, required=True, readonly=True)
+    date_resolved = fields.Datetime("Riješeno", readonly=True)
+
+    @api.depends("anomaly_type", "number_from", "number_to", "move_id", "other_move_id")
+    def _compute_description(self):
+        for anomaly in self:
+            if anomaly.anomaly_type == "gap":
+                if anomaly.number_from == anomaly.number_to:
+                    anomaly.description = "Nedostaje broj %s" % anomaly.number_from
+                else:
+                    anomaly.description = "Nedostaju brojevi %s - %s (%s)" % (
+                        anomaly.number_from, anomaly.number_to, anomaly.number_to - anomaly.number_from + 1,
+                    )
+            elif anomaly.anomaly_type == "duplicate":
+                anomaly.description = "Broj %s je i na %s" % (anomaly.number_from, anomaly.other_move_id.name or "drugoj fakturi")
+            elif anomaly.anomaly_type == "order":
+                anomaly.description = "Broj %s izdat izvan redoslijeda" % anomaly.number_from
+            else:
+                anomaly.description = "Fiskalni broj %s nema redni broj" % (anomaly.move_id.ba_edi_fiskalni_broj or "")
+
+    def action_resolve(self):
+        self.filtered(lambda anomaly: anomaly.state == "open").write({
+            "state": "resolved",
+            "date_resolved": fields.Datetime.now(),
+        })
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import re
+from collections import defaultdict
+
+from odoo import api, fields, models, _
+
+SEQUENCE_KINDS = [
+    ("F", "Računi"),
+    ("R", "Reklamirani računi"),
+]
+KIND_BY_MOVE_TYPE = {"out_invoice": "F", "out_refund": "R"}
+MOVE_TYPE_BY_KIND = {kind: move_type for move_type, kind in KIND_BY_MOVE_TYPE.items()}
+# redni broj je zadnja grupa cifara, npr. "ABCD1234-ABCD1234-77" -> 77
+RE_FISCAL_NUMBER = re.compile(r"(\d+)$")
+
+
+class L10nBsEdiSequenceCheckpoint(models.Model):
+    _name = "l10n_bs_edi.sequence.checkpoint"
+    _description = "Kontrola fiskalnih brojeva"
+    _order = "company_id, device, kind"
+
+    company_id = fields.Many2one("res.company", string="Kompanija", required=True, readonly=True, index=True)
+    device = fields.Char("Fiskalni uređaj", readonly=True, help="Oznaka uređaja iz odgovora, prazno ako je uređaj ne vraća")
+    kind = fields.Selection(SEQUENCE_KINDS, string="Vrsta", required=True, readonly=True)
+    first_number = fields.Integer("Prvi broj", readonly=True)
+    last_number = fields.Integer("Zadnji broj", readonly=True)
+    last_fiscal_datetime = fields.Datetime("Vrijeme zadnjeg računa", readonly=True)
+    last_sequence = fields.Integer("Zadnji provjereni upis", readonly=True, help="Redni broj upisa fiskalnog broja do kojeg je provjera stigla")
+    date_checked = fields.Datetime("Provjereno", readonly=True)
+    anomaly_ids = fields.One2many("l10n_bs_edi.sequence.anomaly", "checkpoint_id", string="Nepravilnosti")
+    open_anomaly_count = fields.Integer("Otvorene nepravilnosti", compute="_compute_open_anomaly_count")
+
+    _sql_constraints = [
+        ("checkpoint_uniq", "unique(company_id, device, kind)", "Kontrola za ovaj uređaj već postoji."),
+    ]
+
+    def init(self):
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS l10n_bs_edi_fiscal_sequence")
+
+    def _compute_open_anomaly_count(self):
+        groups = self.env["l10n_bs_edi.sequence.anomaly"].read_group(
+            [("checkpoint_id", "in", self.ids), ("state", "=", "open")], ["checkpoint_id"], ["checkpoint_id"],
+        )
+        counts = {group["checkpoint_id"][0]: group["checkpoint_id_count"] for group in groups}
+        for checkpoint in self:
+            checkpoint.open_anomaly_count = counts.get(checkpoint.id, 0)
+
+    # -------------------------------------------------------------------------
+    # Order of fiscalization
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _stamp(self, moves):
+        """ Number moves in the order their fiscal number was written, so the check
+        only has to read what was fiscalized since its last run.
+
+        The stamp is taken before the transaction commits: the time it was taken is
+        kept so the check can tell when no lower stamp can still show up.
+        """
+        if not moves:
+            return
+        self.env.cr.execute("""
+            UPDATE account_move
+               SET l10n_bs_edi_fiscal_sequence = nextval('l10n_bs_edi_fiscal_sequence'),
+                   l10n_bs_edi_fiscal_stamp_date = clock_timestamp() AT TIME ZONE 'UTC'
+             WHERE id = ANY(%s)
+        """, [moves.ids])
+        moves.invalidate_recordset(["l10n_bs_edi_fiscal_sequence", "l10n_bs_edi_fiscal_stamp_date"])
+
+    @api.model
+    def _stamp_legacy(self):
+        """ Number moves fiscalized before the stamp existed, by fiscalization time. """
+        self.env["account.move"].flush_model(["ba_edi_fiskalni_broj", "l10n_bs_edi_fiscal_datetime", "l10n_bs_edi_fiscal_sequence"])
+        self.env.cr.execute("""
+            WITH ordered AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY l10n_bs_edi_fiscal_datetime NULLS FIRST, id) AS rn
+                  FROM account_move
+                 WHERE ba_edi_fiskalni_broj IS NOT NULL
+                   AND l10n_bs_edi_fiscal_sequence IS NULL
+            )
+            UPDATE account_move move
+               SET l10n_bs_edi_fiscal_sequence = ordered.rn + COALESCE(
+                       (SELECT MAX(l10n_bs_edi_fiscal_sequence) FROM account_move), 0)
+              FROM ordered
+             WHERE move.id = ordered.id
+        """)
+        count = self.env.cr.rowcount
+        self.env.cr.execute("""
+            SELECT setval('l10n_bs_edi_fiscal_sequence', GREATEST(MAX(l10n_bs_edi_fiscal_sequence), 1))
+              FROM account_move
+        """)
+        self.env["account.move"].invalidate_model(["l10n_bs_edi_fiscal_sequence"])
+        return count
+
+    # -------------------------------------------------------------------------
+    # Check
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_check_sequences(self):
+        """ Check the fiscal numbers written since the last run, per company, device and kind.
+
+        Stamps are handed out before commit, so a transaction still running may hold
+        a stamp lower than the ones already visible. Only stamps older than
+        ``l10n_bs_edi.sequence_check_delay`` seconds are checked (by default the
+        sending timeout, the longest a sending transaction may take): every lower
+        stamp is then committed or rolled back and the checkpoint can move past it.
+
+        :return: number of new anomalies
+        """
+        get_param = self.env["ir.config_parameter"].sudo().get_param
+        batch_size = int(get_param("l10n_bs_edi.sequence_check_batch", 5000))
+        delay = get_param("l10n_bs_edi.sequence_check_delay")
+        if not delay:
+            delay = get_param("l10n_bs_edi.sending_timeout") or self.env["account.edi.document"]._l10n_bs_edi_default_sending_timeout()
+        delay = int(delay)
+        checkpoints = {(checkpoint.company_id.id, checkpoint.device or "", checkpoint.kind): checkpoint for checkpoint in self.search([])}
+        start = min((checkpoint.last_sequence for checkpoint in checkpoints.values()), default=0)
+        anomalies = self.env["l10n_bs_edi.sequence.anomaly"]
+        self.env["account.move"].flush_model([
+            "company_id", "move_type", "ba_edi_fiskalni_broj", "l10n_bs_edi_device_id", "l10n_bs_edi_fiscal_datetime",
+            "l10n_bs_edi_fiscal_sequence", "l10n_bs_edi_fiscal_stamp_date",
+        ])
+        self.env.cr.execute("SELECT clock_timestamp() AT TIME ZONE 'UTC' - make_interval(secs => %s)", [delay])
+        horizon_date = self.env.cr.fetchone()[0]
+        while True:
+            self.env.cr.execute("""
+                SELECT id, company_id, COALESCE(l10n_bs_edi_device_id, ''), move_type,
+                       ba_edi_fiskalni_broj, l10n_bs_edi_fiscal_datetime, l10n_bs_edi_fiscal_sequence
+                  FROM account_move
+                 WHERE l10n_bs_edi_fiscal_sequence > %s
+                   AND (l10n_bs_edi_fiscal_stamp_date IS NULL OR l10n_bs_edi_fiscal_stamp_date < %s)
+                   AND ba_edi_fiskalni_broj IS NOT NULL
+                   AND move_type IN ('out_invoice', 'out_refund')
+              ORDER BY l10n_bs_edi_fiscal_sequence
+                 LIMIT %s
+            """, [start, horizon_date, batch_size])
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            rows_by_key = defaultdict(list)
+            for move_id, company_id, device, move_type, number, fiscal_datetime, sequence in rows:
+                rows_by_key[(company_id, device, KIND_BY_MOVE_TYPE[move_type])].append((move_id, number, fiscal_datetime, sequence))
+            for key, key_rows in rows_by_key.items():
+                checkpoint = checkpoints.get(key)
+                if not checkpoint:
+                    company_id, device, kind = key
+                    checkpoint = checkpoints[key] = self.create({"company_id": company_id, "device": device, "kind": kind})
+                anomalies |= checkpoint._check_rows([row for row in key_rows if row[3] > checkpoint.last_sequence])
+            start = rows[-1][-1]
+
+        now = fields.Datetime.now()
+        for checkpoint in checkpoints.values():
+            checkpoint.write({"last_sequence": max(checkpoint.last_sequence, start), "date_checked": now})
+        return len(anomalies)
+
+    def _check_rows(self, rows):
+        """ Compare new fiscal numbers with what the checkpoint has seen.
+
+        Numbers are checked in numeric order: a number above the last one may open a
+        gap, a number inside an open gap closes it (the move was committed late), any
+        other number at or below the last one is a duplicate, or an ordering anomaly
+        when it is below the first number ever seen.
+
+        :param rows: list of (move_id, fiscal number, fiscal datetime, stamp)
+        :return: created anomalies
+        """
+        self.ensure_one()
+        Anomaly = self.env["l10n_bs_edi.sequence.anomaly"]
+        anomaly_vals = []
+        numbered = []
+        for move_id, fiscal_number, fiscal_datetime, _sequence in rows:
+            match = RE_FISCAL_NUMBER.search(fiscal_number)
+            if not match:
+                anomaly_vals.append({"anomaly_type": "format", "move_id": move_id})
+                continue
+            numbered.append((int(match.group(1)), fiscal_datetime, move_id))
+        numbered.sort(key=lambda item: (item[0], item[2]))
+
+        first_number, last_number, last_datetime = self.first_number, self.last_number, self.last_fiscal_datetime
+        seen = {}
+        for number, fiscal_datetime, move_id in numbered:
+            if number in seen:
+                anomaly_vals.append({"anomaly_type": "duplicate", "number_from": number, "move_id": move_id, "other_move_id": seen[number]})
+                continue
+            seen[number] = move_id
+            if not first_number:
+                first_number = last_number = number
+                last_datetime = fiscal_datetime
+                continue
+            if number > last_number:
+                if number > last_number + 1:
+                    anomaly_vals.append({"anomaly_type": "gap", "number_from": last_number + 1, "number_to": number - 1, "move_id": move_id})
+                if fiscal_datetime and last_datetime and fiscal_datetime < last_datetime:
+                    anomaly_vals.append({"anomaly_type": "order", "number_from": number, "move_id": move_id})
+                last_number = number
+                last_datetime = fiscal_datetime or last_datetime
+            elif number < first_number:
+                anomaly_vals.append({"anomaly_type": "order", "number_from": number, "move_id": move_id})
+            elif not self._fill_gap(number):
+                anomaly_vals.append({
+                    "anomaly_type": "duplicate",
+                    "number_from": number,
+                    "move_id": move_id,
+                    "other_move_id": self._find_other_move(number, move_id).id,
+                })
+
+        self.write({"first_number": first_number, "last_number": last_number, "last_fiscal_datetime": last_datetime})
+        return Anomaly.create([{"checkpoint_id": self.id, **vals} for vals in anomaly_vals])
+
+    def _fill_gap(self, number):
+        """ Shrink or close the open gap containing ``number``.
+
+        :return: True if the number was missing
+        """
+        gap = self.anomaly_ids.filtered(
+            lambda anomaly: anomaly.anomaly_type == "gap" and anomaly.state == "open"
+            and anomaly.number_from <= number <= anomaly.number_to
+        )[:1]
+        if not gap:
+            return False
+        if gap.number_from == gap.number_to:
+            gap.write({"state": "resolved", "date_resolved": fields.Datetime.now()})
+        elif number == gap.number_from:
+            gap.number_from += 1
+        elif number == gap.number_to:
+            gap.number_to -= 1
+        else:
+            gap.copy({"number_from": number + 1, "number_to": gap.number_to})
+            gap.number_to = number - 1
+        return True
+
+    def _find_other_move(self, number, move_id):
+        moves = self.env["account.move"].search([
+            ("company_id", "=", self.company_id.id),
+            ("move_type", "=", MOVE_TYPE_BY_KIND[self.kind]),
+            ("l10n_bs_edi_device_id", "=", self.device or False),
+            ("ba_edi_fiskalni_broj", "=like", "%" + str(number)),
+            ("id", "!=", move_id),
+        ])
+        return moves.filtered(lambda move: int(RE_FISCAL_NUMBER.search(move.ba_edi_fiskalni_broj).group(1)) == number)[:1]
+
+    def action_open_anomalies(self):
+        self.ensure_one()
+        action = self.env["ir.actions.act_window"]._for_xml_id("l10n_bs_edi.action_l10n_bs_edi_sequence_anomaly")
+        action["domain"] = [("checkpoint_id", "=", self.id)]
+        return action
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+from ..tools import timing
+
+STAGES = [
+    ("validation", "Provjera"),
+    ("tax_details", "Porezni detalji"),
+    ("payload", "Priprema računa"),
+    ("post", "Fiskalizacija"),
+    ("http", "Fiskalni uređaj"),
+    ("attachment", "Prilog odgovora"),
+    ("duplicate", "Duplikat"),
+]
+BUCKET_FIELDS = ["bucket_%s" % limit for limit in timing.BUCKETS_MS] + ["bucket_inf"]
+
+
+class L10nBsEdiTiming(models.Model):
+    _name = "l10n_bs_edi.timing"
+    _description = "Trajanje fiskalizacije"
+    _order = "date desc, company_id, device, stage"
+
+    date = fields.Datetime("Sat", required=True, readonly=True, index=True)
+    company_id = fields.Many2one("res.company", string="Kompanija", required=True, readonly=True, index=True)
+    device = fields.Char("Fiskalni uređaj", readonly=True)
+    stage = fields.Selection(STAGES, string="Faza", required=True, readonly=True)
+    count = fields.Integer("Broj mjerenja", readonly=True, group_operator="sum")
+    total_ms = fields.Float("Ukupno (ms)", readonly=True, group_operator="sum")
+    max_ms = fields.Float("Najduže (ms)", readonly=True, group_operator="max")
+    avg_ms = fields.Float("Prosjek (ms)", compute="_compute_percentiles")
+    p50_ms = fields.Float("p50 (ms)", compute="_compute_percentiles", help="Gornja granica histograma")
+    p95_ms = fields.Float("p95 (ms)", compute="_compute_percentiles", help="Gornja granica histograma")
+    bucket_10 = fields.Integer("≤ 10 ms", readonly=True)
+    bucket_25 = fields.Integer("≤ 25 ms", readonly=True)
+    bucket_50 = fields.Integer("≤ 50 ms", readonly=True)
+    bucket_100 = fields.Integer("≤ 100 ms", readonly=True)
+    bucket_250 = fields.Integer("≤ 250 ms", readonly=True)
+    bucket_500 = fields.Integer("≤ 500 ms", readonly=True)
+    bucket_1000 = fields.Integer("≤ 1 s", readonly=True)
+    bucket_2500 = fields.Integer("≤ 2,5 s", readonly=True)
+    bucket_5000 = fields.Integer("≤ 5 s", readonly=True)
+    bucket_10000 = fields.Integer("≤ 10 s", readonly=True)
+    bucket_inf = fields.Integer("> 10 s", readonly=True)
+
+    _sql_constraints = [
+        ("bucket_uniq", "unique(date, company_id, device, stage)", "Mjerenje za ovaj sat već postoji."),
+    ]
+
+    @api.depends("count", "total_ms", *BUCKET_FIELDS)
+    def _compute_percentiles(self):
+        limits = list(timing.BUCKETS_MS) + [None]
+        for record in self:
+            record.avg_ms = record.total_ms / record.count if record.count else 0.0
+            counts = [record[name] for name in BUCKET_FIELDS]
+            record.p50_ms = record._percentile(counts, limits, 0.50)
+            record.p95_ms = record._percentile(counts, limits, 0.95)
+
+    def _percentile(self, counts, limits, quantile):
+        total = sum(counts)
+        if not total:
+            return 0.0
+        seen = 0
+        for count, limit in zip(counts, limits):
+            seen += count
+            if seen >= quantile * total:
+                return float(limit if limit is not None else self.max_ms)
+        return self.max_ms
+
+    # -------------------------------------------------------------------------
+    # Flush
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _flush_if_due(self):
+        interval = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.timing_flush_interval", 60))
+        if timing.flush_due(self.env.cr.dbname, interval):
+            self._flush()
+
+    @api.model
+    def _flush(self):
+        """ Add this worker's measurements to the hourly rows, in their own transaction. """
+        rows = timing.drain(self.env.cr.dbname)
+        if not rows:
+            return
+        if getattr(threading.current_thread(), "testing", False):
+            self._upsert(self.env.cr, rows)
+        else:
+            with self.pool.cursor() as cr:
+                self._upsert(cr, rows)
+
+    @api.model
+    def _upsert(self, cr, rows):
+        columns = ["date", "company_id", "device", "stage", "count", "total_ms", "max_ms"] + BUCKET_FIELDS
+        updates = ", ".join(
+            "max_ms = GREATEST(l10n_bs_edi_timing.max_ms, EXCLUDED.max_ms)" if column == "max_ms"
+            else "{0} = l10n_bs_edi_timing.{0} + EXCLUDED.{0}".format(column)
+            for column in columns[4:]
+        )
+        query = """
+            INSERT INTO l10n_bs_edi_timing ({columns}, create_uid, create_date, write_uid, write_date)
+                 VALUES ({placeholders}, %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC')
+            ON CONFLICT (date, company_id, device, stage)
+              DO UPDATE SET {updates}, write_date = NOW() AT TIME ZONE 'UTC'
+        """.format(columns=", ".join(columns), placeholders=", ".join(["%s"] * len(columns)), updates=updates)
+        for company_id, device, stage, hour, entry in rows:
+            if not company_id:
+                # mjerenje bez kompanije (npr. prazan skup faktura) se ne može upisati
+                continue
+            cr.execute(query, [
+                hour, company_id, device, stage, entry["count"], entry["total_ms"], entry["max_ms"],
+                *entry["buckets"], self.env.uid, self.env.uid,
+            ])
+        # samo ovaj model: flush se dešava usred fiskalizacije, keš pozivaoca ostaje
+        self.invalidate_model()
+
+    @api.model
+    def _cron_flush(self):
+        self._flush()
+        days = int(self.env["ir.config_parameter"].sudo().get_param("l10n_bs_edi.timing_retention_days", 90))
+        self.search([("date", "<", fields.Datetime.now() - timedelta(days=days))]).unlink()
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, models
+
+
+class ReportInvoice(models.AbstractModel):
+    _inherit = "report.account.report_invoice"
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        values = super()._get_report_values(docids, data=data)
+        # fiskalni podaci za sve fakture odjednom, ne po stranici
+        values["docs"]._l10n_bs_edi_prefetch_report_data()
+        return values
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import fields, models
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+from ..tools.transport import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, get_transport, transport_stats,
+)
 
 
 class ResCompany(models.Model):
@@ -10,7 +15,34 @@ class ResCompany(models.Model):
     l10n_bs_edi_api_host = fields.Char("Fiskalizacijski server npr http://fisk.test.com:3556", groups="base.group_system")
     l10n_bs_edi_api_key = fields.Char("Api key", groups="base.group_system")
     l10n_bs_edi_pin = fields.Char("PIN", groups="base.group_system")
+    l10n_bs_edi_connect_timeout = fields.Float(
+        string="Timeout konekcije (s)",
+        default=DEFAULT_CONNECT_TIMEOUT,
+        groups="base.group_system",
+    )
+    l10n_bs_edi_read_timeout = fields.Float(
+        string="Timeout odgovora (s)",
+        help="Koliko dugo se čeka odgovor fiskalnog uređaja prije nego se zahtjev prekine",
+        default=DEFAULT_READ_TIMEOUT,
+        groups="base.group_system",
+    )
     
+    l10n_bs_edi_use_queue = fields.Boolean(
+        string="Fiskalizacija kroz red čekanja",
+        help="Knjiženje fakture je samo stavlja u red, fiskalni uređaj se poziva u pozadini",
+    )
+
+    l10n_bs_edi_payload_engine = fields.Selection(
+        [
+            ("orm", "account_edi (ORM)"),
+            ("sql", "SQL agregacija"),
+        ],
+        string="Izračun fiskalnog računa",
+        help="SQL agregacija računa osnovicu i PDV po oznaci jednim upitom, za fakture sa puno stavki",
+        default="orm",
+        required=True,
+    )
+
     #l10n_bs_edi_token_validity = fields.Datetime("E-invoice (IN) Valid Until", groups="base.group_system")
     l10n_bs_edi_production_env = fields.Boolean(
         string="Fiskalne funkcije u produkciji",
@@ -24,3 +56,22 @@ class ResCompany(models.Model):
         #    return True
         #return False
         return True
+
+    def _l10n_bs_edi_get_transport(self):
+        """ Pooled keep-alive HTTP transport towards the company's fiscal device. """
+        self.ensure_one()
+        if self.env.context.get("l10n_bs_edi_dry_run"):
+            raise UserError(_("Probna fiskalizacija ne šalje ništa fiskalnom uređaju."))
+        company = self.sudo()
+        return get_transport(
+            self.env.cr.dbname,
+            company.id,
+            company.l10n_bs_edi_api_host,
+            api_key=company.l10n_bs_edi_api_key,
+            connect_timeout=company.l10n_bs_edi_connect_timeout,
+            read_timeout=company.l10n_bs_edi_read_timeout,
+        )
+
+    def _l10n_bs_edi_transport_stats(self):
+        self.ensure_one()
+        return transport_stats(self.env.cr.dbname, self.id)
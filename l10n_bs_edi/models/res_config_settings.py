@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-from odoo import models, fields, _
+from odoo import api, models, fields, _
 from odoo.exceptions import UserError, RedirectWarning
 
+from .l10n_bs_edi_device import DEVICE_STATES
+
 
 class ResConfigSettings(models.TransientModel):
     _inherit = "res.config.settings"
@@ -11,6 +13,22 @@ class ResConfigSettings(models.TransientModel):
     l10n_bs_edi_api_host = fields.Char("Fiskalni host url", related="company_id.l10n_bs_edi_api_host", readonly=False)
     l10n_bs_edi_api_key = fields.Char("Fiskalni api key", related="company_id.l10n_bs_edi_api_key", readonly=False)
     l10n_bs_edi_pin = fields.Char("Fiskalni pin", related="company_id.l10n_bs_edi_pin", readonly=False)
+    l10n_bs_edi_connect_timeout = fields.Float(related="company_id.l10n_bs_edi_connect_timeout", readonly=False)
+    l10n_bs_edi_read_timeout = fields.Float(related="company_id.l10n_bs_edi_read_timeout", readonly=False)
+    l10n_bs_edi_use_queue = fields.Boolean(related="company_id.l10n_bs_edi_use_queue", readonly=False)
+    l10n_bs_edi_payload_engine = fields.Selection(related="company_id.l10n_bs_edi_payload_engine", readonly=False)
+    l10n_bs_edi_queue_concurrency = fields.Integer(
+        string="Broj uređaja u paraleli",
+        config_parameter="l10n_bs_edi.queue_concurrency",
+        default=2,
+    )
+    l10n_bs_edi_device_state = fields.Selection(
+        DEVICE_STATES,
+        string="Stanje fiskalnog uređaja",
+        compute="_compute_l10n_bs_edi_device",
+    )
+    l10n_bs_edi_device_latency = fields.Integer(string="Odziv uređaja (ms)", compute="_compute_l10n_bs_edi_device")
+    l10n_bs_edi_device_probe_date = fields.Datetime(string="Posljednja provjera", compute="_compute_l10n_bs_edi_device")
     
     l10n_bs_edi_production_env = fields.Boolean(
         string="Fiskalne fuknkcije aktivirane",
@@ -18,6 +36,36 @@ class ResConfigSettings(models.TransientModel):
         readonly=False
     )
 
+    @api.depends("company_id.l10n_bs_edi_api_host")
+    def _compute_l10n_bs_edi_device(self):
+        Device = self.env["l10n_bs_edi.device"].sudo()
+        for settings in self:
+            host = Device._normalize_host(settings.company_id.l10n_bs_edi_api_host)
+            device = Device.search([("host", "=", host)], limit=1) if host else Device
+            settings.l10n_bs_edi_device_state = device.state
+            settings.l10n_bs_edi_device_latency = device.last_probe_latency
+            settings.l10n_bs_edi_device_probe_date = device.last_probe_date
+
+    def l10n_bs_edi_probe_device(self):
+        if not self.company_id.l10n_bs_edi_api_host:
+            raise UserError(_("Fiskalni host nije podešen."))
+        transport = self.company_id._l10n_bs_edi_get_transport()
+        device = self.env["l10n_bs_edi.device"]._get_device(transport.host)
+        if device._probe(transport=transport):
+            notification_type, message = "success", _("Fiskalni uređaj odgovara (%s ms)", device.last_probe_latency)
+        else:
+            notification_type, message = "warning", _("Fiskalni uređaj %s nije dostupan", device.host)
+        return {
+              'type': 'ir.actions.client',
+              'tag': 'display_notification',
+              'params': {
+                  'type': notification_type,
+                  'sticky': False,
+                  'message': message,
+                  'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+              }
+          }
+
     def l10n_bs_check_vat_number(self):
         if not self.company_id.vat:
             action = {
@@ -44,4 +92,27 @@ class ResConfigSettings(models.TransientModel):
               }
           }
 
-
+    def l10n_bs_edi_transport_stats(self):
+        stats = self.company_id._l10n_bs_edi_transport_stats()
+        if stats:
+            message = _(
+                "%(host)s: %(requests)s zahtjeva, %(errors)s grešaka, %(timeouts)s timeout-a, "
+                "prosječno %(avg_time_ms)s ms, otvorenih konekcija %(connections)s",
+                host=stats["host"],
+                requests=stats["requests"],
+                errors=stats["errors"],
+                timeouts=stats["timeouts"],
+                avg_time_ms=stats["avg_time_ms"],
+                connections=sum(pool["connections_opened"] for pool in stats["pools"]),
+            )
+        else:
+            message = _("Ovaj worker još nije slao zahtjeve fiskalnom uređaju.")
+        return {
+              'type': 'ir.actions.client',
+              'tag': 'display_notification',
+              'params': {
+                  'type': 'info',
+                  'sticky': False,
+                  'message': message,
+              }
+          }
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+
+
+class ResPartner(models.Model):
+    _inherit = "res.partner"
+
+    l10n_bs_edi_fiscal_ready = fields.Boolean(
+        string="Spreman za fiskalizaciju",
+        compute="_compute_l10n_bs_edi_fiscal_ready",
+        store=True,
+        index=True,
+    )
+    l10n_bs_edi_fiscal_message = fields.Text(
+        string="Nedostaci za fiskalizaciju",
+        compute="_compute_l10n_bs_edi_fiscal_ready",
+        store=True,
+    )
+
+    # property_account_position_id je company_dependent i ne utiče na rezultat provjere,
+    # vidi AccountEdiFormat._l10n_bs_edi_partner_errors
+    @api.depends("country_id.code", "company_registry", "vat", "street", "street2", "city", "state_id.name", "email")
+    def _compute_l10n_bs_edi_fiscal_ready(self):
+        edi_format = self.env["account.edi.format"]
+        for partner in self:
+            errors = edi_format._l10n_bs_edi_partner_errors(partner)
+            partner.l10n_bs_edi_fiscal_ready = not errors
+            partner.l10n_bs_edi_fiscal_message = "\n".join(message for _code, message in errors) or False
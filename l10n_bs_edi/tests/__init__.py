@@ -2,3 +2,19 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from . import test_edi_json
+from . import test_edi_batching
+from . import test_fiscal_queue
+from . import test_applicability
+from . import test_dry_run
+from . import test_payload
+from . import test_amounts
+from . import test_timing
+from . import test_fiscal_response
+from . import test_fiscal_number
+from . import test_report
+from . import test_device
+from . import test_device_report
+from . import test_fiscal_simulator
+from . import test_fiscal_journal
+from . import test_sequence_check
+from . import test_benchmark
@@ -0,0 +1,152 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import json
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import requests
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.l10n_bs_edi.tools import FiscalSimulator
+
+
+class TestBaEdiCommon(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.maxDiff = None
+        country_ba = cls.env.ref("base.ba")
+        canton = cls.env["res.country.state"].create({
+            "name": "Kanton Sarajevo",
+            "code": "KS",
+            "country_id": country_ba.id,
+        })
+        cls.company_data["company"].write({
+            "street": "Zmaja od Bosne 1",
+            "city": "Sarajevo",
+            "zip": "71000",
+            "state_id": canton.id,
+            "country_id": country_ba.id,
+            "vat": "200000000001",
+            "company_registry": "4200000000001",
+            "l10n_bs_edi_api_host": "http://fiskalni.test:3566",
+            "l10n_bs_edi_api_key": "test-key",
+            "l10n_bs_edi_pin": "1234",
+        })
+        cls.partner_a.write({
+            "street": "Titova 10",
+            "city": "Sarajevo",
+            "zip": "71000",
+            "state_id": canton.id,
+            "country_id": country_ba.id,
+            "vat": "200000000002",
+            "company_registry": "4200000000002",
+        })
+
+        cls.tax_tag_a = cls.env.ref("l10n_bs.tax_tag_A")
+        cls.tax_tag_e = cls.env.ref("l10n_bs.tax_tag_E")
+        cls.tax_tag_k = cls.env.ref("l10n_bs.tax_tag_K")
+        cls.tax_pdv_17 = cls._create_ba_tax("PDV 17%", 17.0, cls.tax_tag_e)
+        cls.tax_pdv_0 = cls._create_ba_tax("PDV 0%", 0.0, cls.tax_tag_k)
+        cls.tax_pdv_a = cls._create_ba_tax("Bez PDV", 0.0, cls.tax_tag_a)
+
+        cls.edi_format = cls.env.ref("l10n_bs_edi.edi_in_einvoice_json_1_03")
+        cls.company_data["default_journal_sale"].edi_format_ids = [(6, 0, cls.edi_format.ids)]
+
+    @classmethod
+    def _create_ba_tax(cls, name, amount, tag):
+        repartition = [
+            (0, 0, {"repartition_type": "base", "tag_ids": [(6, 0, tag.ids)]}),
+            (0, 0, {
+                "repartition_type": "tax",
+                "account_id": cls.company_data["default_account_tax_sale"].id,
+                "tag_ids": [(6, 0, tag.ids)],
+            }),
+        ]
+        return cls.env["account.tax"].create({
+            "name": name,
+            "amount": amount,
+            "amount_type": "percent",
+            "type_tax_use": "sale",
+            "company_id": cls.company_data["company"].id,
+            "invoice_repartition_line_ids": repartition,
+            "refund_repartition_line_ids": repartition,
+        })
+
+    @classmethod
+    def _create_ba_invoice(cls, lines, move_type="out_invoice", post=True, **values):
+        """ Create a BA invoice from a list of (price_unit, quantity, taxes) tuples. """
+        invoice = cls.env["account.move"].create({
+            "move_type": move_type,
+            "partner_id": cls.partner_a.id,
+            "invoice_date": "2025-01-15",
+            "date": "2025-01-15",
+            "invoice_line_ids": [
+                (0, 0, {
+                    "product_id": cls.product_a.id,
+                    "price_unit": price_unit,
+                    "quantity": quantity,
+                    "tax_ids": [(6, 0, taxes.ids)],
+                })
+                for price_unit, quantity, taxes in lines
+            ],
+            **values,
+        })
+        if post:
+            invoice.action_post()
+        return invoice
+
+    @contextmanager
+    def _mock_fiscal_device(self, start_number=1, fail_for=()):
+        """ Patch the HTTP layer so that every posted invoice gets the next fiscal number.
+
+        :param fail_for: erpDocument values for which the device answers with an error message.
+        """
+        sent = []
+
+        def _request(session, method, url, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            payload = kwargs.get("json") or json.loads(kwargs.get("data") or "{}")
+            sent.append((method, url, payload))
+            if url.endswith("/api/invoices"):
+                erp_document = payload["invoiceRequest"]["erpDocument"]
+                if erp_document in fail_for:
+                    body = {"message": "Greška uređaja za %s" % erp_document}
+                else:
+                    invoice_count = sum(1 for _method, sent_url, _payload in sent if sent_url.endswith("/api/invoices"))
+                    body = {"invoiceNumber": str(start_number + invoice_count - 1)}
+            else:
+                body = {"status": "OK"}
+            response._content = json.dumps(body).encode()
+            return response
+
+        with patch.object(requests.Session, "request", autospec=True, side_effect=_request):
+            yield sent
+
+    @contextmanager
+    def _mock_unreachable_device(self, error=None):
+        """ Patch the HTTP layer so that every request fails to connect.
+
+        :param error: exception raised instead of a refused connection, e.g. a read timeout
+        """
+        calls = []
+
+        def _request(session, method, url, **kwargs):
+            calls.append((method, url))
+            raise error or requests.exceptions.ConnectionError("Connection refused")
+
+        with patch.object(requests.Session, "request", autospec=True, side_effect=_request):
+            yield calls
+
+    @contextmanager
+    def _fiscal_simulator(self, **kwargs):
+        """ Run a local fiscal device simulator and point the company to it. """
+        company = self.company_data["company"]
+        with FiscalSimulator(pin=company.l10n_bs_edi_pin, **kwargs) as simulator:
+            previous_host = company.l10n_bs_edi_api_host
+            company.l10n_bs_edi_api_host = simulator.url
+            try:
+                yield simulator
+            finally:
+                company.l10n_bs_edi_api_host = previous_host
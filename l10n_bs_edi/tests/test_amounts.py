@@ -0,0 +1,26 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from odoo.addons.l10n_bs_edi.tools import amounts
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestAmounts(TestBaEdiCommon):
+
+    def test_fixed_point_amounts(self):
+        self.assertEqual(amounts.to_units(2.675), 268, "half-up, not float banker's rounding")
+        self.assertEqual(amounts.to_units(166.60000000000002), 16660)
+        self.assertEqual(amounts.to_units(1.03, rounding=0.05), 105)
+        self.assertEqual(amounts.from_units(-0), 0.0)
+
+        self.company_data["company"].tax_calculation_rounding_method = "round_globally"
+        invoice = self._create_ba_invoice(
+            [(0.33, 1, self.tax_pdv_17)] * 7 + [(10.05, 3, self.tax_pdv_0), (0.07, 1, self.tax_pdv_a)],
+        )
+        payload = self.edi_format._ba_edi_generate_invoice_json(invoice)["invoiceRequest"]
+        total_units = sum(amounts.to_units(item["totalAmount"]) for item in payload["items"])
+        self.assertEqual(amounts.to_units(payload["payment"][0]["amount"]), total_units)
+        for item in payload["items"]:
+            self.assertEqual(amounts.to_units(item["baseAmount"]) + amounts.to_units(item["taxAmount"]), amounts.to_units(item["totalAmount"]))
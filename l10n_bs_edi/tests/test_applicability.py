@@ -0,0 +1,87 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestApplicability(TestBaEdiCommon):
+
+    def test_tax_tag_map(self):
+        tag_map = self.edi_format._l10n_bs_edi_tax_tag_map(self.company_data["company"])
+        self.assertEqual(
+            tag_map.taxable_tag_ids,
+            frozenset((self.tax_tag_a | self.tax_tag_e | self.tax_tag_k).ids),
+        )
+        self.assertIn(self.env.ref("l10n_bs.tax_tag_E_base").id, tag_map.non_taxable_tag_ids)
+        self.assertEqual(tag_map.pdv_code_by_tag_id[self.tax_tag_e.id], "E")
+        self.assertIs(tag_map, self.edi_format._l10n_bs_edi_tax_tag_map(self.company_data["company"]))
+
+        # K wins over A when a repartition line carries both, like the former A/E/K loop
+        self.assertEqual(self.edi_format._l10n_bs_edi_get_pdv_code((self.tax_tag_a | self.tax_tag_k).ids, tag_map), "K")
+        self.assertEqual(self.edi_format._l10n_bs_edi_get_pdv_code([], tag_map), "other")
+
+        self.env["account.account.tag"].create({"name": "Other", "applicability": "taxes"}).name = "Other 2"
+        self.assertIs(
+            tag_map, self.edi_format._l10n_bs_edi_tax_tag_map(self.company_data["company"]),
+            "Other tags must not clear the registry caches",
+        )
+        self.tax_tag_e.name = self.tax_tag_e.name
+        self.assertIsNot(
+            tag_map, self.edi_format._l10n_bs_edi_tax_tag_map(self.company_data["company"]),
+            "Writing on a BA tag must invalidate the cached map",
+        )
+
+    def test_move_applicability(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        untaxed = self._create_ba_invoice([(100.0, 1, self.env["account.tax"])])
+        self.assertTrue(self.edi_format._get_move_applicability(invoice))
+        self.assertFalse(self.edi_format._get_move_applicability(untaxed))
+
+    def test_bulk_fiscalizable_moves(self):
+        invoices = self.env["account.move"]
+        for taxes in (self.tax_pdv_17, self.tax_pdv_0, self.env["account.tax"], self.tax_pdv_a):
+            invoices |= self._create_ba_invoice([(100.0, 1, taxes)])
+        bill = self.init_invoice("in_invoice", products=self.product_a)
+
+        moves = (invoices | bill).with_prefetch()
+        moves.mapped("country_code")
+        self.env.flush_all()
+        with self.assertQueryCount(1):
+            fiscalizable = self.edi_format._l10n_bs_edi_get_fiscalizable_moves(moves)
+        self.assertEqual(fiscalizable, invoices[0] + invoices[1] + invoices[3])
+
+        moves.invalidate_recordset(["l10n_bs_edi_is_fiscalizable"])
+        self.assertEqual(moves.mapped("l10n_bs_edi_is_fiscalizable"), [True, True, False, True, False])
+
+    def test_bulk_validation(self):
+        self.partner_b.write({"country_id": self.env.ref("base.ba").id, "street": "x"})
+        invoices = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        invoices |= self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False, partner_id=self.partner_b.id)
+        invoices |= self._create_ba_invoice([(100.0, 1, self.env["account.tax"])], post=False, partner_id=self.partner_b.id)
+
+        report = self.edi_format._l10n_bs_edi_validate_moves(invoices)
+        self.assertEqual(report[invoices[0]], [])
+        self.assertIn("partner_street", [error["code"] for error in report[invoices[1]]])
+        self.assertIn("line_tax", [error["code"] for error in report[invoices[2]]])
+        for invoice in invoices:
+            self.assertEqual(
+                self.edi_format._check_move_configuration(invoice),
+                [error["message"] for error in report[invoice]],
+            )
+
+    def test_partner_fiscal_ready(self):
+        self.assertTrue(self.partner_a.l10n_bs_edi_fiscal_ready)
+        self.partner_a.city = "S"
+        self.assertFalse(self.partner_a.l10n_bs_edi_fiscal_ready)
+        self.assertEqual(self.partner_a.l10n_bs_edi_fiscal_message, "- Grad mora imati min 3 max 100 znakova")
+        self.assertIn(
+            self.partner_a,
+            self.env["res.partner"].search([("l10n_bs_edi_fiscal_ready", "=", False)]),
+        )
+        self.assertEqual(
+            self.edi_format._ba_validate_partner(self.partner_a),
+            [self.partner_a.display_name, "- Grad mora imati min 3 max 100 znakova"],
+        )
+        self.partner_a.city = "Sarajevo"
+        self.assertEqual(self.edi_format._ba_validate_partner(self.partner_a), [])
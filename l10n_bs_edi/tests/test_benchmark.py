@@ -0,0 +1,143 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" Fiscalization pipeline benchmarks, not part of the standard test run::
+
+    odoo-bin -d <db> -i l10n_bs_edi --test-tags l10n_bs_edi_benchmark --stop-after-init
+
+Sizes are taken from L10N_BS_EDI_BENCH_LINES (lines per invoice, comma separated) and
+L10N_BS_EDI_BENCH_MOVES (invoices per batch). Results are written as JSON to
+L10N_BS_EDI_BENCH_OUTPUT (default: l10n_bs_edi_benchmark_<timestamp>.json in the
+temporary directory) so two releases can be compared run against run.
+"""
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+
+from odoo import release
+from odoo.modules.module import get_manifest
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+_logger = logging.getLogger(__name__)
+
+
+def _sizes(variable, default):
+    return [int(size) for size in os.environ.get(variable, default).split(",") if size.strip()]
+
+
+@tagged("post_install", "-at_install", "-standard", "l10n_bs_edi_benchmark")
+class TestBenchmark(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.results = []
+        # podtestovi dijele transakciju, fiskalni brojevi se ne smiju ponoviti
+        cls.next_fiscal_number = 1
+        cls.cash_rounding = cls.env["account.cash.rounding"].create({
+            "name": "0.05",
+            "rounding": 0.05,
+            "strategy": "add_invoice_line",
+            "profit_account_id": cls.company_data["default_account_revenue"].id,
+            "loss_account_id": cls.company_data["default_account_expense"].id,
+            "rounding_method": "HALF-UP",
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._write_results()
+        super().tearDownClass()
+
+    @classmethod
+    def _write_results(cls):
+        path = os.environ.get("L10N_BS_EDI_BENCH_OUTPUT") or os.path.join(
+            tempfile.gettempdir(), "l10n_bs_edi_benchmark_%s.json" % time.strftime("%Y%m%d_%H%M%S"))
+        report = {
+            "module_version": get_manifest("l10n_bs_edi").get("version"),
+            "odoo_version": release.version,
+            "python": platform.python_version(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": cls.results,
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        _logger.info("l10n_bs_edi benchmark: rezultati zapisani u %s", path)
+
+    def _create_synthetic_moves(self, move_count, line_count):
+        """ Posted invoices mixing A/E/K taxes, one refund in five, cash rounding on odd moves. """
+        taxes = [self.tax_pdv_17, self.tax_pdv_0, self.tax_pdv_a]
+        vals_list = []
+        for i in range(move_count):
+            vals_list.append({
+                "move_type": "out_refund" if i % 5 == 4 else "out_invoice",
+                "partner_id": self.partner_a.id,
+                "invoice_date": "2025-01-15",
+                "date": "2025-01-15",
+                "invoice_cash_rounding_id": self.cash_rounding.id if i % 2 else False,
+                "invoice_line_ids": [
+                    (0, 0, {
+                        "product_id": self.product_a.id,
+                        "price_unit": 10.0 + (j % 97) * 1.37,
+                        "quantity": 1 + j % 3,
+                        "discount": 10.0 if j % 7 == 0 else 0.0,
+                        "tax_ids": [(6, 0, taxes[j % 3].ids)],
+                    })
+                    for j in range(line_count)
+                ],
+            })
+        moves = self.env["account.move"].create(vals_list)
+        moves.action_post()
+        self.env.flush_all()
+        return moves
+
+    def _measure(self, stage, moves, line_count, func):
+        self.env.invalidate_all()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        self.results.append({
+            "stage": stage,
+            "moves": len(moves),
+            "lines_per_move": line_count,
+            "seconds": round(elapsed, 4),
+            "ms_per_move": round(1000 * elapsed / len(moves), 3),
+        })
+        _logger.info("l10n_bs_edi benchmark %s: %s x %s linija, %.3f s", stage, len(moves), line_count, elapsed)
+
+    def _run_pipeline(self, moves, line_count):
+        edi_format = self.edi_format
+        company = self.company_data["company"]
+        payloads = {}
+
+        def generate(engine):
+            company.l10n_bs_edi_payload_engine = engine
+            for move in moves:
+                payloads[move] = edi_format._ba_edi_generate_invoice_json(move)
+
+        self._measure("applicability", moves, line_count, lambda: [edi_format._get_move_applicability(move) for move in moves])
+        self._measure("check_move_configuration", moves, line_count, lambda: [edi_format._check_move_configuration(move) for move in moves])
+        self._measure("validate_moves_bulk", moves, line_count, lambda: edi_format._l10n_bs_edi_validate_moves(moves))
+        self._measure("tax_details", moves, line_count, lambda: [edi_format._ba_prepare_edi_tax_details(move) for move in moves])
+        self._measure("payload_orm", moves, line_count, lambda: generate("orm"))
+        self._measure("payload_sql", moves, line_count, lambda: generate("sql"))
+        self._measure("json_encode", moves, line_count, lambda: [json.dumps(payload) for payload in payloads.values()])
+        with self._fiscal_simulator(start_number=self.next_fiscal_number):
+            by_type = {}
+            for move in moves:
+                by_type.setdefault(move.move_type, self.env["account.move"])
+                by_type[move.move_type] |= move
+            self._measure("post", moves, line_count, lambda: [edi_format._ba_edi_fiscalize(batch) for batch in by_type.values()])
+        type(self).next_fiscal_number += len(moves)
+
+    def test_benchmark_lines_per_invoice(self):
+        for line_count in _sizes("L10N_BS_EDI_BENCH_LINES", "1,100,1000,5000"):
+            with self.subTest(lines=line_count):
+                self._run_pipeline(self._create_synthetic_moves(1, line_count), line_count)
+
+    def test_benchmark_invoices_per_batch(self):
+        for move_count in _sizes("L10N_BS_EDI_BENCH_MOVES", "1,100,1000"):
+            with self.subTest(moves=move_count):
+                self._run_pipeline(self._create_synthetic_moves(move_count, 3), 3)
@@ -0,0 +1,66 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from datetime import timedelta
+
+import requests
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestDevice(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.env["ir.config_parameter"].sudo().set_param("l10n_bs_edi.breaker_threshold", 2)
+        cls.device = cls.env["l10n_bs_edi.device"]._get_device(cls.company_data["company"].l10n_bs_edi_api_host)
+
+    def test_get_device_creates_once(self):
+        Device = self.env["l10n_bs_edi.device"]
+        device = Device._get_device("http://novi.test:3566/")
+        self.assertRecordValues(device, [{"host": "http://novi.test:3566", "state": "closed"}])
+        self.assertEqual(Device._create_device("http://novi.test:3566"), device.id, "A concurrent insert keeps the existing device")
+        self.assertEqual(Device._get_device("http://novi.test:3566"), device)
+
+    def test_breaker_opens_and_skips_device(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        for _i in range(2):
+            with self._mock_unreachable_device():
+                result = self.edi_format._ba_edi_fiscalize(invoice)
+            self.assertEqual(result[invoice]["blocking_level"], "warning")
+        self.assertRecordValues(self.device, [{"state": "open", "consecutive_failures": 2}])
+
+        with self._mock_unreachable_device() as calls:
+            result = self.edi_format._ba_edi_fiscalize(invoice)
+        self.assertFalse(calls, "An open breaker should not touch the network")
+        self.assertEqual(result[invoice]["blocking_level"], "warning")
+
+    def test_read_timeout_is_not_retried(self):
+        invoices = self.env["account.move"]
+        for price in (100.0, 200.0):
+            invoices |= self._create_ba_invoice([(price, 1, self.tax_pdv_17)])
+        with self._mock_unreachable_device(error=requests.exceptions.ReadTimeout("Read timed out")) as calls:
+            result = self.edi_format._ba_edi_fiscalize(invoices)
+        self.assertEqual(len(calls), 1, "Nothing is sent after the first failure")
+        # prvu fakturu je uređaj možda fiskalizirao, druga nije poslana
+        self.assertEqual(result[invoices[0]]["blocking_level"], "error")
+        self.assertIn("Provjerite na uređaju", result[invoices[0]]["error"])
+        self.assertEqual(result[invoices[1]]["blocking_level"], "warning")
+        self.assertEqual(self.device.consecutive_failures, 1)
+
+    def test_breaker_half_open_probe(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        self.device.write({
+            "state": "open",
+            "consecutive_failures": 2,
+            "date_opened": fields.Datetime.now() - timedelta(minutes=5),
+        })
+        with self._mock_fiscal_device(start_number=7) as sent:
+            self.edi_format._ba_edi_fiscalize(invoice)
+        self.assertEqual([url.rsplit("/", 1)[-1] for _method, url, _payload in sent], ["ping", "invoices"])
+        self.assertEqual(invoice.ba_edi_fiskalni_broj, "7")
+        self.assertRecordValues(self.device, [{"state": "closed", "consecutive_failures": 0}])
+        self.assertTrue(self.device.last_probe_date)
@@ -0,0 +1,29 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestDeviceReport(TestBaEdiCommon):
+
+    def test_periodic_report_requires_date_to(self):
+        wizard = self.env["l10n_bs_edi.device.report.wizard"].create({
+            "company_id": self.company_data["company"].id,
+            "report_type": "periodic",
+            "date_from": "2025-01-01",
+            "date_to": False,
+        })
+        with self.assertRaises(UserError):
+            wizard.action_fetch()
+
+    def test_daily_fetch_records_device_success(self):
+        company = self.company_data["company"]
+        company.partner_id.tz = "UTC"
+        with self._fiscal_simulator() as simulator:
+            device = self.env["l10n_bs_edi.device"]._get_device(company._l10n_bs_edi_get_transport().host)
+            device.write({"consecutive_failures": 1, "last_error": "Connection refused"})
+            self.env["l10n_bs_edi.device.report"]._cron_fetch_daily_reports()
+        self.assertEqual(simulator.stats["reports"], 1)
+        self.assertRecordValues(device, [{"state": "closed", "consecutive_failures": 0}])
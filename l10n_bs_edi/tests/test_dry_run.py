@@ -0,0 +1,50 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import base64
+import gzip
+import json
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestDryRun(TestBaEdiCommon):
+
+    def test_dry_run(self):
+        self.partner_b.write({"country_id": self.env.ref("base.ba").id, "street": "x"})
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        refund = self._create_ba_invoice([(40.0, 1, self.tax_pdv_17)], move_type="out_refund")
+        draft = self._create_ba_invoice([(50.0, 1, self.tax_pdv_0)], post=False)
+        invalid = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False, partner_id=self.partner_b.id)
+        self._create_ba_invoice([(100.0, 1, self.env["account.tax"])], post=False)
+
+        wizard = self.env["l10n_bs_edi.dry.run.wizard"].create({
+            "company_id": self.company_data["company"].id,
+            "date_from": "2025-01-01",
+            "date_to": "2025-01-31",
+            "batch_size": 2,
+            "dump_payloads": True,
+        })
+        with self._mock_fiscal_device() as sent:
+            wizard.action_dry_run()
+        self.assertEqual(sent, [], "A dry run must never reach the fiscal device")
+        self.assertEqual((wizard.move_count, wizard.valid_count), (5, 3))
+        self.assertEqual(wizard.invalid_move_ids, invalid)
+        self.assertIn("partner_street", wizard.report_html)
+        self.assertIn("<td>E</td><td class='text-end'>60.00</td><td class='text-end'>10.20</td>", wizard.report_html)
+        self.assertEqual(invoice.edi_document_ids.state, "to_send")
+        self.assertFalse(invoice.ba_edi_fiskalni_broj)
+
+        lines = gzip.decompress(base64.b64decode(wizard.dump_file)).decode().splitlines()
+        dumped = {line["id"]: line["payload"] for line in map(json.loads, lines)}
+        self.assertEqual(set(dumped), {invoice.id, refund.id, draft.id})
+        self.assertEqual(dumped[refund.id]["invoiceRequest"]["transactionType"], "Refund")
+
+        wizard.move_scope = "to_send"
+        wizard.action_dry_run()
+        self.assertEqual(wizard.move_count, 2)
+
+        with self.assertRaises(UserError):
+            self.company_data["company"].with_context(l10n_bs_edi_dry_run=True)._l10n_bs_edi_get_transport()
@@ -0,0 +1,122 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestEdiBatching(TestBaEdiCommon):
+
+    def test_post_batching_key(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        refund = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], move_type="out_refund")
+        applicability = self.edi_format._get_move_applicability(invoice)
+        self.assertEqual(
+            applicability["post_batching"](invoice),
+            ("http://fiskalni.test:3566", "out_invoice"),
+        )
+        self.assertNotEqual(applicability["post_batching"](invoice), applicability["post_batching"](refund))
+
+    def test_post_batch_result_map(self):
+        invoices = self.env["account.move"]
+        for price in (100.0, 200.0, 300.0):
+            invoices |= self._create_ba_invoice([(price, 1, self.tax_pdv_17)])
+        documents = invoices.edi_document_ids.filtered(lambda d: d.edi_format_id == self.edi_format)
+
+        jobs = documents._prepare_jobs()
+        self.assertEqual(len(jobs), 1, "Invoices for the same device should be sent as one batch")
+
+        with self._mock_fiscal_device(start_number=10, fail_for=(invoices[1].name,)) as sent:
+            documents._process_documents_web_services(with_commit=False)
+
+        self.assertEqual([payload["invoiceRequest"]["erpDocument"] for _method, _url, payload in sent], invoices.mapped("name"))
+        self.assertRecordValues(invoices, [
+            {"ba_edi_fiskalni_broj": "10"},
+            {"ba_edi_fiskalni_broj": False},
+            {"ba_edi_fiskalni_broj": "12"},
+        ])
+        self.assertRecordValues(documents.sorted(lambda d: d.move_id.id), [
+            {"state": "sent", "blocking_level": False},
+            {"state": "to_send", "blocking_level": "error"},
+            {"state": "sent", "blocking_level": False},
+        ])
+
+    def _create_invoices_to_send(self, count):
+        invoices = self.env["account.move"]
+        for i in range(count):
+            invoices |= self._create_ba_invoice([(100.0 + i, 1, self.tax_pdv_17)])
+        return invoices
+
+    def test_generic_cron_skips_ba_documents(self):
+        invoices = self._create_invoices_to_send(2)
+        with self._mock_fiscal_device() as sent:
+            self.env["account.edi.document"]._cron_process_documents_web_services()
+        self.assertFalse(sent)
+
+        with self._mock_fiscal_device() as sent:
+            remaining = self.env["account.edi.document"]._cron_l10n_bs_edi_process_documents()
+        self.assertEqual(remaining, 0)
+        self.assertEqual(len(sent), 2)
+        self.assertTrue(all(invoices.mapped("ba_edi_fiskalni_broj")))
+
+    def test_cron_time_budget(self):
+        invoices = self._create_invoices_to_send(3)
+        set_param = self.env["ir.config_parameter"].sudo().set_param
+        set_param("l10n_bs_edi.batch_size", 1)
+        set_param("l10n_bs_edi.cron_time_budget", 15)
+        clock = iter(range(0, 1000, 10))
+        with self._mock_fiscal_device() as sent, \
+                patch("odoo.addons.l10n_bs_edi.models.account_edi_document.time") as mock_time:
+            mock_time.monotonic.side_effect = lambda: next(clock)
+            remaining = self.env["account.edi.document"]._cron_l10n_bs_edi_process_documents()
+        # 1 paket za 10s, drugi ne stane u preostalih 5s
+        self.assertEqual(remaining, 2)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(len(invoices.filtered("ba_edi_fiskalni_broj")), 1)
+
+    def test_cron_skips_error_blocked_documents(self):
+        invoices = self._create_invoices_to_send(2)
+        blocked = invoices[0].edi_document_ids.filtered(lambda d: d.edi_format_id == self.edi_format)
+        blocked.write({"blocking_level": "error", "error": "Greška"})
+        self.env["ir.config_parameter"].sudo().set_param("l10n_bs_edi.batch_size", 1)
+        with self._mock_fiscal_device() as sent:
+            remaining = self.env["account.edi.document"]._cron_l10n_bs_edi_process_documents()
+        self.assertEqual(remaining, 0, "Error-blocked documents must not keep the cron re-triggering")
+        self.assertEqual(len(sent), 1)
+        self.assertFalse(invoices[0].ba_edi_fiskalni_broj)
+
+    def test_two_phase_send(self):
+        invoices = self._create_invoices_to_send(2)
+        documents = invoices.edi_document_ids.filtered(lambda d: d.edi_format_id == self.edi_format)
+        with self._mock_fiscal_device(start_number=5):
+            documents._l10n_bs_edi_send(auto_commit=False)
+        self.assertRecordValues(documents.sorted(lambda d: d.move_id.id), [
+            {"state": "sent", "l10n_bs_edi_sending_date": False},
+            {"state": "sent", "l10n_bs_edi_sending_date": False},
+        ])
+        self.assertEqual(invoices.mapped("ba_edi_fiskalni_broj"), ["5", "6"])
+
+    def test_recover_interrupted_sending(self):
+        invoice = self._create_invoices_to_send(1)
+        document = invoice.edi_document_ids.filtered(lambda d: d.edi_format_id == self.edi_format)
+        document.l10n_bs_edi_sending_date = fields.Datetime.now() - timedelta(hours=1)
+        self.assertFalse(document._prepare_jobs(), "A document being sent should not be sent again")
+
+        with self._mock_fiscal_device() as sent:
+            self.env["account.edi.document"]._cron_l10n_bs_edi_process_documents()
+        self.assertFalse(sent)
+        self.assertRecordValues(document, [{"state": "to_send", "blocking_level": "error", "l10n_bs_edi_sending_date": False}])
+
+    def test_sending_timeout_covers_a_full_chunk(self):
+        documents = self.env["account.edi.document"]
+        self.assertEqual(documents._l10n_bs_edi_default_sending_timeout(), 20 * (5 + 30) + 300)
+        invoice = self._create_invoices_to_send(1)
+        document = invoice.edi_document_ids.filtered(lambda d: d.edi_format_id == self.edi_format)
+        # 20 x 30 s: the chunk may still be waiting for the device
+        document.l10n_bs_edi_sending_date = fields.Datetime.now() - timedelta(minutes=10)
+        self.assertFalse(documents._l10n_bs_edi_recover_sending())
+        self.assertTrue(document.l10n_bs_edi_sending_date)
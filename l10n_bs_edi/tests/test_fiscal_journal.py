@@ -0,0 +1,77 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import json
+
+from odoo.tests import tagged
+
+from odoo.addons.l10n_bs_edi.tools import fiscal_journal
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestFiscalJournal(TestBaEdiCommon):
+
+    def _export(self, file_format, chunk_size=1):
+        moves = self.env["account.move"]
+        columns = moves._l10n_bs_edi_fiscal_journal_columns()
+        query, params = moves._l10n_bs_edi_fiscal_journal_query(self.company_data["company"], "2025-01-01", "2025-01-31")
+        self.env.flush_all()
+        return list(fiscal_journal.export(self.env.cr, columns, query, params, file_format, chunk_size))
+
+    def test_fiscal_journal_export(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17), (50.0, 2, self.tax_pdv_0)])
+        refund = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], move_type="out_refund")
+        self._create_ba_invoice([(30.0, 1, self.tax_pdv_17)], post=False)
+        with self._mock_fiscal_device(start_number=5):
+            (invoice | refund).edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(invoice.l10n_bs_edi_payment_type, "WireTransfer")
+
+        chunks = self._export("jsonl")
+        self.assertEqual(len(chunks), 2, "one chunk per fetched row")
+        rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+        self.assertEqual([row["fiscal_number"] for row in rows], ["5", "6"])
+        self.assertEqual(rows[0]["move_name"], invoice.name)
+        self.assertEqual(rows[0]["invoice_date"], "2025-01-15")
+        self.assertEqual(rows[0]["payment_type"], "WireTransfer")
+        self.assertAlmostEqual(rows[0]["base_E"], 100.0)
+        self.assertAlmostEqual(rows[0]["tax_E"], 17.0)
+        self.assertAlmostEqual(rows[0]["base_K"], 100.0)
+        self.assertIsNone(rows[0]["base_A"])
+        self.assertAlmostEqual(rows[0]["amount_total"], 217.0)
+        self.assertAlmostEqual(rows[1]["base_E"], -100.0)
+        self.assertAlmostEqual(rows[1]["amount_total"], -117.0)
+
+        lines = b"".join(self._export("csv", chunk_size=100)).decode().splitlines()
+        self.assertEqual(lines[0].split(","), self.env["account.move"]._l10n_bs_edi_fiscal_journal_columns())
+        self.assertEqual(len(lines), 3)
+
+    def test_fiscal_journal_empty_period(self):
+        self.assertEqual(self._export("jsonl"), [])
+        self.assertEqual(b"".join(self._export("csv")).decode().count("\n"), 1)
+
+    def test_backfill_payment_type_from_sent_payload(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=40):
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        legacy = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], narration="Način plaćanja: kartica")
+        legacy.ba_edi_fiskalni_broj = "39"
+
+        # the rules changed after the invoice was sent
+        (invoice | legacy).write({"l10n_bs_edi_payment_type": False})
+        invoice.narration = "Način plaćanja: kartica"
+        self.assertEqual(self.env["account.move"]._l10n_bs_edi_backfill_payment_type(), 2)
+        self.assertEqual(invoice.l10n_bs_edi_payment_type, "WireTransfer", "The type sent to the device is kept")
+        self.assertEqual(legacy.l10n_bs_edi_payment_type, "Card", "Without a sent payload the rules decide")
+
+    def test_payment_type_recorded_from_sent_payload(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        transport, device = self.edi_format._ba_edi_get_device(invoice.company_id)
+        payloads = self.env["l10n_bs_edi.payload"]._get_payloads(invoice)
+
+        # the rules changed between building the payload and recording the answer
+        invoice.narration = "Način plaćanja: kartica"
+        with self._mock_fiscal_device(start_number=70):
+            responses = self.edi_format._ba_edi_send_payloads(transport, [(invoice, payloads[invoice].payload.encode())])
+        result = self.edi_format._ba_edi_process_send_results(transport, device, payloads, responses)
+        self.assertTrue(result[invoice]["success"])
+        self.assertEqual(invoice.l10n_bs_edi_payment_type, "WireTransfer", "The type sent to the device is kept")
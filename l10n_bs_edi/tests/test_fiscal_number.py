@@ -0,0 +1,63 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.modules.migration import load_script
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestFiscalNumber(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.invoice = cls._create_ba_invoice([(1000.0, 1, cls.tax_pdv_17)])
+        cls.invoice.ba_edi_fiskalni_broj = "100"
+
+    def test_migration_clears_copied_fiscal_numbers(self):
+        sent = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=60):
+            sent.edi_document_ids._process_documents_web_services(with_commit=False)
+        copy = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        unsent = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        unsent_copy = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        refund = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], move_type="out_refund", post=False)
+
+        # a database from before copy=False, without the constraint
+        self.env.flush_all()
+        self.env.cr.execute("ALTER TABLE account_move DROP CONSTRAINT account_move_l10n_bs_edi_fiskalni_broj_uniq")
+        self.env.cr.execute("UPDATE account_move SET ba_edi_fiskalni_broj = '60' WHERE id IN %s", [(copy.id, refund.id)])
+        self.env.cr.execute("UPDATE account_move SET ba_edi_fiskalni_broj = '61' WHERE id IN %s", [(unsent.id, unsent_copy.id)])
+
+        load_script("l10n_bs_edi/migrations/1.4.1/pre-migrate.py", "l10n_bs_edi_pre_migrate").migrate(self.env.cr, "1.4.0")
+        self.env.invalidate_all()
+        self.assertEqual(
+            (sent | copy | unsent | unsent_copy | refund).mapped("ba_edi_fiskalni_broj"),
+            ["60", False, "61", False, "60"],
+            "Only copies lose the number: the sent move, or the oldest, keeps it; refunds are numbered apart",
+        )
+
+    def test_find_by_fiscal_numbers(self):
+        find = self.env["account.move"]._l10n_bs_edi_find_by_fiscal_numbers
+        self.assertEqual(find(["100", "404"]), {"100": self.invoice})
+        self.assertEqual(find(["100"], move_type="out_refund"), {})
+
+    def test_refund_reference_by_fiscal_number(self):
+        refund = self._create_ba_invoice(
+            [(500.0, 1, self.tax_pdv_17)],
+            move_type="out_refund",
+            post=False,
+            l10n_bs_edi_refund_fiscal_number="100",
+        )
+        self.assertEqual(self.edi_format._ba_edi_get_refund_reference(refund), ("100", self.invoice.invoice_date))
+
+        refund.l10n_bs_edi_refund_fiscal_number = "7"
+        refund.l10n_bs_edi_refund_fiscal_date = "2024-12-31"
+        self.assertEqual(str(self.edi_format._ba_edi_get_refund_reference(refund)[1]), "2024-12-31")
+
+    def test_fiscal_number_taken(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=100):
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertFalse(invoice.ba_edi_fiskalni_broj)
+        self.assertIn(self.invoice.name, invoice.edi_document_ids.error)
@@ -0,0 +1,115 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestFiscalQueue(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.company_data["company"].l10n_bs_edi_use_queue = True
+
+    def test_post_only_enqueues(self):
+        with self._mock_fiscal_device() as sent:
+            invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertFalse(sent, "Posting must not call the fiscal device when the queue is enabled")
+        self.assertEqual(invoice.l10n_bs_edi_queue_state, "pending")
+        self.assertEqual(len(invoice.l10n_bs_edi_queue_ids), 1, "Enqueueing is idempotent")
+        self.assertEqual(invoice.edi_document_ids.blocking_level, "info")
+
+    def test_drain_queue_in_order(self):
+        invoices = self.env["account.move"]
+        for price in (100.0, 200.0):
+            invoices |= self._create_ba_invoice([(price, 1, self.tax_pdv_17)])
+
+        with self._mock_fiscal_device(start_number=5) as sent:
+            self.env["l10n_bs_edi.fiscal.queue"]._cron_process_queue()
+        self.assertEqual([payload["invoiceRequest"]["erpDocument"] for _method, _url, payload in sent], invoices.mapped("name"))
+        self.assertRecordValues(invoices, [
+            {"ba_edi_fiskalni_broj": "5", "l10n_bs_edi_queue_state": "done"},
+            {"ba_edi_fiskalni_broj": "6", "l10n_bs_edi_queue_state": "done"},
+        ])
+        self.assertEqual(invoices.l10n_bs_edi_queue_ids.mapped("attempts"), [1, 1])
+
+        invoices.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(set(invoices.edi_document_ids.mapped("state")), {"sent"})
+
+    def test_device_error_reported_once(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(fail_for=(invoice.name,)):
+            self.env["l10n_bs_edi.fiscal.queue"]._cron_process_queue()
+        self.assertEqual(invoice.l10n_bs_edi_queue_state, "failed")
+
+        invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(invoice.edi_document_ids.blocking_level, "error")
+
+        # retry from the invoice puts it back in the queue
+        invoice.edi_document_ids.write({"error": False, "blocking_level": False})
+        invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(invoice.l10n_bs_edi_queue_state, "pending")
+
+    def test_bulk_duplicates(self):
+        invoices = self.env["account.move"]
+        for price in (100.0, 200.0):
+            invoices |= self._create_ba_invoice([(price, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=8):
+            self.env["l10n_bs_edi.fiscal.queue"]._cron_process_queue()
+            invoices.edi_document_ids._process_documents_web_services(with_commit=False)
+
+        action = invoices.action_l10n_bs_edi_duplicates()
+        wizard = self.env["l10n_bs_edi.duplicate.wizard"].browse(action["res_id"])
+        wizard.action_send()
+        self.assertRecordValues(wizard, [{"state": "running", "entry_count": 2, "progress": 0.0}])
+        self.assertEqual(invoices.mapped("l10n_bs_edi_queue_state"), ["done", "done"], "Duplicates do not change the fiscalization state")
+
+        with self._mock_fiscal_device() as sent:
+            self.env["l10n_bs_edi.fiscal.queue"]._cron_process_queue()
+        self.assertEqual([url.rsplit("/duplikat/", 1)[-1] for _method, url, _payload in sent], ["F/8", "F/9"])
+        wizard.invalidate_recordset()
+        self.assertRecordValues(wizard, [{"state": "done", "done_count": 2, "failed_count": 0, "progress": 100.0}])
+
+    def test_duplicate_errors_are_raised(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self.assertRaises(UserError):
+            invoice.fiskalni_duplikat()
+
+    def test_stale_processing_entries(self):
+        Queue = self.env["l10n_bs_edi.fiscal.queue"]
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        entry = invoice.l10n_bs_edi_queue_ids
+        # drainer je pao nakon slanja, prije nego što je zapisao odgovor uređaja
+        entry.write({"state": "processing", "attempts": 1, "date_started": "2025-01-01 00:00:00"})
+
+        self.assertEqual(Queue._enqueue(invoice), Queue, "A stale entry is not replaced automatically")
+        with self._mock_fiscal_device() as sent:
+            Queue._cron_process_queue()
+        self.assertFalse(sent, "The device may already have printed the receipt")
+        self.assertRecordValues(entry, [{"state": "failed", "attempts": 1, "error_reported": False}])
+
+        invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(invoice.edi_document_ids.blocking_level, "error")
+        self.assertIn("Provjerite na uređaju", invoice.edi_document_ids.error)
+        self.assertTrue(entry.error_reported)
+
+    def test_stale_duplicate_entry_is_resent(self):
+        Queue = self.env["l10n_bs_edi.fiscal.queue"]
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=4):
+            Queue._cron_process_queue()
+        duplicates = Queue._enqueue_duplicates(invoice | invoice, "dup-test")
+        duplicates.write({"state": "processing", "date_started": "2025-01-01 00:00:00"})
+        duplicates[0].attempts = 1
+        duplicates[1].attempts = 3
+
+        with self._mock_fiscal_device() as sent:
+            Queue._cron_process_queue()
+        self.assertEqual([url.rsplit("/duplikat/", 1)[-1] for _method, url, _payload in sent], ["F/4"])
+        self.assertRecordValues(duplicates, [
+            {"state": "done", "attempts": 2},
+            {"state": "failed", "attempts": 3},
+        ])
@@ -0,0 +1,36 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestFiscalResponse(TestBaEdiCommon):
+
+    def test_structured_response_fields(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        response_json = {
+            "invoiceNumber": "ABCD1234-ABCD1234-77",
+            "invoiceCounter": "77/90ПП",
+            "sdcDateTime": "2025-01-15T10:30:00.123+01:00",
+            "signedBy": "ABCD1234",
+            "totalAmount": 117.0,
+            "verificationUrl": "https://fiskalizacija.test/v/?vl=abc",
+        }
+        invoice.write(self.edi_format._l10n_bs_edi_response_values(response_json))
+        self.assertRecordValues(invoice, [{
+            "ba_edi_fiskalni_broj": "ABCD1234-ABCD1234-77",
+            "l10n_bs_edi_fiscal_counter": "77/90ПП",
+            "l10n_bs_edi_device_id": "ABCD1234",
+            "l10n_bs_edi_fiscal_total": 117.0,
+            "l10n_bs_edi_verification_url": "https://fiskalizacija.test/v/?vl=abc",
+        }])
+        self.assertEqual(str(invoice.l10n_bs_edi_fiscal_datetime), "2025-01-15 09:30:00")
+
+    def test_backfill_fiscal_fields(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=3):
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        invoice.write({"ba_edi_fiskalni_broj": False})
+        self.env["account.move"]._l10n_bs_edi_backfill_fiscal_fields()
+        self.assertEqual(invoice.ba_edi_fiskalni_broj, "3")
@@ -0,0 +1,52 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestFiscalSimulator(TestBaEdiCommon):
+
+    def test_fiscalize_through_simulator(self):
+        invoices = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        invoices |= self._create_ba_invoice([(200.0, 1, self.tax_pdv_0)])
+        with self._fiscal_simulator(start_number=41) as simulator:
+            result = self.edi_format._ba_edi_fiscalize(invoices)
+        self.assertTrue(all(move_result["success"] for move_result in result.values()))
+        self.assertEqual(invoices.mapped("ba_edi_fiskalni_broj"), ["41", "42"])
+        self.assertEqual([payload["invoiceRequest"]["erpDocument"] for payload in simulator.invoices], invoices.mapped("name"))
+
+    def test_simulated_device_errors(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._fiscal_simulator(error_rate=1.0):
+            result = self.edi_format._ba_edi_fiscalize(invoice)
+        self.assertEqual(result[invoice]["blocking_level"], "error")
+        self.assertFalse(invoice.ba_edi_fiskalni_broj)
+
+    def test_daily_report_reconciliation(self):
+        self.company_data["company"].partner_id.tz = "UTC"
+        invoices = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17), (50.0, 1, self.tax_pdv_0)])
+        invoices |= self._create_ba_invoice([(20.0, 1, self.tax_pdv_17)], move_type="out_refund")
+        with self._fiscal_simulator() as simulator:
+            self.edi_format._ba_edi_fiscalize(invoices)
+            day = invoices[0].l10n_bs_edi_fiscal_datetime.date()
+            report = self.env["l10n_bs_edi.device.report"]._fetch(self.company_data["company"], "daily", day)
+        self.assertEqual(simulator.stats["reports"], 1)
+        self.assertRecordValues(report, [{
+            "report_number": "1",
+            "invoice_count": 1,
+            "refund_count": 1,
+            "odoo_invoice_count": 1,
+            "odoo_refund_count": 1,
+            "state": "matched",
+        }])
+        self.assertEqual(
+            [(line.line_type, line.code, line.odoo_amount) for line in report.line_ids.sorted(lambda l: (l.line_type, l.code))],
+            [("payment", "WireTransfer", 143.6), ("pdv", "E", 93.6), ("pdv", "K", 50.0)],
+        )
+
+        # razlika u načinu plaćanja se vidi pri ponovnom usklađivanju
+        invoices[0].l10n_bs_edi_payment_type = "Cash"
+        report.action_reconcile()
+        self.assertEqual(report.state, "difference")
+        self.assertEqual(len(report.line_ids.filtered(lambda line: line.line_type == "payment")), 2)
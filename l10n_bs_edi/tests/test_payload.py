@@ -0,0 +1,124 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import json
+
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestPayload(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.invoice = cls._create_ba_invoice([
+            (1000.0, 1, cls.tax_pdv_17),
+            (33.33, 3, cls.tax_pdv_17),
+            (250.0, 2, cls.tax_pdv_0),
+            (-120.0, 1, cls.tax_pdv_17),
+            (99.99, 1, cls.tax_pdv_a),
+        ])
+        cls.invoice.ba_edi_fiskalni_broj = "100"
+        cls.refund = cls._create_ba_invoice(
+            [(500.0, 1, cls.tax_pdv_17), (10.0, 1, cls.tax_pdv_0)],
+            move_type="out_refund",
+            reversed_entry_id=cls.invoice.id,
+        )
+
+    def _payload(self, invoice, engine):
+        invoice.company_id.l10n_bs_edi_payload_engine = engine
+        return json.dumps(self.edi_format._ba_edi_generate_invoice_json(invoice))
+
+    def test_invoice_payload(self):
+        payload = self.edi_format._ba_edi_generate_invoice_json(self.invoice)["invoiceRequest"]
+        self.assertEqual(
+            [(item["labels"], item["baseAmount"], item["taxAmount"], item["totalAmount"]) for item in payload["items"]],
+            [
+                (["E"], 979.99, 166.6, 1146.59),
+                (["K"], 500.0, 0.0, 500.0),
+                (["A"], 99.99, 0.0, 99.99),
+            ],
+        )
+        self.assertEqual(payload["payment"], [{"amount": 1746.58, "paymentType": "WireTransfer"}])
+        self.assertEqual(payload["transactionType"], "Sale")
+
+    def test_refund_payload(self):
+        payload = self.edi_format._ba_edi_generate_invoice_json(self.refund)["invoiceRequest"]
+        self.assertEqual(payload["transactionType"], "Refund")
+        self.assertEqual(payload["referentDocumentNumber"], "100")
+        self.assertEqual(payload["referentDocumentDT"], "2025-01-15")
+
+    def test_sql_engine_matches_orm_engine(self):
+        for invoice in (self.invoice, self.refund):
+            self.assertEqual(self._payload(invoice, "sql"), self._payload(invoice, "orm"))
+
+    def test_sql_engine_batch(self):
+        aggregated = self.edi_format._ba_edi_get_aggregated_items_sql(self.invoice | self.refund)
+        self.assertEqual(list(aggregated[self.refund]), ["E", "K"])
+
+    def test_sql_engine_round_globally(self):
+        company = self.company_data["company"]
+        company.tax_calculation_rounding_method = "round_globally"
+        # 3 x 0.0051: 0.03 rounded per line, 0.02 rounded globally
+        invoice = self._create_ba_invoice([(0.03, 1, self.tax_pdv_17)] * 3)
+        self.assertIn(invoice, self.edi_format._ba_edi_get_sql_unsupported_moves(invoice))
+        self.assertEqual(self._payload(invoice, "sql"), self._payload(invoice, "orm"))
+        payload = self.edi_format._ba_edi_generate_invoice_json(invoice)["invoiceRequest"]
+        self.assertEqual(payload["items"][0]["taxAmount"], invoice.amount_tax)
+
+    def test_payment_type_rules(self):
+        rule_model = self.env["l10n_bs_edi.payment.type.rule"]
+        term = self.env["account.payment.term"].create({"name": "Plaćanje gotovinom"})
+        invoice = self._create_ba_invoice([(10.0, 1, self.tax_pdv_17)], post=False, invoice_payment_term_id=term.id)
+        self.assertEqual(self.edi_format._ba_edi_get_payment_type(invoice), "Cash")
+
+        invoice.narration = "Način plaćanja: kartica"
+        self.assertEqual(self.edi_format._ba_edi_get_payment_type(invoice), "Card")
+
+        invoice.narration = False
+        rule_model.create({
+            "sequence": 1,
+            "rule_type": "payment_term",
+            "payment_term_id": term.id,
+            "payment_type": "Other",
+            "company_id": invoice.company_id.id,
+        })
+        self.assertEqual(self.edi_format._ba_edi_get_payment_type(invoice), "Other")
+
+        # archived rules stay out of the shared lookup, whatever the caller's context
+        rule_model.search([("payment_term_id", "=", term.id)]).active = False
+        edi_format = self.edi_format.with_context(active_test=False)
+        self.assertEqual(edi_format._ba_edi_get_payment_type(invoice.with_context(active_test=False)), "Cash")
+        self.assertEqual(self.edi_format._ba_edi_get_payment_type(invoice), "Cash")
+
+    def test_payload_cache(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        content = self.edi_format._l10n_bs_edi_invoice_content(invoice)
+        self.assertFalse(invoice.l10n_bs_edi_payload_ids, "Reading the content must not write anything")
+
+        with self._mock_fiscal_device() as sent:
+            self.edi_format._ba_edi_fiscalize(invoice)
+        self.assertEqual(json.dumps(sent[0][2]).encode(), content)
+        self.assertRecordValues(invoice.l10n_bs_edi_payload_ids, [{"engine": "orm"}])
+        self.assertTrue(invoice.l10n_bs_edi_payload_ids.date_sent)
+        self.assertEqual(self.edi_format._l10n_bs_edi_invoice_content(invoice), content)
+
+        payloads = self.env["l10n_bs_edi.payload"]._get_payloads(invoice)
+        self.assertEqual(payloads[invoice], invoice.l10n_bs_edi_payload_ids, "The stored payload should be reused")
+
+        invoice.company_id.l10n_bs_edi_payload_engine = "sql"
+        self.env["l10n_bs_edi.payload"]._get_payloads(invoice)
+        self.assertEqual(len(invoice.l10n_bs_edi_payload_ids), 2, "The sent payload should be kept")
+        self.assertEqual(invoice.l10n_bs_edi_payload_ids.sorted("id")[-1].engine, "sql")
+
+    def test_payload_engine_fallback(self):
+        self.company_data["company"].l10n_bs_edi_payload_engine = "sql"
+        foreign = self._create_ba_invoice(
+            [(100.0, 1, self.tax_pdv_17)],
+            post=False,
+            currency_id=self.currency_data["currency"].id,
+        )
+        payloads = self.env["l10n_bs_edi.payload"]._get_payloads(self.invoice | foreign)
+        self.assertEqual(payloads[self.invoice].engine, "sql")
+        self.assertEqual(payloads[foreign].engine, "orm", "The engine that actually built the payload is recorded")
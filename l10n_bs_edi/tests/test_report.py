@@ -0,0 +1,59 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestReport(TestBaEdiCommon):
+
+    def _render(self, moves):
+        html, _report_type = self.env["ir.actions.report"]._render_qweb_html("account.account_invoices", moves.ids)
+        return html.decode()
+
+    def test_report_prefetch(self):
+        moves = self.env["account.move"]
+        for price in (10.0, 20.0, 30.0, 40.0):
+            moves |= self._create_ba_invoice([(price, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device():
+            moves.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.env.invalidate_all()
+
+        moves = self.env["account.move"].browse(moves.ids)
+        moves._l10n_bs_edi_prefetch_report_data()
+        with self.assertQueryCount(0):
+            for move in moves:
+                move._get_ba_edi_response_json()
+                move.edi_document_ids.mapped("attachment_id")
+
+    def test_response_json_requires_sent_document(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=12):
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        self.assertEqual(invoice._get_ba_edi_response_json()["invoiceNumber"], "12")
+
+        # draft copied before fiscal numbers were copy=False
+        copy = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        copy.ba_edi_fiskalni_broj = "R-12"
+        self.assertEqual(copy._get_ba_edi_response_json(), {"invoiceNumber": "0"})
+
+    def test_report_prints_only_issued_fiscal_numbers(self):
+        invoice = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)])
+        with self._mock_fiscal_device(start_number=41):
+            invoice.edi_document_ids._process_documents_web_services(with_commit=False)
+        invoice.l10n_bs_edi_verification_url = "https://fiskalizacija.test/v/?vl=41"
+        html = self._render(invoice)
+        self.assertIn("Fiskalni račun:", html)
+        self.assertIn('name="verification"', html)
+
+        # draft copied before fiscal numbers were copy=False
+        copy = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], post=False)
+        copy.write({
+            "ba_edi_fiskalni_broj": "R-41",
+            "l10n_bs_edi_verification_url": "https://fiskalizacija.test/v/?vl=41",
+        })
+        html = self._render(copy)
+        self.assertNotIn("R-41", html)
+        self.assertNotIn("Fiskalni račun:", html)
+        self.assertNotIn("Vrijeme fiskalizacije:", html)
+        self.assertNotIn('name="verification"', html)
@@ -0,0 +1,86 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestSequenceCheck(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        # u testu nema transakcija koje još traju
+        cls.env["ir.config_parameter"].sudo().set_param("l10n_bs_edi.sequence_check_delay", "0")
+
+    def _fiscalize(self, *numbers, move_type="out_invoice"):
+        moves = self.env["account.move"]
+        for number in numbers:
+            move = self._create_ba_invoice([(100.0, 1, self.tax_pdv_17)], move_type=move_type)
+            move.ba_edi_fiskalni_broj = number
+            moves |= move
+        return moves
+
+    def _age_stamps(self, moves):
+        self.env.cr.execute("""
+            UPDATE account_move
+               SET l10n_bs_edi_fiscal_stamp_date = l10n_bs_edi_fiscal_stamp_date - interval '2 hours'
+             WHERE id = ANY(%s)
+        """, [moves.ids])
+
+    def _open_anomalies(self):
+        return self.env["l10n_bs_edi.sequence.anomaly"].search([("state", "=", "open")], order="id")
+
+    def test_gap_closed_by_late_number(self):
+        Checkpoint = self.env["l10n_bs_edi.sequence.checkpoint"]
+        self._fiscalize("1", "2", "5")
+        self._fiscalize("1", move_type="out_refund")
+        self.assertEqual(Checkpoint._cron_check_sequences(), 1)
+        checkpoint = Checkpoint.search([("kind", "=", "F")])
+        self.assertRecordValues(checkpoint, [{"first_number": 1, "last_number": 5}])
+        self.assertEqual(self._open_anomalies().mapped("description"), ["Nedostaju brojevi 3 - 4 (2)"])
+        self.assertEqual(len(Checkpoint.search([])), 2, "Refunds are numbered separately")
+
+        # druga provjera čita samo nove upise
+        self._fiscalize("4")
+        self.assertEqual(Checkpoint._cron_check_sequences(), 0)
+        self.assertEqual(self._open_anomalies().mapped("description"), ["Nedostaje broj 3"])
+        self._fiscalize("3")
+        Checkpoint._cron_check_sequences()
+        self.assertFalse(self._open_anomalies())
+        self.assertEqual(checkpoint.open_anomaly_count, 0)
+
+    def test_order_and_format_anomalies(self):
+        Checkpoint = self.env["l10n_bs_edi.sequence.checkpoint"]
+        self._fiscalize("ABCD1234-ABCD1234-10", "ABCD1234-ABCD1234-11")
+        Checkpoint._cron_check_sequences()
+        invalid = self._fiscalize("9", "ABCD")
+        self.assertEqual(Checkpoint._cron_check_sequences(), 2)
+        self.assertEqual(
+            [(anomaly.anomaly_type, anomaly.move_id) for anomaly in self._open_anomalies()],
+            [("format", invalid[1]), ("order", invalid[0])],
+        )
+
+    def test_late_commit_below_checkpoint(self):
+        Checkpoint = self.env["l10n_bs_edi.sequence.checkpoint"]
+        self.env["ir.config_parameter"].sudo().set_param("l10n_bs_edi.sequence_check_delay", "3600")
+        first = self._fiscalize("1")
+        self._age_stamps(first)
+        Checkpoint._cron_check_sequences()
+        checkpoint = Checkpoint.search([("kind", "=", "F")])
+        self.assertEqual(checkpoint.last_sequence, first.l10n_bs_edi_fiscal_sequence)
+
+        # broj 2 dobije nižu oznaku, ali je transakcija potvrđena tek nakon što je broj 3 vidljiv
+        late, visible = self._fiscalize("2", "3")
+        self.assertLess(late.l10n_bs_edi_fiscal_sequence, visible.l10n_bs_edi_fiscal_sequence)
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE account_move SET ba_edi_fiskalni_broj = NULL WHERE id = %s", [late.id])
+        self.assertEqual(Checkpoint._cron_check_sequences(), 0)
+        self.assertEqual(checkpoint.last_sequence, first.l10n_bs_edi_fiscal_sequence, "Recent stamps are not final yet")
+
+        self.env.cr.execute("UPDATE account_move SET ba_edi_fiskalni_broj = '2' WHERE id = %s", [late.id])
+        self.env["account.move"].invalidate_model()
+        self._age_stamps(late | visible)
+        self.assertEqual(Checkpoint._cron_check_sequences(), 0)
+        self.assertFalse(self._open_anomalies())
+        self.assertRecordValues(checkpoint, [{"last_number": 3, "last_sequence": visible.l10n_bs_edi_fiscal_sequence}])
@@ -0,0 +1,46 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+from odoo.tests import tagged
+
+from odoo.addons.l10n_bs_edi.models.l10n_bs_edi_timing import BUCKET_FIELDS
+from odoo.addons.l10n_bs_edi.tools import timing
+
+from .common import TestBaEdiCommon
+
+
+@tagged("post_install_l10n", "post_install", "-at_install")
+class TestTiming(TestBaEdiCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.invoice = cls._create_ba_invoice([(100.0, 1, cls.tax_pdv_17), (50.0, 1, cls.tax_pdv_0)])
+
+    def test_stage_timing(self):
+        timing_model = self.env["l10n_bs_edi.timing"]
+        timing_model._flush()
+        timing_model.search([]).unlink()
+        self.edi_format._ba_edi_generate_invoice_json(self.invoice)
+        timing_model._flush()
+        rows = timing_model.search([("company_id", "=", self.invoice.company_id.id)])
+        self.assertEqual(set(rows.mapped("stage")), {"payload", "tax_details"})
+        payload_row = rows.filtered(lambda row: row.stage == "payload")
+        self.assertEqual(payload_row.count, 1)
+        self.assertEqual(payload_row.device, "http://fiskalni.test:3566")
+        self.assertEqual(sum(payload_row[name] for name in BUCKET_FIELDS), 1)
+
+    def test_stage_timing_without_company(self):
+        timing_model = self.env["l10n_bs_edi.timing"]
+        timing_model._flush()
+        timing_model.search([]).unlink()
+        with self.edi_format._l10n_bs_edi_timed("validation", self.env["res.company"]):
+            pass
+        timing.record(self.env.cr.dbname, None, "", "payload", 1.0)
+
+        self.invoice.name
+        timing_model._flush()
+        self.assertTrue(
+            self.env.cache.contains(self.invoice, self.invoice._fields["name"]),
+            "Flushing the timings must keep the caller's cache",
+        )
+        self.assertEqual(timing_model.search([]).mapped("stage"), ["validation"])
+        self.assertEqual(timing_model.search([]).company_id, self.env.company)
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from .fiscal_simulator import FiscalSimulator
+from .transport import FiscalTransport, get_transport, transport_stats
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" Fixed-point amounts for the fiscal payload.
+
+Amounts are summed as ``Decimal`` and rounded once, half-up, to an integer number
+of minor units (cents) of the currency. Item totals and the payment amount are
+then sums of integers, so they always add up to the cent on the device.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+ZERO = Decimal(0)
+
+
+def to_decimal(amount):
+    """ Exact decimal value of an amount as written, e.g. 0.1 -> Decimal("0.1"). """
+    if isinstance(amount, Decimal):
+        return amount
+    if isinstance(amount, float):
+        return Decimal(repr(amount))
+    return Decimal(amount or 0)
+
+
+def to_units(amount, rounding=0.01, decimal_places=2):
+    """ Round ``amount`` half-up to a multiple of ``rounding`` and return it in minor units. """
+    step = to_decimal(rounding)
+    rounded = (to_decimal(amount) / step).quantize(Decimal(1), rounding=ROUND_HALF_UP) * step
+    return int(rounded.scaleb(decimal_places))
+
+
+def from_units(units, decimal_places=2):
+    """ Float for the JSON payload; -0.0 is returned as 0.0. """
+    return (units / 10 ** decimal_places) if units else 0.0
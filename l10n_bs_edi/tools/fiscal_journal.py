@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" Streaming writers of the fiscal journal.
+
+Rows are read with a PostgreSQL server-side cursor, ``chunk_size`` at a time,
+and every chunk is encoded and yielded before the next one is fetched, so the
+memory used does not depend on the number of invoices in the period.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+CURSOR_NAME = "l10n_bs_edi_fiscal_journal"
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+def fetch_chunks(cr, query, params, chunk_size=2000):
+    """ Yield lists of rows of ``query``, read through a server-side cursor.
+
+    The cursor lives in the current transaction of ``cr``; it is closed when
+    the generator is exhausted or closed, and dropped with the transaction on
+    errors.
+    """
+    cr.execute("DECLARE %s NO SCROLL CURSOR FOR " % CURSOR_NAME + query, params)
+    try:
+        while True:
+            cr.execute("FETCH %s FROM " + CURSOR_NAME, [chunk_size])
+            rows = cr.fetchall()
+            if not rows:
+                break
+            yield rows
+    except GeneratorExit:
+        cr.execute("CLOSE " + CURSOR_NAME)
+        raise
+    cr.execute("CLOSE " + CURSOR_NAME)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def write_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(["" if value is None else _plain(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_jsonl(columns, chunks):
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def export(cr, columns, query, params, file_format, chunk_size=2000):
+    """ Encoded chunks of the journal in ``file_format`` (see FORMATS). """
+    writer = write_csv if file_format == "csv" else write_jsonl
+    return writer(columns, fetch_chunks(cr, query, params, chunk_size))
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" Local stand-in for the fiscal device, for load and failure testing without hardware.
+
+Speaks the subset of the device protocol used by l10n_bs_edi:
+
+- ``POST /api/invoices``: ``{"invoiceNumber": "<n>"}`` or ``{"message": "<error>"}``
+- ``POST|GET /api/ping``: ``{"status": "OK"}``
+- ``GET /<pin>/duplikat/<F|R>/<number>``: ``{"status": "OK"}`` or ``{"message": "<error>"}``
+- ``GET /api/reports/daily?date=<YYYY-MM-DD>``: Z-report of a day, today by default
+- ``GET /api/reports/periodic?dateFrom=<YYYY-MM-DD>&dateTo=<YYYY-MM-DD>``: totals of a period
+
+Fiscal numbers increase monotonically, separately for sales (F) and refunds (R).
+Reports hold the net totals (refunds subtracted) per tax label and payment type
+of the invoices fiscalized on the given UTC days.
+Like a printer, the simulator handles one invoice at a time; latency, jitter,
+error rate and a throughput cap are configurable.
+
+Standalone::
+
+    python fiscal_simulator.py --port 3566 --latency 150 --jitter 50 --error-rate 0.01
+
+Only depends on the standard library so it can run outside of Odoo.
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_logger = logging.getLogger(__name__)
+
+RE_DUPLICATE = re.compile(r"^/(?P<pin>[^/]+)/duplikat/(?P<kind>[FR])/(?P<number>\d+)$")
+
+
+class FiscalSimulator:
+    """ Threaded HTTP fiscal device simulator.
+
+    :param latency: device processing time per request, in milliseconds
+    :param jitter: random +/- variation of the latency, in milliseconds
+    :param error_rate: share (0..1) of invoices answered with a device error message
+    :param max_rate: maximum invoices per second, None for no cap
+    :param pin: PIN expected in duplicate requests, None to accept any
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 max_rate=None, start_number=1, pin=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rate = max_rate
+        self.pin = pin
+        self.random = random.Random(seed)
+        self.next_numbers = {"F": start_number, "R": start_number}
+        self.invoices = []
+        self.days = {}
+        self.z_numbers = {}
+        self.stats = {"invoices": 0, "errors": 0, "duplicates": 0, "pings": 0, "reports": 0}
+
+        # uređaj štampa jedan račun za drugim
+        self._device_lock = threading.Lock()
+        self._last_invoice_at = 0.0
+        self._thread = None
+
+        handler = type("FiscalSimulatorHandler", (_Handler,), {"simulator": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fiscal-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # -------------------------------------------------------------------------
+    # Device behaviour
+    # -------------------------------------------------------------------------
+
+    def _wait(self):
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def _throttle(self):
+        if not self.max_rate:
+            return
+        wait = self._last_invoice_at + 1.0 / self.max_rate - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_invoice_at = time.monotonic()
+
+    def fiscalize(self, payload):
+        with self._device_lock:
+            self._throttle()
+            self._wait()
+            self.stats["invoices"] += 1
+            self.invoices.append(payload)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return {"message": "Simulirana greška fiskalnog uređaja"}
+            request = payload.get("invoiceRequest") or {}
+            if not request.get("items"):
+                self.stats["errors"] += 1
+                return {"message": "Račun nema stavki"}
+            kind = "R" if request.get("transactionType") == "Refund" else "F"
+            number = self.next_numbers[kind]
+            self.next_numbers[kind] += 1
+            fiscal_datetime = datetime.now(timezone.utc).replace(microsecond=0)
+            self._add_to_day(fiscal_datetime.date(), kind, request)
+            return {"invoiceNumber": str(number), "sdcDateTime": fiscal_datetime.isoformat()}
+
+    def _add_to_day(self, day, kind, request):
+        totals = self.days.setdefault(day, {"invoiceCount": 0, "refundCount": 0, "taxes": {}, "payments": {}})
+        totals["refundCount" if kind == "R" else "invoiceCount"] += 1
+        sign = -1 if kind == "R" else 1
+        for item in request.get("items") or []:
+            for label in item.get("labels") or []:
+                tax = totals["taxes"].setdefault(label, [0.0, 0.0])
+                tax[0] += sign * (item.get("baseAmount") or 0.0)
+                tax[1] += sign * (item.get("taxAmount") or 0.0)
+        for payment in request.get("payment") or []:
+            payment_type = payment.get("paymentType") or "Other"
+            totals["payments"][payment_type] = totals["payments"].get(payment_type, 0.0) + sign * (payment.get("amount") or 0.0)
+
+    def report(self, date_from, date_to, daily=False):
+        """ Net totals of the invoices fiscalized from ``date_from`` to ``date_to`` included. """
+        with self._device_lock:
+            self.stats["reports"] += 1
+            invoice_count = refund_count = 0
+            taxes = {}
+            payments = {}
+            for day, totals in self.days.items():
+                if not date_from <= day <= date_to:
+                    continue
+                invoice_count += totals["invoiceCount"]
+                refund_count += totals["refundCount"]
+                for label, (base, tax) in totals["taxes"].items():
+                    taxes.setdefault(label, [0.0, 0.0])
+                    taxes[label][0] += base
+                    taxes[label][1] += tax
+                for payment_type, amount in totals["payments"].items():
+                    payments[payment_type] = payments.get(payment_type, 0.0) + amount
+            return {
+                "reportNumber": self.z_numbers.setdefault(date_from, len(self.z_numbers) + 1) if daily else None,
+                "dateFrom": date_from.isoformat(),
+                "dateTo": date_to.isoformat(),
+                "invoiceCount": invoice_count,
+                "refundCount": refund_count,
+                "taxItems": [
+                    {"label": label, "baseAmount": round(base, 2), "taxAmount": round(tax, 2)}
+                    for label, (base, tax) in sorted(taxes.items())
+                ],
+                "payments": [
+                    {"paymentType": payment_type, "amount": round(amount, 2)}
+                    for payment_type, amount in sorted(payments.items())
+                ],
+            }
+
+    def duplicate(self, pin, kind, number):
+        with self._device_lock:
+            self._wait()
+            if self.pin is not None and pin != self.pin:
+                return {"message": "Pogrešan PIN"}
+            if number >= self.next_numbers[kind]:
+                return {"message": "Račun %s/%s ne postoji" % (kind, number)}
+            self.stats["duplicates"] += 1
+            return {"status": "OK"}
+
+    def ping(self):
+        self.stats["pings"] += 1
+        return {"status": "OK"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    simulator = None
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        return json.loads(raw or b"{}")
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            return self._reply({"message": "Neispravan JSON"}, status=400)
+        if self.path == "/api/invoices":
+            return self._reply(self.simulator.fiscalize(payload))
+        if self.path == "/api/ping":
+            return self._reply(self.simulator.ping())
+        return self._reply({"message": "Nepoznata putanja"}, status=404)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/api/ping":
+            return self._reply(self.simulator.ping())
+        if url.path in ("/api/reports/daily", "/api/reports/periodic"):
+            try:
+                if url.path == "/api/reports/daily":
+                    day = date.fromisoformat(query["date"]) if "date" in query else datetime.now(timezone.utc).date()
+                    return self._reply(self.simulator.report(day, day, daily=True))
+                date_from, date_to = date.fromisoformat(query["dateFrom"]), date.fromisoformat(query["dateTo"])
+            except (KeyError, ValueError):
+                return self._reply({"message": "Neispravan period izvještaja"}, status=400)
+            return self._reply(self.simulator.report(date_from, date_to))
+        match = RE_DUPLICATE.match(url.path)
+        if match:
+            return self._reply(self.simulator.duplicate(match["pin"], match["kind"], int(match["number"])))
+        return self._reply({"message": "Nepoznata putanja"}, status=404)
+
+    def log_message(self, format, *args):
+        _logger.debug("fiscal simulator: " + format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulator fiskalnog uređaja")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3566)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms po zahtjevu")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="udio računa s greškom, 0..1")
+    parser.add_argument("--max-rate", type=float, default=None, help="najviše računa u sekundi")
+    parser.add_argument("--start-number", type=int, default=1)
+    parser.add_argument("--pin", default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = FiscalSimulator(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        max_rate=args.max_rate,
+        start_number=args.start_number,
+        pin=args.pin,
+        seed=args.seed,
+    )
+    _logger.info("Simulator fiskalnog uređaja na %s", simulator.url)
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+        _logger.info("Statistika: %s", simulator.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+""" In-process latency histograms of the fiscalization stages.
+
+Measurements are aggregated per (database, company, device, stage, hour) in the
+worker's memory and periodically written to ``l10n_bs_edi.timing``. Every
+measurement is also logged on the ``odoo.addons.l10n_bs_edi.timing`` logger at
+DEBUG level as ``key=value`` pairs, enable it with
+``--log-handler odoo.addons.l10n_bs_edi.timing:DEBUG`` to scrape them.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+_logger = logging.getLogger("odoo.addons.l10n_bs_edi.timing")
+
+# gornje granice histograma u ms, zadnji bucket je sve iznad 10 s
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_pending = {}
+_last_flush = {}
+_lock = threading.Lock()
+
+
+def bucket_index(ms):
+    return bisect_left(BUCKETS_MS, ms)
+
+
+def record(dbname, company_id, device, stage, ms):
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    key = (dbname, company_id or None, device or "", stage, hour)
+    with _lock:
+        entry = _pending.get(key)
+        if entry is None:
+            entry = _pending[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1)}
+        entry["count"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        entry["buckets"][bucket_index(ms)] += 1
+    _logger.debug("stage=%s company=%s device=%s ms=%.1f", stage, company_id, device or "-", ms)
+
+
+@contextmanager
+def timed(dbname, company_id, device, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(dbname, company_id, device, stage, 1000 * (time.perf_counter() - start))
+
+
+def flush_due(dbname, interval):
+    """ :return: True at most once per ``interval`` seconds and database. """
+    now = time.monotonic()
+    with _lock:
+        if now - _last_flush.setdefault(dbname, now) < interval:
+            return False
+        _last_flush[dbname] = now
+        return True
+
+
+def drain(dbname):
+    """ Remove and return the measurements of a database.
+
+    :return: list of (company_id, device, stage, hour, entry dict)
+    """
+    with _lock:
+        keys = [key for key in _pending if key[0] == dbname]
+        return [key[1:] + (_pending.pop(key),) for key in keys]
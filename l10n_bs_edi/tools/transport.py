@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_POOL_MAXSIZE = 4
+
+# (dbname, company_id) -> FiscalTransport, one set per worker process
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+class FiscalTransport:
+    """ Keep-alive HTTP client for one fiscal device (``l10n_bs_edi_api_host``).
+
+    Wraps a ``requests.Session`` with a bounded connection pool and default
+    connect/read timeouts, and counts requests, failures and time spent so the
+    pool can be inspected from the settings.
+    """
+
+    def __init__(self, host, api_key=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+        self.signature = _signature(host, api_key, connect_timeout, read_timeout, pool_maxsize)
+        self.host, _api_key, self.timeout, _pool_maxsize = self.signature
+
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update({
+            "Content-type": "application/json",
+            "accept": "application/json",
+        })
+        if api_key:
+            self.session.headers["Authorization"] = "Bearer %s" % api_key
+
+        self._lock = threading.Lock()
+        self.created = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_time = 0.0
+
+    def url(self, path):
+        return "%s/%s" % (self.host, path.lstrip("/"))
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.monotonic()
+        try:
+            return self.session.request(method, self.url(path), **kwargs)
+        except requests.exceptions.Timeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.total_time += time.monotonic() - start
+
+    def post(self, path, json=None, **kwargs):
+        return self.request("POST", path, json=json, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def stats(self):
+        pools = []
+        for key in self.adapter.poolmanager.pools.keys():
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": "%s://%s:%s" % (pool.scheme, pool.host, pool.port),
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": pool.pool.qsize() if pool.pool else 0,
+            })
+        return {
+            "host": self.host,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_time_ms": round(1000 * self.total_time / self.requests, 1) if self.requests else 0.0,
+            "age_s": round(time.time() - self.created),
+            "pools": pools,
+        }
+
+
+def _signature(host, api_key, connect_timeout, read_timeout, pool_maxsize):
+    timeout = (connect_timeout or DEFAULT_CONNECT_TIMEOUT, read_timeout or DEFAULT_READ_TIMEOUT)
+    return ((host or "").rstrip("/"), api_key, timeout, pool_maxsize)
+
+
+def get_transport(dbname, company_id, host, api_key=None, connect_timeout=None, read_timeout=None,
+                  pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """ Return the worker's transport for a company, rebuilding it when its settings changed. """
+    signature = _signature(host, api_key, connect_timeout, read_timeout, pool_maxsize)
+    key = (dbname, company_id)
+    with _transports_lock:
+        current = _transports.get(key)
+        if current is not None and current.signature == signature:
+            return current
+        if current is not None:
+            current.close()
+        transport = _transports[key] = FiscalTransport(host, api_key, connect_timeout, read_timeout, pool_maxsize)
+        return transport
+
+
+def transport_stats(dbname, company_id):
+    transport = _transports.get((dbname, company_id))
+    return transport.stats() if transport else {}
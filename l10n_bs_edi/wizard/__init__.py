@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from . import l10n_bs_edi_device_report_wizard
+from . import l10n_bs_edi_dry_run_wizard
+from . import l10n_bs_edi_duplicate_wizard
+from . import l10n_bs_edi_fiscal_journal_wizard
+from . import l10n_bs_edi_validate_wizard
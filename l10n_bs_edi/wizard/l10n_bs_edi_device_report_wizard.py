@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import requests
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+from ..models.l10n_bs_edi_device_report import REPORT_TYPES
+
+
+class L10nBsEdiDeviceReportWizard(models.TransientModel):
+    _name = "l10n_bs_edi.device.report.wizard"
+    _description = "Preuzimanje izvještaja fiskalnog uređaja"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    report_type = fields.Selection(REPORT_TYPES, string="Vrsta", required=True, default="daily")
+    date_from = fields.Date("Od", required=True, default=fields.Date.context_today)
+    date_to = fields.Date("Do", default=fields.Date.context_today)
+
+    def action_fetch(self):
+        self.ensure_one()
+        date_to = self.date_to if self.report_type == "periodic" else self.date_from
+        if not date_to:
+            raise UserError(_("Unesite datum do za periodični izvještaj."))
+        if date_to < self.date_from:
+            raise UserError(_("Datum do ne može biti prije datuma od."))
+        try:
+            report = self.env["l10n_bs_edi.device.report"]._fetch(self.company_id, self.report_type, self.date_from, date_to)
+        except requests.exceptions.RequestException as e:
+            raise UserError(_("Fiskalni uređaj %s nije dostupan: %s", self.company_id.l10n_bs_edi_api_host, e))
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": "l10n_bs_edi.device.report",
+            "res_id": report.id,
+            "view_mode": "form",
+        }
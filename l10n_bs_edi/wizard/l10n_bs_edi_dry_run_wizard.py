@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import base64
+import gzip
+import io
+import json
+from bisect import bisect_left
+from collections import Counter
+
+from markupsafe import Markup
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.misc import split_every
+
+from ..models.account_edi_document import BA_EDI_CODE
+from ..models.account_edi_format import PDV_CODES
+from ..tools import amounts
+
+# gornje granice veličine payloada u bajtovima
+PAYLOAD_SIZE_BUCKETS = (1024, 2048, 4096, 8192, 16384, 65536)
+
+
+class L10nBsEdiDryRunWizard(models.TransientModel):
+    _name = "l10n_bs_edi.dry.run.wizard"
+    _description = "Probna fiskalizacija"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    date_from = fields.Date("Od", required=True, default=lambda self: fields.Date.today().replace(day=1))
+    date_to = fields.Date("Do", required=True, default=fields.Date.context_today)
+    move_scope = fields.Selection(
+        [
+            ("draft", "Fakture u pripremi"),
+            ("to_send", "Knjižene, nisu poslane"),
+            ("all", "Sve"),
+        ],
+        string="Fakture",
+        required=True,
+        default="all",
+    )
+    batch_size = fields.Integer("Veličina paketa", default=500, required=True)
+    dump_payloads = fields.Boolean("Sačuvaj payloade", help="Svi payloadi kao gzip JSON lines datoteka")
+    move_count = fields.Integer("Provjereno faktura", readonly=True)
+    valid_count = fields.Integer("Spremno za fiskalizaciju", readonly=True)
+    invalid_move_ids = fields.Many2many("account.move", string="Fakture s greškama", readonly=True)
+    report_html = fields.Html("Izvještaj", readonly=True, sanitize=False)
+    dump_file = fields.Binary("Payloadi", readonly=True, attachment=True)
+    dump_filename = fields.Char(readonly=True)
+
+    def _get_moves_domain(self):
+        domain = [
+            ("company_id", "=", self.company_id.id),
+            ("move_type", "in", self.env["account.move"].get_sale_types(include_receipts=True)),
+            ("invoice_date", ">=", self.date_from),
+            ("invoice_date", "<=", self.date_to),
+        ]
+        if self.move_scope == "draft":
+            return domain + [("state", "=", "draft")]
+        # isti dokument mora biti BA format i čekati slanje
+        documents = self.env["account.edi.document"]._search([
+            ("edi_format_id.code", "=", BA_EDI_CODE),
+            ("state", "=", "to_send"),
+        ])
+        to_send = [("state", "=", "posted"), ("edi_document_ids", "in", documents)]
+        if self.move_scope == "to_send":
+            return domain + to_send
+        return domain + ["|", ("state", "=", "draft"), "&"] + to_send
+
+    def action_dry_run(self):
+        self.ensure_one()
+        if self.batch_size <= 0:
+            raise UserError(_("Veličina paketa mora biti veća od nule."))
+        move_ids = self.env["account.move"].search(self._get_moves_domain(), order="invoice_date, id").ids
+        dump = io.BytesIO() if self.dump_payloads else None
+        summary = self.with_context(l10n_bs_edi_dry_run=True)._dry_run(move_ids, dump)
+
+        values = {
+            "move_count": len(move_ids),
+            "valid_count": summary["payload_count"],
+            "invalid_move_ids": [(6, 0, list(summary["invalid"]))],
+            "report_html": self._render_report(summary),
+            "dump_file": False,
+            "dump_filename": False,
+        }
+        if dump is not None:
+            values["dump_file"] = base64.b64encode(dump.getvalue())
+            values["dump_filename"] = "fiskalni_payloadi_%s_%s.jsonl.gz" % (self.date_from, self.date_to)
+        self.write(values)
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def _dry_run(self, move_ids, dump=None):
+        """ Applicability, configuration checks and payload generation for the moves,
+        ``batch_size`` at a time, without sending anything.
+
+        The configuration checks are the bulk equivalent of _check_move_configuration
+        (see account.edi.format._l10n_bs_edi_validate_moves).
+
+        :param dump: binary file receiving the payloads as gzip JSON lines, or None
+        :return: summary dict
+        """
+        edi_format = self.env.ref("l10n_bs_edi.edi_in_einvoice_json_1_03")
+        summary = {
+            "not_applicable": 0,
+            "invalid": {},
+            "error_counts": Counter(),
+            "pdv_units": {},
+            "payment_units": Counter(),
+            "payload_count": 0,
+            "payload_bytes": 0,
+            "payload_max": 0,
+            "size_buckets": [0] * (len(PAYLOAD_SIZE_BUCKETS) + 1),
+        }
+        writer = gzip.GzipFile(fileobj=dump, mode="wb") if dump is not None else None
+        for ids in split_every(self.batch_size, move_ids):
+            moves = self.env["account.move"].browse(ids)
+            fiscalizable = edi_format._l10n_bs_edi_get_fiscalizable_moves(moves)
+            summary["not_applicable"] += len(moves) - len(fiscalizable)
+            for move, errors in edi_format._l10n_bs_edi_validate_moves(fiscalizable).items():
+                if not errors:
+                    try:
+                        payload = edi_format._ba_edi_generate_invoice_json(move)
+                    except (UserError, ValidationError) as e:
+                        errors = [{"code": "payload", "message": str(e)}]
+                if errors:
+                    summary["invalid"][move.id] = errors
+                    summary["error_counts"].update(error["code"] for error in errors)
+                    continue
+                self._add_payload(summary, move, payload, writer)
+            # ne puniti cache sa hiljadama faktura
+            self.env.invalidate_all()
+        if writer is not None:
+            writer.close()
+        return summary
+
+    def _add_payload(self, summary, move, payload, writer):
+        encoded = json.dumps(payload).encode()
+        size = len(encoded)
+        summary["payload_count"] += 1
+        summary["payload_bytes"] += size
+        summary["payload_max"] = max(summary["payload_max"], size)
+        summary["size_buckets"][bisect_left(PAYLOAD_SIZE_BUCKETS, size)] += 1
+
+        currency = self.company_id.currency_id
+        request = payload["invoiceRequest"]
+        sign = -1 if request["transactionType"] == "Refund" else 1
+        for item in request["items"]:
+            units = summary["pdv_units"].setdefault(item["labels"][0], [0, 0])
+            units[0] += sign * amounts.to_units(item["baseAmount"], currency.rounding, currency.decimal_places)
+            units[1] += sign * amounts.to_units(item["taxAmount"], currency.rounding, currency.decimal_places)
+        for payment in request["payment"]:
+            summary["payment_units"][payment["paymentType"]] += sign * amounts.to_units(
+                payment["amount"], currency.rounding, currency.decimal_places)
+
+        if writer is not None:
+            writer.write(json.dumps({"id": move.id, "name": move.name, "payload": payload}).encode() + b"\n")
+
+    def _render_report(self, summary):
+        currency = self.company_id.currency_id
+        decimal_places = currency.decimal_places
+
+        def amount(units):
+            return "%.*f" % (decimal_places, amounts.from_units(units, decimal_places))
+
+        html = Markup("<p>%s</p>") % _(
+            "Spremno: %s, s greškama: %s, ne podliježe fiskalizaciji: %s",
+            summary["payload_count"], len(summary["invalid"]), summary["not_applicable"],
+        )
+        if summary["error_counts"]:
+            html += Markup("<h5>%s</h5><table class='table table-sm'><tbody>") % _("Greške po vrsti")
+            for code, count in summary["error_counts"].most_common():
+                html += Markup("<tr><td>%s</td><td class='text-end'>%s</td></tr>") % (code, count)
+            html += Markup("</tbody></table>")
+
+        if summary["pdv_units"]:
+            html += Markup("<h5>%s</h5><table class='table table-sm'><thead><tr><th>%s</th><th class='text-end'>%s</th>"
+                           "<th class='text-end'>%s</th></tr></thead><tbody>") % (
+                _("Iznosi po PDV oznaci"), _("Oznaka"), _("Osnovica"), _("PDV"))
+            codes = sorted(summary["pdv_units"], key=lambda code: (PDV_CODES.index(code) if code in PDV_CODES else len(PDV_CODES), code))
+            for code in codes:
+                base_units, tax_units = summary["pdv_units"][code]
+                html += Markup("<tr><td>%s</td><td class='text-end'>%s</td><td class='text-end'>%s</td></tr>") % (
+                    code, amount(base_units), amount(tax_units))
+            for payment_type, units in sorted(summary["payment_units"].items()):
+                html += Markup("<tr><td colspan='2'>%s</td><td class='text-end'>%s</td></tr>") % (payment_type, amount(units))
+            html += Markup("</tbody></table>")
+
+        if summary["payload_count"]:
+            html += Markup("<h5>%s</h5><table class='table table-sm'><tbody>") % _("Veličina payloada")
+            limits = ["≤ %s KB" % (limit // 1024) for limit in PAYLOAD_SIZE_BUCKETS] + ["> %s KB" % (PAYLOAD_SIZE_BUCKETS[-1] // 1024)]
+            for label, count in zip(limits, summary["size_buckets"]):
+                if count:
+                    html += Markup("<tr><td>%s</td><td class='text-end'>%s</td></tr>") % (label, count)
+            html += Markup("<tr><td>%s</td><td class='text-end'>%s B</td></tr>") % (
+                _("Prosjek"), summary["payload_bytes"] // summary["payload_count"])
+            html += Markup("<tr><td>%s</td><td class='text-end'>%s B</td></tr>") % (_("Najveći"), summary["payload_max"])
+            html += Markup("</tbody></table>")
+        return html
+
+    def action_open_invalid_moves(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Fakture s greškama"),
+            "res_model": "account.move",
+            "view_mode": "tree,form",
+            "domain": [("id", "in", self.invalid_move_ids.ids)],
+        }
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import uuid
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class L10nBsEdiDuplicateWizard(models.TransientModel):
+    _name = "l10n_bs_edi.duplicate.wizard"
+    _description = "Fiskalni duplikati"
+
+    move_ids = fields.Many2many("account.move", string="Fakture")
+    batch_ref = fields.Char(readonly=True)
+    entry_ids = fields.Many2many("l10n_bs_edi.fiscal.queue", string="Zahtjevi", compute="_compute_progress")
+    entry_count = fields.Integer("Ukupno", compute="_compute_progress")
+    done_count = fields.Integer("Odštampano", compute="_compute_progress")
+    failed_count = fields.Integer("Greška", compute="_compute_progress")
+    progress = fields.Float("Napredak", compute="_compute_progress")
+    state = fields.Selection(
+        [("draft", "Priprema"), ("running", "U toku"), ("done", "Završeno")],
+        compute="_compute_progress",
+    )
+
+    @api.depends("batch_ref")
+    def _compute_progress(self):
+        Queue = self.env["l10n_bs_edi.fiscal.queue"]
+        for wizard in self:
+            entries = Queue.search([("batch_ref", "=", wizard.batch_ref)]) if wizard.batch_ref else Queue
+            finished = entries.filtered(lambda entry: entry.state in ("done", "failed"))
+            wizard.entry_ids = entries
+            wizard.entry_count = len(entries)
+            wizard.done_count = len(finished.filtered(lambda entry: entry.state == "done"))
+            wizard.failed_count = len(finished) - wizard.done_count
+            wizard.progress = 100.0 * len(finished) / len(entries) if entries else 0.0
+            if not entries:
+                wizard.state = "draft"
+            else:
+                wizard.state = "done" if len(finished) == len(entries) else "running"
+
+    def _reopen(self):
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Fiskalni duplikati"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def action_send(self):
+        self.ensure_one()
+        moves = self.move_ids._l10n_bs_edi_duplicate_candidates()
+        if not moves:
+            raise UserError(_("Nijedna od odabranih faktura nije fiskalizirana."))
+        # redoslijed štampe: po uređaju, pa redom izdavanja
+        moves = moves.sorted(lambda move: (move.company_id.l10n_bs_edi_api_host or "", move.move_type, move.id))
+        self.batch_ref = uuid.uuid4().hex
+        self.env["l10n_bs_edi.fiscal.queue"]._enqueue_duplicates(moves, self.batch_ref)
+        return self._reopen()
+
+    def action_refresh(self):
+        return self._reopen()
+
+    def action_open_entries(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Fiskalni duplikati"),
+            "res_model": "l10n_bs_edi.fiscal.queue",
+            "view_mode": "tree,form",
+            "domain": [("batch_ref", "=", self.batch_ref)],
+        }
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from urllib.parse import urlencode
+
+from odoo import fields, models
+
+
+class L10nBsEdiFiscalJournalWizard(models.TransientModel):
+    _name = "l10n_bs_edi.fiscal.journal.wizard"
+    _description = "Izvoz fiskalnog dnevnika"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    date_from = fields.Date("Od", required=True, default=lambda self: fields.Date.today().replace(day=1))
+    date_to = fields.Date("Do", required=True, default=fields.Date.context_today)
+    file_format = fields.Selection(
+        [
+            ("csv", "CSV"),
+            ("jsonl", "JSON Lines"),
+        ],
+        string="Format",
+        required=True,
+        default="csv",
+    )
+
+    def action_export(self):
+        self.ensure_one()
+        query = urlencode({
+            "date_from": fields.Date.to_string(self.date_from),
+            "date_to": fields.Date.to_string(self.date_to),
+            "file_format": self.file_format,
+        })
+        return {
+            "type": "ir.actions.act_url",
+            "url": "/l10n_bs_edi/fiscal_journal/%s?%s" % (self.company_id.id, query),
+            "target": "self",
+        }
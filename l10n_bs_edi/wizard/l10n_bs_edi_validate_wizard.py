@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from collections import Counter
+
+from markupsafe import Markup, escape
+
+from odoo import api, fields, models, _
+from odoo.tools.misc import split_every
+
+
+class L10nBsEdiValidateWizard(models.TransientModel):
+    _name = "l10n_bs_edi.validate.wizard"
+    _description = "Provjera faktura prije fiskalizacije"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    date_from = fields.Date("Od", required=True, default=lambda self: fields.Date.today().replace(day=1))
+    date_to = fields.Date("Do", required=True, default=fields.Date.context_today)
+    move_count = fields.Integer("Provjereno faktura", readonly=True)
+    invalid_move_ids = fields.Many2many("account.move", string="Fakture s greškama", readonly=True)
+    report_html = fields.Html("Izvještaj", readonly=True, sanitize=False)
+
+    def _get_moves_domain(self):
+        return [
+            ("company_id", "=", self.company_id.id),
+            ("state", "=", "draft"),
+            ("move_type", "in", self.env["account.move"].get_sale_types(include_receipts=True)),
+            ("invoice_date", ">=", self.date_from),
+            ("invoice_date", "<=", self.date_to),
+        ]
+
+    def action_validate(self):
+        self.ensure_one()
+        edi_format = self.env.ref("l10n_bs_edi.edi_in_einvoice_json_1_03")
+        move_ids = self.env["account.move"].search(self._get_moves_domain(), order="invoice_date, id").ids
+
+        report = {}
+        for ids in split_every(1000, move_ids):
+            moves = self.env["account.move"].browse(ids)
+            fiscalizable = edi_format._l10n_bs_edi_get_fiscalizable_moves(moves)
+            report.update(edi_format._l10n_bs_edi_validate_moves(fiscalizable))
+            # ne puniti cache sa hiljadama faktura
+            self.env.invalidate_all()
+        invalid = {move: errors for move, errors in report.items() if errors}
+
+        self.write({
+            "move_count": len(report),
+            "invalid_move_ids": [(6, 0, [move.id for move in invalid])],
+            "report_html": self._render_report(invalid),
+        })
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def _render_report(self, invalid):
+        if not invalid:
+            return Markup("<p>%s</p>") % _("Sve fakture su spremne za fiskalizaciju.")
+        counts = Counter(error["code"] for errors in invalid.values() for error in errors)
+        html = Markup("<p>%s</p><ul>") % _("Broj grešaka po vrsti:")
+        for code, count in counts.most_common():
+            html += Markup("<li>%s: %s</li>") % (code, count)
+        html += Markup("</ul><table class='table table-sm'><tbody>")
+        for move, errors in invalid.items():
+            html += Markup("<tr><td>%s</td><td>%s</td></tr>") % (
+                move.name if move.name and move.name != "/" else move.id,
+                Markup("<br/>").join(escape(error["message"]) for error in errors),
+            )
+        return html + Markup("</tbody></table>")
+
+    def action_open_invalid_moves(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Fakture s greškama"),
+            "res_model": "account.move",
+            "view_mode": "tree,form",
+            "domain": [("id", "in", self.invalid_move_ids.ids)],
+        }